@@ -0,0 +1,84 @@
+"""
+Benchmark the download streaming writer against a local HTTP server.
+
+Compares mcresolver.downloads.download with the previous streaming loop (1 KiB iter_content blocks,
+updating a tqdm bar per block), reporting the throughput (MB/s) of each.
+
+    $ python benchmarks/bench_download.py [--size MB] [--rounds N]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from tqdm import tqdm
+
+from mcresolver.downloads import download
+from mcresolver.network import get_session
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def per_block_download(filename, url):
+    # The streaming loop download() used before the adaptive, buffer reusing writer.
+    checksum = hashlib.sha256()
+    with open(filename, 'wb') as handle:
+        response = get_session().get(url, stream=True)
+        for block in tqdm(response.iter_content(1024), leave=False):
+            handle.write(block)
+            checksum.update(block)
+
+
+def adaptive_download(filename, url):
+    with tqdm(unit='B', unit_scale=True, leave=False) as progress:
+        download(filename, url, progress=progress)
+
+
+def measure(name, method, url, destination, size, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        method(destination, url)
+        timings.append(time.perf_counter() - started)
+        os.remove(destination)
+
+    best = min(timings)
+    print("%-12s best %.3fs  %8.1f MB/s" % (name, best, size / best / 1024 ** 2))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--size', type=int, default=64, help='Size (in MB) of the file to download')
+    arguments.add_argument('--rounds', type=int, default=3, help='Downloads per method; The best is reported')
+    options = arguments.parse_args()
+
+    served = tempfile.mkdtemp()
+    target = tempfile.mkdtemp()
+    size = options.size * 1024 ** 2
+    with open(os.path.join(served, 'plugin.bin'), 'wb') as payload:
+        payload.write(os.urandom(size))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=served))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%s/plugin.bin' % server.server_address[1]
+    destination = os.path.join(target, 'plugin.bin')
+
+    try:
+        measure('per-block', per_block_download, url, destination, size, options.rounds)
+        measure('adaptive', adaptive_download, url, destination, size, options.rounds)
+    finally:
+        server.shutdown()
+        shutil.rmtree(served)
+        shutil.rmtree(target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark template generation on large (synthetic) plugin configurations.
+
+Compares mcresolver.generation.generate_template with the previous generator (dumping the template,
+then replacing the variable of every node throughout the whole template), reporting the time each takes
+as the configuration grows; the time per node stays flat when generation scales linearly.
+
+    $ python benchmarks/bench_generate.py [--sizes 1000,2000,4000,8000] [--rounds N]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+import yamlbro
+from yamlbro import restore_yaml_comments
+
+from mcresolver import yamlio
+from mcresolver.generation import generate_template, get_name_from_key, assign_nested_path
+
+
+def write_config(file, nodes, seed=1):
+    generator = random.Random(seed)
+    lines = ["# Synthetic plugin configuration", ""]
+    for section in range(nodes // 10):
+        lines.append("# Settings of section %s" % section)
+        lines.append("section-%s:" % section)
+        for node in range(10):
+            kind = generator.choice(('int', 'bool', 'str', 'list'))
+            if kind == 'int':
+                lines.append("  node-%s: %s" % (node, generator.randint(0, 1000)))
+            elif kind == 'bool':
+                lines.append("  node-%s: %s" % (node, generator.choice(('true', 'false'))))
+            elif kind == 'str':
+                lines.append("  node-%s: 'value %s'" % (node, node))
+            else:
+                lines.append("  node-%s:\n  - first\n  - second" % node)
+
+    with open(file, 'w') as config_data:
+        config_data.write("\n".join(lines) + "\n")
+
+
+def replace_generate_template(config_file):
+    # The generator used before mcresolver.generation; Every node is replaced throughout the whole template.
+    flat = OrderedDict()
+
+    def collect(key, value):
+        if isinstance(value, dict):
+            for child_key, child_value in value.items():
+                collect("%s.%s" % (key, child_key), child_value)
+        else:
+            flat[key] = value
+
+    for key, value in yamlbro.load_yaml(config_file).items():
+        collect(key, value)
+
+    defaults, types, tree = OrderedDict(), {}, OrderedDict()
+    for key, value in flat.items():
+        node_name = get_name_from_key(".".join(key.split('.')[-2:]) if '.' in key else key)
+        defaults[node_name] = value
+        types[node_name] = value.__class__.__name__
+        assign_nested_path(tree, key, "{{%s}}" % node_name)
+
+    template = yamlio.dump(tree, Dumper=yamlio.PyDumper, indent=2, width=1000)
+    with open(config_file, 'r') as config_data:
+        template = restore_yaml_comments(template, config_data.read())
+
+    for node, value_type in types.items():
+        if value_type in ('bool', 'int', 'float'):
+            template = template.replace("'{{%s}}'" % node, "{{%s}}" % node)
+        elif value_type == 'list':
+            template = template.replace(" '{{%s}}'" % node, "\n{%% for %s_item in %s %%}    - {{list_item}}\n"
+                                                            "{%% endfor %%}" % (node, node))
+
+    return template, yamlio.dump(defaults, Dumper=yamlio.PyDumper)
+
+
+def measure(name, method, config_file, nodes, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        method(config_file)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    print("%-10s %7s nodes  best %7.3fs  %7.1f us/node" % (name, nodes, best, best / nodes * 1000 ** 2))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--sizes', default='1000,2000,4000,8000',
+                           help='Comma separated amounts of nodes in the generated configurations')
+    arguments.add_argument('--rounds', type=int, default=3, help='Generations per method; The best is reported')
+    options = arguments.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        for nodes in [int(size) for size in options.sizes.split(',')]:
+            config_file = os.path.join(folder, 'config-%s.yml' % nodes)
+            write_config(config_file, nodes)
+            measure('replace', replace_generate_template, config_file, nodes, options.rounds)
+            measure('single', generate_template, config_file, nodes, options.rounds)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark how long the mcresolver CLI takes to start, per mode.
+
+Runs `mcresolver --help`, a template generation (-g) and an offline resolution (-r, of a requirements file
+without plugins) under `python -X importtime`, reporting the time spent importing modules (against a budget),
+the wall time of the run, and the heaviest packages imported. Exits with 1 when a mode goes over its budget.
+
+    $ python benchmarks/bench_startup.py [--rounds N] [--budget help=MS] [--budget generate=MS] [--budget resolve=MS]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds each mode may spend importing modules (including the interpreter's own start up).
+DEFAULT_BUDGETS = {
+    'help': 100,
+    'generate': 250,
+    'resolve': 1000,
+}
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def modes(folder):
+    config_file = os.path.join(folder, 'essentials.yml')
+    shutil.copy(os.path.join(ROOT_FOLDER, 'tests', 'essentials.yml'), config_file)
+
+    requirements_file = os.path.join(folder, 'requirements.yml')
+    with open(requirements_file, 'w') as requirements_data:
+        requirements_data.write("target-folder: %s\n" % os.path.join(folder, 'server'))
+
+    return [
+        ('help', ['--help']),
+        ('generate', ['-g', config_file, '-pl', 'essentials', '-l', os.path.join(folder, 'templates')]),
+        ('resolve', ['-r', requirements_file]),
+    ]
+
+
+def parse_import_times(output):
+    """
+    :return: Tuple of the total time spent importing (in microseconds), and the cumulative import time
+    of every top level import by its name.
+    """
+    total = 0
+    top_level = {}
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+
+        total += int(match.group(1))
+        if match.group(3) == '':
+            top_level[match.group(4)] = int(match.group(2))
+    return total, top_level
+
+
+def measure(name, arguments, folder, rounds):
+    environment = dict(os.environ, HOME=folder, PYTHONPATH=os.pathsep.join(
+        [ROOT_FOLDER] + [path for path in [os.environ.get('PYTHONPATH')] if path]))
+
+    runs = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'mcresolver'] + arguments,
+                                 env=environment, cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        elapsed = time.perf_counter() - started
+        if process.returncode != 0:
+            raise RuntimeError("exited with %s: %s" % (process.returncode, process.stderr.strip().splitlines()[-1]))
+        runs.append((elapsed, parse_import_times(process.stderr)))
+
+    elapsed = min(run[0] for run in runs)
+    import_time, top_level = min((run[1] for run in runs), key=lambda times: times[0])
+    return elapsed, import_time / 1000, sorted(top_level.items(), key=lambda item: -item[1])
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--rounds', type=int, default=5, help='Runs per mode; The best is reported')
+    arguments.add_argument('--budget', action='append', default=[], metavar='MODE=MS',
+                           help='Import time budget of a mode (help, generate or resolve) in milliseconds')
+    arguments.add_argument('--top', type=int, default=5, help='Amount of the heaviest imports to list per mode')
+    options = arguments.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for budget in options.budget:
+        mode, _, milliseconds = budget.partition('=')
+        budgets[mode] = float(milliseconds)
+
+    folder = tempfile.mkdtemp()
+    over_budget = []
+    try:
+        for name, mode_arguments in modes(folder):
+            try:
+                elapsed, import_time, heaviest = measure(name, mode_arguments, folder, options.rounds)
+            except RuntimeError as e:
+                print("%-9s failed (%s)" % (name, e))
+                over_budget.append(name)
+                continue
+
+            status = "ok" if import_time <= budgets[name] else "OVER BUDGET"
+            print("%-9s imports %7.1fms (budget %5.0fms, %s)  wall %7.1fms" % (
+                name, import_time, budgets[name], status, elapsed * 1000))
+            for module, cumulative in heaviest[:options.top]:
+                print("            %-30s %7.1fms" % (module, cumulative / 1000))
+
+            if import_time > budgets[name]:
+                over_budget.append(name)
+    finally:
+        shutil.rmtree(folder)
+
+    if len(over_budget) > 0:
+        print("Over budget (or failed): %s" % ', '.join(over_budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark the cost of the tracing hooks, with tracing disabled and enabled.
+
+Runs an empty block a number of times (1M by default) bare, inside tracing.span while tracing is disabled,
+and inside tracing.span while tracing is enabled; Reporting the time each block takes on average.
+
+    $ python benchmarks/bench_tracing.py [--spans 1000000] [--rounds N]
+"""
+import argparse
+import time
+
+from mcresolver import tracing
+from mcresolver.metrics import plugin_scope
+
+
+def best_of(method, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        method()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bare(spans):
+    for _ in range(spans):
+        pass
+
+
+def traced(spans):
+    for _ in range(spans):
+        with tracing.span("render", 'render'):
+            pass
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--spans', type=int, default=1000000, help='Amount of blocks ran per measurement')
+    arguments.add_argument('--rounds', type=int, default=5, help='Measurements per mode; The best is reported')
+    options = arguments.parse_args()
+    # Every span recorded is kept in memory; A tenth of the blocks is plenty to measure tracing enabled.
+    recorded_spans = max(1, options.spans // 10)
+
+    def enabled():
+        tracing.start_tracing()
+        with plugin_scope('Essentials'):
+            traced(recorded_spans)
+        tracing.stop_tracing()
+
+    tracing.stop_tracing()
+    baseline = best_of(lambda: bare(options.spans), options.rounds) / options.spans
+    disabled = best_of(lambda: traced(options.spans), options.rounds) / options.spans
+    recorded = best_of(enabled, options.rounds) / recorded_spans
+
+    print("bare              %8.1fns per block" % (baseline * 1e9))
+    print("tracing disabled  %8.1fns per block (+%.1fns)" % (disabled * 1e9, (disabled - baseline) * 1e9))
+    print("tracing enabled   %8.1fns per block (+%.1fns)" % (recorded * 1e9, (recorded - baseline) * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark reading & writing YAML through mcresolver.yamlio with libyaml and with pure python.
+
+Loads and dumps the bundled plugin-test.yml and a synthetic configuration (10k nodes by default) with the
+libyaml (C) loader & dumper and with the pure python ones, reporting the time each takes.
+
+    $ python benchmarks/bench_yaml.py [--nodes 10000] [--rounds N]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from mcresolver import yamlio
+
+from bench_generate import write_config
+
+PLUGIN_TEST_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plugin-test.yml')
+
+
+def best_of(method, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        method()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure(name, file, rounds):
+    with open(file, 'r') as yaml_data:
+        content = yaml_data.read()
+    document = yamlio.load(content, loader=yamlio.PyLoader)
+
+    paths = [('python', yamlio.PyLoader, yamlio.PyDumper)]
+    if yamlio.LIBYAML:
+        paths.append(('libyaml', yamlio.Loader, yamlio.Dumper))
+
+    for path, loader, dumper in paths:
+        load = best_of(lambda: yamlio.load(content, loader=loader), rounds)
+        dump = best_of(lambda: yamlio.dump(document, Dumper=dumper), rounds)
+        print("%-16s %-8s load %8.2fms  dump %8.2fms" % (name, path, load * 1000, dump * 1000))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--nodes', type=int, default=10000, help='Amount of nodes in the synthetic configuration')
+    arguments.add_argument('--rounds', type=int, default=5, help='Loads & dumps per path; The best is reported')
+    options = arguments.parse_args()
+
+    if not yamlio.LIBYAML:
+        print("PyYAML was built without libyaml; Only the pure python path is measured")
+
+    measure('plugin-test.yml', PLUGIN_TEST_FILE, options.rounds)
+
+    folder = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(folder, 'config.yml')
+        write_config(config_file, options.nodes)
+        measure('%s nodes' % options.nodes, config_file, options.rounds)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,219 @@
+from mcresolver._version import __version__
+
 import textwrap
 from collections import OrderedDict
-from spiget import SpigotResource
-from bukget import BukkitResource
 import sys
-import yamlbro
+import time
+import importlib
 
-from mcresolver.scripts import configure_plugin, write_file, get_config_from_file, save_plugin_config_script
 from mcresolver.utils import is_url, filename_from_url, get_file_extension
 
-from tqdm import tqdm
-
-import yaml
-from yamlbro import install_patch, restore_yaml_comments
-
 import os
 import shutil
-import cfscrape
 import argparse
 import warnings
 import functools
 
-# Install yaml patch
-install_patch()
 # todo implement downloading from BukkitDev and Jenkins / Link with versioning (Prefix with Bukkit:
 # Todo or prefix with Spigot:
 # todo or prefix with Link: <url>==<version-to-save-as>
 
-parser = argparse.ArgumentParser(description="Configure the options to run the Mineraft Plugin Resolver by.")
-parser.add_argument("-r", "-requirements", dest="requirements", metavar=('*.yml Requirements File'),
-                    required=False,
-                    help="Requirements file used to determined the plugins and their desired versions")
+# Arguments of the resolver, 'mcresolver cache' and 'mcresolver serve'; Built on first use, as runs only need one.
+__parser = None
+__cache_parser = None
+__serve_parser = None
 
-parser.add_argument('-l', "-location", dest="location", metavar=('FOLDER'),
-                    required=False,
-                    help="Location to store the plugins, or generated configuration in. If it doesn't exist, creation of it will be attempted")
+args = None
 
-parser.add_argument('-u', "--latest", dest="latest",
-                    required=False, action="store_true",
-                    help="By default, if the version included in your requirements file is invalid, use the latest available version of the resource")
 
-parser.add_argument('-g', '--generate', dest='generate', required=False, action='store',
-                    help='Take a configuration file and attempt to generate a template, and defaults file from it')
+def get_parser():
+    """
+    The argument parser of the resolver (and template generation).
+    """
+    global __parser
 
-parser.add_argument('-pl', '--plugin', dest='genplugin', required=False, action='store',
-                    help='Coupled with use of generate, its the name to assign config templates on generation')
-args = None
+    if __parser is not None:
+        return __parser
+
+    parser = argparse.ArgumentParser(description="Configure the options to run the Mineraft Plugin Resolver by.")
+    parser.add_argument("-r", "-requirements", dest="requirements", metavar=('*.yml Requirements File'),
+                        required=False,
+                        help="Requirements file used to determined the plugins and their desired versions")
+
+    parser.add_argument('-l', "-location", dest="location", metavar=('FOLDER'),
+                        required=False,
+                        help="Location to store the plugins, or generated configuration in. If it doesn't exist, creation of it will be attempted")
+
+    parser.add_argument('-u', "--latest", dest="latest",
+                        required=False, action="store_true",
+                        help="By default, if the version included in your requirements file is invalid, use the latest available version of the resource")
+
+    parser.add_argument('-g', '--generate', dest='generate', required=False, action='store',
+                        help='Take a configuration file and attempt to generate a template, and defaults file from it; '
+                             'Or a plugins folder / glob of configuration files to generate the templates of every plugin')
+
+    parser.add_argument('-pl', '--plugin', dest='genplugin', required=False, action='store',
+                        help='Coupled with use of generate, its the name to assign config templates on generation')
+
+    parser.add_argument('--incremental', dest='incremental', required=False, action='store_true',
+                        help='Coupled with use of generate, patch the nodes that changed since the templates were last '
+                             'generated into them, keeping any edits made to the templates')
+
+    parser.add_argument('--generate-processes', dest='generate_processes', required=False, type=int, default=None,
+                        help='Number of processes generating templates from a plugins folder (Default: one per core)')
+
+    parser.add_argument('-w', '--workers', dest='workers', required=False, type=int, default=8,
+                        help='Number of plugins to retrieve information on concurrently (Default: 8)')
+
+    parser.add_argument('--host-limit', dest='host_limit', required=False, type=int, default=4,
+                        help='Maximum amount of concurrent requests made against a single host (Default: 4)')
+
+    parser.add_argument('--render-processes', dest='render_processes', required=False, type=int, default=0,
+                        help='Configure plugins on a pool of this many processes, rather than threads (Default: 0)')
+
+    parser.add_argument('--metadata-ttl', dest='metadata_ttl', required=False, type=int, default=3600,
+                        help='Seconds to trust cached information on plugins requested at their latest version (Default: 3600)')
+
+    parser.add_argument('--refresh', dest='refresh', required=False, action='store_true',
+                        help='Ignore the cached plugin information and lockfile, and retrieve it from BukGet and Spiget again')
+
+    parser.add_argument('--cache-size', dest='cache_size', required=False, type=int, default=2048,
+                        help='Maximum size (in MB) of the downloaded plugins kept in the artifact cache (Default: 2048)')
+
+    parser.add_argument('--metrics-report', dest='metrics_report', required=False, default=None, metavar='FILE',
+                        help='Write a JSON report of the run; Time spent per phase & plugin, requests and latency '
+                             'per host, bytes downloaded and cache hit ratios')
+
+    parser.add_argument('--metrics-textfile', dest='metrics_textfile', required=False, default=None, metavar='FILE',
+                        help='Write the metrics of the run as a Prometheus textfile (Ex: for node_exporter\'s '
+                             'textfile collector)')
+
+    parser.add_argument('--trace', dest='trace', required=False, default=None, metavar='FILE',
+                        help='Write a timeline of the run (every metadata request, download, script import, template '
+                             'compile and render) as a Chrome trace-event file; Open it in Perfetto or chrome://tracing')
+
+    __parser = parser
+    return __parser
+
+
+def get_cache_parser():
+    """
+    The argument parser of 'mcresolver cache'.
+    """
+    global __cache_parser
+
+    if __cache_parser is not None:
+        return __cache_parser
+
+    cache_parser = argparse.ArgumentParser(prog="mcresolver cache",
+                                           description="Manage the downloaded plugins kept in the artifact cache (~/.mcresolver/cache)")
+    cache_parser.add_argument('action', choices=['gc'],
+                              help="gc: Evict the least recently used plugins until the cache fits within --cache-size")
+    cache_parser.add_argument('--cache-size', dest='cache_size', required=False, type=int, default=2048,
+                              help='Maximum size (in MB) of the artifact cache (Default: 2048)')
+
+    __cache_parser = cache_parser
+    return __cache_parser
+
+
+def get_serve_parser():
+    """
+    The argument parser of 'mcresolver serve'.
+    """
+    global __serve_parser
+
+    if __serve_parser is not None:
+        return __serve_parser
+
+    serve_parser = argparse.ArgumentParser(prog="mcresolver serve",
+                                           description="Run mcresolver as a daemon, resolving & configuring plugins "
+                                                       "(or generating templates) on request with its caches kept warm")
+    serve_parser.add_argument('--socket', dest='socket', required=False, default=None,
+                              help='Unix socket to listen on (Default: ~/.mcresolver/mcresolver.sock)')
+    serve_parser.add_argument('--port', dest='port', required=False, type=int, default=None,
+                              help='Listen for HTTP on this port instead of a Unix socket')
+    serve_parser.add_argument('--host', dest='host', required=False, default='127.0.0.1',
+                              help='Address to listen on, coupled with --port (Default: 127.0.0.1)')
+    serve_parser.add_argument('--allow-remote', dest='allow_remote', required=False, action='store_true',
+                              default=False, help='Allow --host to be an address other hosts can reach; Requires --token')
+    serve_parser.add_argument('--token', dest='token', required=False, default=os.environ.get('MCRESOLVER_TOKEN'),
+                              help='Token HTTP requests have to carry as an "Authorization: Bearer <token>" header '
+                                   '(Default: $MCRESOLVER_TOKEN)')
+    serve_parser.add_argument('--metadata-ttl', dest='metadata_ttl', required=False, type=int, default=3600,
+                              help='Seconds to trust cached information on plugins requested at their latest version (Default: 3600)')
+    serve_parser.add_argument('--cache-size', dest='cache_size', required=False, type=int, default=2048,
+                              help='Maximum size (in MB) of the artifact cache (Default: 2048)')
+
+    __serve_parser = serve_parser
+    return __serve_parser
+
+
+def resolver_arguments(arguments=None, **options):
+    """
+    Arguments to run a MinecraftPluginResolver by, without parsing the command line.
+    :param arguments: Parsed arguments to start from; By default, those of a command line without any options.
+    :param options: Arguments to override, by their dest name (Ex: requirements='server.yml', location='server')
+    :return: The arguments, as an argparse Namespace.
+    """
+    values = vars(get_parser().parse_args([])) if arguments is None else dict(vars(arguments))
+    for name, value in options.items():
+        if name not in values:
+            raise ValueError("Unknown resolver option %s" % name)
+        values[name] = value
+    return argparse.Namespace(**values)
+
+
+# Names importable from mcresolver, by the module they're loaded from on first access; Importing them up front
+# would load the whole network & rendering stack even for --help and template generation.
+__lazy_attributes = {
+    'BukkitResource': 'bukget',
+    'SpigotResource': 'spiget',
+    'get_api_url': 'spiget',
+    'configure_plugin': 'mcresolver.scripts',
+    'get_config_from_file': 'mcresolver.scripts',
+    'save_plugin_config_script': 'mcresolver.scripts',
+    'write_file': 'mcresolver.files',
+    'sync_written_files': 'mcresolver.files',
+    'HostLimitedPool': 'mcresolver.pool',
+    'DownloadJob': 'mcresolver.downloads',
+    'download': 'mcresolver.downloads',
+    'download_all': 'mcresolver.downloads',
+    'format_size': 'mcresolver.downloads',
+    'CloudflareClearance': 'mcresolver.network',
+    'ConfigureJob': 'mcresolver.configuration',
+    'configure_all': 'mcresolver.configuration',
+    'generate_template_files': 'mcresolver.generation',
+    'GenerateJob': 'mcresolver.generation',
+    'generate_all': 'mcresolver.generation',
+    'discover_config_files': 'mcresolver.generation',
+    'is_batch_source': 'mcresolver.generation',
+    'write_index': 'mcresolver.generation',
+    'MetadataCache': 'mcresolver.cache',
+    'ArtifactCache': 'mcresolver.cache',
+    'artifact_key': 'mcresolver.cache',
+    'lockfile_path': 'mcresolver.lockfile',
+    'read_lockfile': 'mcresolver.lockfile',
+    'write_lockfile': 'mcresolver.lockfile',
+    'locked_lookup': 'mcresolver.lockfile',
+}
+
+
+def __getattr__(name):
+    if name == 'parser':
+        return get_parser()
+    if name == 'cache_parser':
+        return get_cache_parser()
+    if name in __lazy_attributes:
+        return getattr(importlib.import_module(__lazy_attributes[name]), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# Hosts the plugin metadata is retrieved from, used to limit concurrent requests against each.
+BUKGET_HOST = "api.bukget.org"
+SPIGET_HOST = "api.spiget.org"
+
+# BukGet url of a plugins information, used to revalidate cached metadata.
+BUKGET_PLUGIN_URL = "http://api.bukget.org/3/plugins/bukkit/%s"
 
 
 def deprecated(func):
@@ -79,85 +248,74 @@ class ChangeDir:
 
 
 class MinecraftPluginResolver(object):
-    def __init__(self, arguments):
+    """
+    Resolves the plugins of a requirements file, downloads them and configures them; Or generates config templates.
+
+    Each step is a separate call (resolve, download, configure) returning its result, so the resolver can be
+    embedded in other programs. Metadata & artifact caches and the Cloudflare clearance can be passed in to share
+    them (warm) between resolvers, as the daemon does.
+    """
+
+    def __init__(self, arguments=None, metadata_cache=None, artifacts=None, clearance=None, **options):
+        """
+        :param arguments: Parsed command line arguments (see get_parser) to run by; Any of them can be
+        overridden (or given without parsing the command line) as keyword options, by their dest name.
+        """
+        arguments = resolver_arguments(arguments, **options)
+        self.arguments = arguments
         self.requirements_file = arguments.requirements
         self.output_folder = arguments.location
         self.retrieve_latest_on_version_error = arguments.latest
+        self.max_workers = arguments.workers
+        self.per_host_limit = arguments.host_limit
+        self.render_processes = arguments.render_processes
+        self.metrics_report = arguments.metrics_report
+        self.metrics_textfile = arguments.metrics_textfile
+        self.trace_file = arguments.trace
         self.spigot_resources = OrderedDict()
         self.bukkit_resources = OrderedDict()
+        self.errors = []
 
         # Application specific folders; For storing scripts, and other files.
         self.app_data_folder = os.path.expanduser("~/.mcresolver/")
         self.scripts_folder = os.path.join(self.app_data_folder, "scripts")
+        self.metadata_folder = os.path.join(self.app_data_folder, "metadata")
+        self.cloudflare_tokens_file = os.path.join(self.app_data_folder, "cloudflare-tokens.json")
+        self.artifact_cache_folder = os.path.join(self.app_data_folder, "cache")
+        self.artifact_cache_size = arguments.cache_size * 1024 ** 2
 
         # Used to handle the generation portion of mcresolver. Taking a configuration file
         # And generating a template, and set of default values for the template.
-        self.generate_base_config_file = None if args.generate is None else os.path.expanduser(args.generate)
-        self.generate_plugin_name = None if args.genplugin is None else args.genplugin
+        self.generate_base_config_file = None if arguments.generate is None else os.path.expanduser(arguments.generate)
+        self.generate_plugin_name = arguments.genplugin
+        self.generate_processes = arguments.generate_processes
+        self.generate_incremental = arguments.incremental
 
         # Initialize the mcresolver configuration folders and files.
         self.__init_app_config()
 
-        if args.generate is not None and args.genplugin is not None:
-            if self.output_folder is None:
-                print(
-                    "To generate plugin configuration, you also require the '-l [Folder]' flag, specifying where to save the generated configuration")
-                parser.print_help()
-                sys.exit(0)
-
-            self.generate_templates()
-            print("Generated config templates for %s and saved them to %s" % (
-                self.generate_plugin_name, self.output_folder))
-            sys.exit(0)
-
-        elif args.requirements is None:
-            print(textwrap.dedent("""\n
-            ==================================
-                McResolver Execution Error
-            ==================================
-
-                McResolver has limited ways it can be utilized, each of which
-                with their own required options, variables, functionality and
-                purpose.
-
-
-                Retrieve and Configure Plugins
-                ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-                    Download plugins from Bukkit and Spigot, then automatically configure
-                    them to your likings.
-
-                    This option requires you to use the '-r' or '--requirements' flag, to pass
-                    a yml based file outlining the location to store your plugins and config (locally),
-                    what plugins to download, and what options to pass to the configuration template, or script,
-                    to generate the plugins config.
-
-
-                Generate Configuration Files
-                ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-                    Using fresh plugin configuration, or previously configured plugins you
-                    pass a few flags (-g [config file], -gl [store location], and -gpl [Plugin name])
-                    then McResolver will generate a Jinja2 Template, along with defaults file for you to
-                    configure your plugins by.
-
-                    The template will hold the structure of the configuration file, while the defaults file
-                    is used to replace all variables that aren't defined when executing the 'Retrieve and Configure'
-                    method described above.
-
-                    This way, if you wish to deploy the same configuration for every plugin install, or have some deviate
-                    in different ways you can do so, modifying only the values you wish to modify, while keeping all the
-                    others exactly how you like them!
-
-
-                Please use one of the methods listed above, and their required options when executing McResolver.
-            """).format())
-
-            parser.print_help()
-            sys.exit(0)
-
-        # Parse the yaml file holding all the requested plugins to resolve the plugins with further on.
-        self.parse_config_file()
+        # Plugin information retrieved from BukGet & Spiget is cached between runs; The caches are created once
+        # they're needed, unless they were passed in.
+        self.metadata_cache = metadata_cache
+        self.artifacts = artifacts
+        self.clearance = clearance
+        self.refresh = arguments.refresh
+        self.lockfile = None
+        self.resolution = None
+
+        # Spans are only recorded when a trace was requested.
+        if self.trace_file is not None:
+            from mcresolver.tracing import start_tracing
+            start_tracing()
+
+    @property
+    def batch_generate(self):
+        """
+        Whether templates are generated for a whole plugins folder (or glob of configurations) rather than one file.
+        """
+        from mcresolver.generation import is_batch_source
+
+        return self.generate_base_config_file is not None and is_batch_source(self.generate_base_config_file)
 
     def __init_app_config(self):
         if not os.path.exists(self.app_data_folder):
@@ -174,154 +332,154 @@ class MinecraftPluginResolver(object):
         pass
 
     def generate_templates(self):
-        def get_name_from_key(key):
-            return key.lower().replace('-', '_').replace('.', '_')
-
-        def assign_dict_nested_path(dict, path, value):
-            def get(d, keys):
-                for key in keys:
-                    if key not in d:
-                        d[key] = OrderedDict()  # TODO Investigate? Might need to instance another object
-                        #     # print("Assigned empty value to path %s" % path)
-                    d = d[key]
-                return d
-
-            def set(d, keys, value):
-                d = get(d, keys[:-1])
-                d[keys[-1]] = value
-
-            if '.' in path:
-                set(dict, path.split('.'), value)
-            else:
-                dict[path] = value
-
-        def recursive_dictionary_collect(template_dict, parent_key, data):
-            for key, value in data.items():
-                new_key = key if parent_key is None else "%s.%s" % (parent_key, key)
-                if isinstance(value, dict) or isinstance(value, OrderedDict):
-                    recursive_dictionary_collect(template_dict, new_key, value)
-                else:
-                    if isinstance(value, list):
-                        depth = len(new_key.split('.')) * 2
-                        value.append('mcresolverdepth=%s' % depth)
-                    template_dict[new_key] = value
-
-        flat_key_template = OrderedDict()
-
-        default_pluginfile_data = yamlbro.load_yaml(self.generate_base_config_file)
-
-        for key, value in default_pluginfile_data.items():
-            if isinstance(value, dict) or isinstance(value, OrderedDict):
-                # replica_dict[key] = value
-                recursive_dictionary_collect(flat_key_template, key, value)
-            else:
-                if isinstance(value, list):
-                    value.append(
-                        'mcresolverdepth=1')  # Hack around the template, and add the depth to prepend to the node
-                flat_key_template[key] = value
-
-        template_default_node_values = OrderedDict()
-        node_value_types = {}
-
-        for key, value in flat_key_template.items():
-            node_name = key
-            if '.' in key:
-                node_split = key.split('.')
-                if len(node_split) >= 2:
-                    node_name = ".".join(node_split[-2:])
-                else:
-                    node_name = node_split[-1]
-
-            node_name = get_name_from_key(node_name)
-            # print("Key [%s] Node-Name %s" % (key, node_name))
-            # node_name = get_name_from_key(node_name)
-            value_type = value.__class__.__name__
-
-            try:
-                tdval = type(value)(value)
-                if value_type == "bool":
-                    tdval = str(tdval).lower()
-
-                template_default_node_values[node_name] = tdval
-                node_value_types[node_name] = value_type
-                node_type = tdval.__class__.__name__
-            except:
-                template_default_node_values[node_name] = value
-                node_value_types[node_name] = value_type
-                node_type = value_type.__class__.__name__
-
-            flat_key_template[key] = "{{{{{node}}}}}".format(node=node_name)
-
-        expanded_key_config_template = OrderedDict()
-
-        for key, value in flat_key_template.items():
-            assign_dict_nested_path(expanded_key_config_template, key, value)
-
-        config_template = yaml.dump(expanded_key_config_template, default_flow_style=False, indent=2,
-                                    width=1000)
-
-        with open(self.generate_base_config_file, 'r') as default_configuration_data:
-            default_plugin_config = default_configuration_data.read()
-
-        config_template = restore_yaml_comments(config_template, default_plugin_config)
-
-        # Loop through all the nodes and their values, then change the jinja2 template
-        # Variable to follow the format required for that item..
-        # The reason we do this is to re-assign types to values (via their template-names)
-        # As by default they all are quoted and are treated as strings.
-        # We don't want this!
-        for node, type in node_value_types.items():
-            if type == "bool" or type == "int" or type == "float":
-                config_template = config_template.replace("'{{{{{node}}}}}'".format(node=node),
-                                                          "{{{{{node}}}}}".format(node=node))
-            elif type == "str":
-                continue
-            elif type == "list":
-                # If the value of the item is a list
-                # Then there's quite a few things we have to do in order to preserve the format of the file!
-                # First of all involves getting the depth (via a default value generated and added into the list)
-                # Though this won't wind up in the final template. We do this because we need to have
-                # The valid number of spaces before the list items, otherwise YAML Will break.
-                node_list_values = template_default_node_values[node].copy()
-                depth = 0
-                for line in node_list_values:
-                    if 'mcresolverdepth' in line:
-                        # The depth of the item will be indexed by this!
-                        # Depth is determined by how many parent keys, are above the child node
-                        # Multiplied by 2, for yaml conventions.
-                        # Example: Top-Level lists only have 2 spaces
-                        # Whereas a list under top.level.list would have 4
-                        depth = int(line.split('=')[1])
-                        break
-
-                # Collect all the nodes list items that dont have a depth attribute
-                node_list_values = [line for line in node_list_values if 'mcresolverdepth' not in line]
-                # Then reassign this value to the template defaults,
-                # as we don't want the depth to be inside the users
-                template_default_node_values[node] = node_list_values
-                # Next we generate a loop statement for inside the template
-                # On our node, to assure all the items in the list are processed
-                loop_statement = "\n{{% for {node}_item in {node} %}}{depth}- {{{{list_item}}}}\n{{% endfor %}}".format(
-                    depth=' ' * depth, node=node
-                )
-
-                # Lastly, for this part, replace the previous {{node}} item with the new list-generating statement
-                # That was created above.
-                config_template = config_template.replace(" '{{{{{node}}}}}'".format(node=node),
-                                                          loop_statement)
-
-        # Get the file contents for the default template nodes and their values in a yaml output!
-        defaults_file_contents = yaml.dump(template_default_node_values, default_flow_style=False)
-        # Next up, we need to remove all the 'none' values inside of this file, as it's really not a good idea
-        # to have yaml parse "none" values... It'd return a string. So we make them blank instead.
-        defaults_file_contents = defaults_file_contents.replace(": none", ": ")
-        write_file(os.path.join(self.output_folder, '%s-template.yml' % self.generate_plugin_name),
-                   config_template)
-        write_file(os.path.join(self.output_folder, '%s-defaults.yml' % self.generate_plugin_name),
-                   defaults_file_contents)
+        """
+        Generate the template & defaults of a single plugin configuration into the output folder.
+        :return: Tuple of the TemplateGenerator and the TemplateDelta patched in (None unless incremental)
+        """
+        from mcresolver.files import sync_written_files
+        from mcresolver.generation import generate_template_files
+        from mcresolver.metrics import get_metrics
+
+        metrics = get_metrics()
+        started = time.time()
+        with metrics.phase('generate'):
+            generator, delta = generate_template_files(
+                self.generate_base_config_file,
+                os.path.join(self.output_folder, '%s-template.yml' % self.generate_plugin_name),
+                os.path.join(self.output_folder, '%s-defaults.yml' % self.generate_plugin_name),
+                incremental=self.generate_incremental)
+            sync_written_files()
+
+        elapsed = time.time() - started
+        metrics.observe('mcresolver_generate_duration_seconds', elapsed)
+        metrics.record_plugin(self.generate_plugin_name, generate_seconds=elapsed, nodes=len(generator.nodes))
+
+        if delta is not None:
+            print("Patched %s into the config templates of %s" % (delta, self.generate_plugin_name))
+        return generator, delta
+
+    def generate_batch_templates(self):
+        """
+        Generate the templates & defaults of every plugin configuration inside a plugins folder (or matching a glob),
+        on a pool of processes; Indexing them in the output folder.
+        """
+        from mcresolver.generation import GenerateJob, generate_all, discover_config_files, write_index
+        from mcresolver.metrics import get_metrics
+
+        jobs = [GenerateJob(plugin, config_file, self.output_folder, incremental=self.generate_incremental)
+                for plugin, config_file in discover_config_files(self.generate_base_config_file)]
+        if len(jobs) == 0:
+            print("Unable to find any plugin configuration in %s" % self.generate_base_config_file)
+            return jobs
+
+        print("Generating config templates for %s configuration files" % len(jobs))
+        with get_metrics().phase('generate'):
+            jobs = generate_all(jobs, processes=self.generate_processes)
+        index_file = write_index(self.output_folder, jobs)
+        generated = len([job for job in jobs if job.error is None])
+        print("Generated %s of %s config templates and saved them to %s (Index: %s)" % (
+            generated, len(jobs), self.output_folder, index_file))
+        return jobs
+
+    def __parse_configure_section(self, name, version, data):
+        """
+        Collect the configuration options (script, template, defaults, options and args) requested
+        for a plugin inside the requirements file.
+        """
+        configure_after_download = False
+        configure_options = {}
+        configure_script = None
+        template_file = None
+        defaults_file = None
+        plugin_folder = None
+        kwargs = {}
+
+        if 'configure' in data.keys():
+            if 'options' in data['configure']:
+                configure_after_download = True
+                for option, value in data['configure']['options'].items():
+                    configure_options[option] = value
+
+            if 'args' in data['configure'].keys():
+                for key, value in data['configure']['args'].items():
+                    kwargs[key] = value
+
+            if 'script' in data['configure'].keys():
+                configure_script = data['configure']['script']
+                print("Script found: %s" % configure_script)
+
+            if 'template' in data['configure'].keys():
+                template_file = data['configure']['template']
+
+            if 'defaults' in data['configure'].keys():
+                defaults_file = data['configure']['defaults']
+
+            if 'plugin-data-folder' in data['configure'].keys():
+                plugin_folder = data['configure']['plugin-data-folder']
+
+            if (template_file is not None and defaults_file is None) or (
+                            defaults_file is not None and template_file is None):
+                template_file = None
+                defaults_file = None
+                configure_after_download = False
 
-    def parse_config_file(self):
-        config = yamlbro.load_yaml(self.requirements_file)
+                print(textwrap.dedent("""\n
+                    +==================================================================+
+                            Configuration Error for {name} ({version})
+                    +==================================================================+
+
+                        Generating a plugins configuration file via template & default configuration
+                        requires the 'template', 'plugin-data-folder', and 'defaults' node to be present, and valid
+                        inside your requirements file ({configuration}).
+
+                        Using one without the others nulls the functionality, as a template has placeholders
+                        for your config data, and the defaults file fills in the blanks where you
+                        have not specified values. Using either without a plugin data folder doesn't make sense,
+                        as you'd want to keep the template and defaults once it's generated.
+
+                        McResolver will continue to download these plugins, though configuration cannot happen
+                        unless you provide a template, plugin data folder, and defaults file, or a script that
+                        handles the configuration.
+
+                    +==================================================================+
+                    """).format(name=name, version=version, configuration=self.requirements_file))
+
+        return {
+            'version': version,
+            'requested-version': version,
+            'name': name,
+            'resource': None,
+            'configure': configure_after_download,
+            'script': configure_script,
+            'configure-options': configure_options,
+            'kwargs': kwargs,
+            'template': template_file,
+            'defaults': defaults_file,
+            'plugin-folder': plugin_folder,
+        }
+
+    def read_requirements(self):
+        """
+        Read the requirements file (and lockfile), collecting every requested plugin in the order it was requested.
+        :return: Tuple of the requested plugins (as tuples of their source, plugin name or id, and entry),
+                 and the plugins recorded in the lockfile.
+        """
+        from mcresolver import yamlio
+        from mcresolver.cache import MetadataCache
+        from mcresolver.lockfile import lockfile_path, read_lockfile
+
+        if self.requirements_file is None:
+            raise ValueError("A requirements file is required to resolve plugins")
+
+        if self.metadata_cache is None:
+            self.metadata_cache = MetadataCache(self.metadata_folder, ttl=self.arguments.metadata_ttl,
+                                                refresh=self.refresh)
+
+        config = yamlio.load_file(self.requirements_file)
+
+        # Plugins recorded in the lockfile (at the version requested) are used as-is, skipping their resolution.
+        self.lockfile = lockfile_path(self.requirements_file)
+        locked = {} if self.refresh else read_lockfile(self.lockfile)
 
         if 'target-folder' in config.keys() and self.output_folder is None:
             print("Info: Files and Configuration will be stored in %s" % self.output_folder)
@@ -330,113 +488,23 @@ class MinecraftPluginResolver(object):
             if not os.path.exists(self.output_folder):
                 os.makedirs(self.output_folder)
 
+        # Collect every requested plugin (in the order of the requirements file) before
+        # doing any lookups, so their metadata can be retrieved concurrently further on.
+        requested = []
+
         if 'Bukkit' in config.keys():
             bukkit_data = config['Bukkit']
 
             for plugin_name in bukkit_data.keys():
                 data = bukkit_data[plugin_name]
-                version = data['version']
-                configure_after_download = False
-                configure_options = {}
-                configure_script = None
-                template_file = None
-                defaults_file = None
-                plugin_folder = None
-                kwargs = {}
-
-                if 'configure' in data.keys():
-                    if 'options' in data['configure']:
-                        configure_after_download = True
-                        for option, value in data['configure']['options'].items():
-                            configure_options[option] = value
-
-                    if 'args' in data['configure'].keys():
-                        for key, value in data['configure']['args'].items():
-                            kwargs[key] = value
-
-                    if 'script' in data['configure'].keys():
-                        configure_script = data['configure']['script']
-                        print("Script found: %s" % configure_script)
-
-                    if 'template' in data['configure'].keys():
-                        template_file = data['configure']['template']
-
-                    if 'defaults' in data['configure'].keys():
-                        defaults_file = data['configure']['defaults']
-
-                    if 'plugin-data-folder' in data['configure'].keys():
-                        plugin_folder = data['configure']['plugin-data-folder']
-
-                    if (template_file is not None and defaults_file is None) or (
-                                    defaults_file is not None and template_file is None):
-                        template_file = None
-                        defaults_file = None
-                        configure_after_download = False
-
-                        print(textwrap.dedent("""\n
-                            +==================================================================+
-                                    Configuration Error for {name} ({version})
-                            +==================================================================+
-
-                                Generating a plugins configuration file via template & default configuration
-                                requires the 'template', 'plugin-data-folder', and 'defaults' node to be present, and valid
-                                inside your requirements file ({configuration}).
-
-                                Using one without the others nulls the functionality, as a template has placeholders
-                                for your config data, and the defaults file fills in the blanks where you
-                                have not specified values. Using either without a plugin data folder doesn't make sense,
-                                as you'd want to keep the template and defaults once it's generated.
-
-                                McResolver will continue to download these plugins, though configuration cannot happen
-                                unless you provide a template, plugin data folder, and defaults file, or a script that
-                                handles the configuration.
-
-                            +==================================================================+
-                            """).format(name=plugin_name, version=version, configuration=self.requirements_file))
+                entry = self.__parse_configure_section(plugin_name, data['version'], data)
 
                 if isinstance(plugin_name, int) or plugin_name.isdigit():
-                    print("Invalid Bukkit plugin '%s', plugin name or slug (in plugins url) is required")
+                    print("Invalid Bukkit plugin '%s', plugin name or slug (in plugins url) is required" % plugin_name)
+                    self.__record_error('Bukkit', plugin_name, "A plugin name or slug is required")
                     continue
 
-                try:
-                    bukkit_resource = BukkitResource.from_name(plugin_name)
-                except ValueError:
-                    print("Unable to retrieve Bukkit plugin %s (v. %s)" % (plugin_name, version))
-
-                if not bukkit_resource.has_version(version=version):
-                    if not self.retrieve_latest_on_version_error:
-                        print("Unable to retrieve version %s for %s" % (version, plugin_name))
-                        continue
-                    else:
-                        self.bukkit_resources[plugin_name] = {
-                            'version': 'latest',
-                            'name': plugin_name,
-                            'resource': bukkit_resource,
-                            'configure': configure_after_download,
-                            'script': configure_script,
-                            'configure-options': configure_options,
-                            'kwargs': kwargs,
-                            'template': template_file,
-                            'defaults': defaults_file,
-                            'plugin-folder': plugin_folder,
-                        }
-                else:
-                    self.bukkit_resources[plugin_name] = {
-                        'version': version,
-                        'name': plugin_name,
-                        'resource': bukkit_resource,
-                        'configure': configure_after_download,
-                        'script': configure_script,
-                        'configure-options': configure_options,
-                        'kwargs': kwargs,
-                        'template': template_file,
-                        'defaults': defaults_file,
-                        'plugin-folder': plugin_folder,
-
-                    }
-
-                print("Bukkit information retrieved on %s (v: %s)" % (
-                    plugin_name, self.bukkit_resources[plugin_name]['version']))
+                requested.append(('Bukkit', plugin_name, entry))
 
         # Go ahead and collect all the Spigot resources in the yml file
         # and their desired versions (or latest)
@@ -444,248 +512,637 @@ class MinecraftPluginResolver(object):
             spigot_plugins = config['Spigot']
             for plugin_id in spigot_plugins.keys():
                 data = spigot_plugins[plugin_id]
-                spigot_resource = None
-                version = data['version']
-                name = data['name']
-                configure_after_download = False
-                configure_script = None
-                configure_options = {}
-                template_file = None
-                defaults_file = None
-                plugin_folder = None
-                kwargs = {}
-                if 'configure' in data.keys():
-                    if 'options' in data['configure']:
-                        configure_after_download = True
-                        for option, value in data['configure']['options'].items():
-                            configure_options[option] = value
-
-                    if 'args' in data['configure'].keys():
-                        for key, value in data['configure']['args'].items():
-                            kwargs[key] = value
-
-                    if 'script' in data['configure'].keys():
-                        configure_script = data['configure']['script']
-
-                    if 'template' in data['configure'].keys():
-                        template_file = data['configure']['template']
-
-                    if 'defaults' in data['configure'].keys():
-                        defaults_file = data['configure']['defaults']
-
-                    if 'plugin-data-folder' in data['configure'].keys():
-                        plugin_folder = data['configure']['plugin-data-folder']
-
-                    if (template_file is not None and defaults_file is None) or (
-                                    defaults_file is not None and template_file is None):
-                        template_file = None
-                        defaults_file = None
-                        configure_after_download = False
-                        print(textwrap.dedent("""\n
-                            +==================================================================+
-                                    Configuration Error for {name} ({version})
-                            +==================================================================+
-
-                                Generating a plugins configuration file via template & default configuration
-                                requires the 'template', 'plugin-data-folder', and 'defaults' node to be present, and valid
-                                inside your requirements file ({configuration}).
-
-                                Using one without the others nulls the functionality, as a template has placeholders
-                                for your config data, and the defaults file fills in the blanks where you
-                                have not specified values. Using either without a plugin data folder doesn't make sense,
-                                as you'd want to keep the template and defaults once it's generated.
-
-                                McResolver will continue to download these plugins, though configuration cannot happen
-                                unless you provide a template, plugin data folder, and defaults file, or a script that
-                                handles the configuration.
-
-                            +==================================================================+
-                            """).format(name=name, version=version, configuration=self.requirements_file))
-
-                if isinstance(plugin_id, int) or plugin_id.isdigit():
-                    spigot_resource = SpigotResource.from_id(plugin_id)
-                else:
+                entry = self.__parse_configure_section(data['name'], data['version'], data)
+
+                if not (isinstance(plugin_id, int) or plugin_id.isdigit()):
                     print(
-                        "Unable to retrieve Spigot plugin (%s) via its name... Potential feature in the future!" % name)
+                        "Unable to retrieve Spigot plugin (%s) via its name... Potential feature in the future!" %
+                        entry['name'])
+                    self.__record_error('Spigot', plugin_id, "Spigot plugins are requested by their resource id")
                     continue
 
-                if spigot_resource is None:
-                    print("Invalid plugin %s (v: %s)" % (name, version))
+                requested.append(('Spigot', plugin_id, entry))
+
+        return requested, locked
+
+    def __lookup_host(self, source):
+        return BUKGET_HOST if source == 'Bukkit' else SPIGET_HOST
+
+    def __lookup(self, source, plugin, entry):
+        """
+        Look the metadata of a plugin up on BukGet or Spiget (or in the metadata cache), timing how long it takes.
+        :return: The record of the plugin; See lookup_bukkit_resource & lookup_spigot_resource.
+        """
+        from mcresolver import tracing
+        from mcresolver.metrics import get_metrics, plugin_scope
+
+        lookup = lookup_bukkit_resource if source == 'Bukkit' else lookup_spigot_resource
+        metrics = get_metrics()
+        started = time.time()
+        try:
+            with plugin_scope(entry['name']), tracing.span("lookup %s" % plugin, 'metadata',
+                                                           host=self.__lookup_host(source), version=entry['version']):
+                return lookup(plugin, entry['version'], self.retrieve_latest_on_version_error, self.metadata_cache)
+        except Exception as e:
+            metrics.record_plugin(entry['name'], resolve_error=str(e))
+            raise
+        finally:
+            elapsed = time.time() - started
+            metrics.observe('mcresolver_lookup_duration_seconds', elapsed, host=self.__lookup_host(source))
+            metrics.record_plugin(entry['name'], resolve_seconds=elapsed)
+
+    def __merge_resolved(self, source, plugin, entry, record):
+        """
+        Merge what a plugin resolved to into its entry, and list it among the resolved resources.
+        """
+        entry.update(record)
+        if source == 'Spigot' and 'file-name' not in entry:
+            entry['file-name'] = "%s-%s%s" % (entry['name'], entry['resolved-version'], entry['resource'].file_type)
+
+    def __report_resolved(self, source, plugin, entry, error=None):
+        if error is not None:
+            print("Unable to retrieve %s plugin %s (v. %s): %s" % (
+                source, plugin if source == 'Bukkit' else entry['name'], entry['version'], error))
+            self.__record_error(source, plugin, error)
+        elif source == 'Bukkit':
+            print("Bukkit information retrieved on %s (v: %s)" % (plugin, entry['version']))
+        else:
+            print("Spigot information retrieved on %s [id. %s] (v. %s)" % (entry['name'], plugin, entry['version']))
+
+    def __expected_size(self, source, plugin, entry):
+        """
+        How big a resolved plugin's download is expected to be: The size of the version of it cached last,
+        or the size Spiget reports.
+        :return: The size in bytes, 0 if it's unknown.
+        """
+        size = self.artifacts.last_size(source.lower(), plugin) if self.artifacts is not None else None
+        return size or entry.get('file-size') or 0
+
+    def __resources(self, source):
+        return self.bukkit_resources if source == 'Bukkit' else self.spigot_resources
+
+    def parse_config_file(self):
+        from mcresolver.pool import HostLimitedPool
+        from mcresolver.lockfile import locked_lookup
+
+        requested, locked = self.read_requirements()
+
+        # Fan the lookups out over the worker pool; BukGet and Spiget each get their own
+        # concurrency limit, and results are merged back in the requirements order.
+        with HostLimitedPool(max_workers=self.max_workers, per_host=self.per_host_limit) as pool:
+            lookups = [(source, plugin, entry,
+                        locked_lookup(locked, source, plugin, entry['version']) or
+                        pool.submit(self.__lookup_host(source), self.__lookup, source, plugin, entry))
+                       for source, plugin, entry in requested]
+
+            for source, plugin, entry, lookup in lookups:
+                try:
+                    self.__merge_resolved(source, plugin, entry, lookup.result())
+                except Exception as e:
+                    self.__report_resolved(source, plugin, entry, e)
                     continue
 
-                if not spigot_resource.has_version(version=version):
-                    if not self.retrieve_latest_on_version_error:
-                        print("Unable to retrieve version %s for %s" % (version, name))
-                        continue
-
-                    self.spigot_resources[plugin_id] = {
-                        'version': 'latest',
-                        'name': name,
-                        'resource': spigot_resource,
-                        'configure': configure_after_download,
-                        'script': configure_script,
-                        'configure-options': configure_options,
-                        'kwargs': kwargs,
-                        'template': template_file,
-                        'defaults': defaults_file,
-                        'plugin-folder': plugin_folder,
-
-                    }
-                else:
-                    self.spigot_resources[plugin_id] = {
-                        'version': version,
-                        'name': name,
-                        'resource': spigot_resource,
-                        'configure': configure_after_download,
-                        'script': configure_script,
-                        'configure-options': configure_options,
-                        'kwargs': kwargs,
-                        'template': template_file,
-                        'defaults': defaults_file,
-                        'plugin-folder': plugin_folder,
-                    }
-
-                if isinstance(plugin_id, int):
-                    print("Spigot information retrieved on %s [id. %s] (v. %s)" % (name, plugin_id,
-                                                                                   self.spigot_resources[plugin_id][
-                                                                                       'version']))
+                self.__resources(source)[plugin] = entry
+                self.__report_resolved(source, plugin, entry)
+
+    def __record_error(self, source, plugin, error):
+        self.errors.append({'source': source, 'plugin': plugin, 'error': str(error)})
+
+    def resolve(self):
+        """
+        Resolve every plugin requested in the requirements file; Which version to use and where to download it from.
+        :return: ResolveResult of the plugins resolved, and those that couldn't be.
+        """
+        from mcresolver.metrics import get_metrics
+        from mcresolver.results import ResolveResult
+
+        started = time.time()
+        self.__reset()
+
+        with get_metrics().phase('resolve'):
+            self.parse_config_file()
+        self.resolution = ResolveResult(self.requirements_file, self.output_folder, self.bukkit_resources,
+                                        self.spigot_resources, self.errors, time.time() - started)
+        return self.resolution
+
+    def __reset(self):
+        self.bukkit_resources.clear()
+        self.spigot_resources.clear()
+        del self.errors[:]
+
+    def __prepare_downloads(self):
+        """
+        Create the output folder, Cloudflare clearance and artifact cache downloads require.
+        :return: The output folder, plugins are downloaded into.
+        """
+        from mcresolver.network import CloudflareClearance
+        from mcresolver.cache import ArtifactCache
+
+        output_folder = os.path.expanduser(self.output_folder)
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+
+        # Cloudflare clearance (for SpigotMC) is only acquired once a download needs it,
+        # and is reused across runs until it expires.
+        if self.clearance is None:
+            self.clearance = CloudflareClearance(self.cloudflare_tokens_file)
+        # Plugins that were retrieved before are taken from the artifact cache.
+        if self.artifacts is None:
+            self.artifacts = ArtifactCache(self.artifact_cache_folder, max_size=self.artifact_cache_size)
+        return output_folder
+
+    def __download_job(self, source, plugin, data, output_folder):
+        from mcresolver.downloads import DownloadJob
+        from mcresolver.cache import artifact_key
+
+        return DownloadJob(data['resource'].plugin_name if source == 'Bukkit' else data['resource'].name,
+                           data['download-url'], os.path.join(output_folder, data['file-name']), data,
+                           cache_key=artifact_key(source.lower(), plugin, data['resolved-version']),
+                           checksum=data.get('sha256'))
+
+    def __report_downloads(self, jobs):
+        for job in jobs:
+            if job.error is not None:
+                print("Unable to download resource %s from %s (%s)" % (job.name, job.url, job.error))
+                continue
 
-    def generate_plugin_configuration(self):
+            job.data['size'] = job.size
+            job.data['sha256'] = job.sha256
+            if job.unchanged:
+                print("Plugin %s is up to date (%s)" % (job.name, job.file_name))
+            else:
+                print("Downloaded plugin %s to %s" % (job.name, job.file_name))
+
+    def download(self):
+        """
+        Download every resolved plugin into the output folder (resolving them first if they haven't been),
+        and record what they resolved to in the lockfile.
+        :return: DownloadResult holding a DownloadJob per plugin.
+        """
+        from mcresolver.downloads import download_all
+        from mcresolver.lockfile import write_lockfile
+        from mcresolver.metrics import get_metrics
+        from mcresolver.results import DownloadResult
+
+        if self.resolution is None:
+            self.resolve()
+
+        started = time.time()
+        output_folder = self.__prepare_downloads()
+
+        # Download every Bukkit and Spigot plugin concurrently.
+        jobs = [self.__download_job('Bukkit', plugin, data, output_folder)
+                for plugin, data in self.bukkit_resources.items()]
+        jobs += [self.__download_job('Spigot', plugin, data, output_folder)
+                 for plugin, data in self.spigot_resources.items()]
+
+        print("Retrieving %s Bukkit and %s Spigot Resources" % (len(self.bukkit_resources),
+                                                                len(self.spigot_resources)))
+        with get_metrics().phase('download'):
+            jobs = download_all(jobs, self.clearance, self.artifacts, max_workers=self.max_workers,
+                                per_host=self.per_host_limit)
+        self.__report_downloads(jobs)
+
+        # Record what every plugin resolved to, so following runs can skip resolving them.
+        write_lockfile(self.lockfile, self.bukkit_resources, self.spigot_resources)
+        return DownloadResult(jobs, time.time() - started)
+
+    def __plugins_folder(self):
         plugins_folder = os.path.join(self.output_folder, "plugins")
         if not os.path.exists(plugins_folder):
             os.makedirs(plugins_folder)
+        return plugins_folder
 
-        # Loop through all the available spigot resources and their data
-        # To see if they're desired to be configured!
-        for plugin, data in self.spigot_resources.items():
-            configure = data['configure']
-            values = data['configure-options']
-            kwargs = data['kwargs']
-            script = data['script']
-            template = data['template']
-            defaults = data['defaults']
-            data_folder = data['plugin-folder']
-
-            if not configure:
-                continue
-
-            if data_folder is not None:
-                kwargs['plugin_folder'] = data_folder
-
-            if script is not None:
-                print("Script for %s is %s" % (data['name'], script))
-                if is_url(script):
-                    script = save_plugin_config_script(self.scripts_folder, script)
-                else:
-                    script = os.path.expanduser(data['script'])
+    def __configure_job(self, data, plugins_folder):
+        from mcresolver.configuration import ConfigureJob
 
-            resource = data['resource']
-            if configure_plugin(resource, data['version'], plugins_folder,
-                                config_options=values, script=script, script_folder=self.scripts_folder, **kwargs):
-                print("Configuration for %s has been generated!" % data['name'])
-            else:
-                print("Failed to create configuration for %s." % data['name'])
+        kwargs = dict(data['kwargs'])
+        if data['plugin-folder'] is not None:
+            kwargs['plugin_folder'] = data['plugin-folder']
 
-        for plugin, data in self.bukkit_resources.items():
-            configure = data['configure']
-            values = data['configure-options']
-            script = data['script']
-            kwargs = data['kwargs']
-            data_folder = data['plugin-folder']
+        return ConfigureJob(data['name'], data['resource'], data['version'], plugins_folder,
+                            self.scripts_folder, config_options=data['configure-options'],
+                            script=data['script'], template_file=data['template'],
+                            defaults_file=data['defaults'], kwargs=kwargs)
 
-            if data_folder is not None:
-                kwargs['plugin_folder'] = data_folder
+    def generate_plugin_configuration(self):
+        from mcresolver.configuration import configure_all
 
-            if not configure:
-                continue
+        plugins_folder = self.__plugins_folder()
 
-            if script is not None:
-                if is_url(script):
-                    script = save_plugin_config_script(self.scripts_folder, script)
-                else:
-                    script = os.path.expanduser(data['script'])
-                print("Script is %s" % script)
-
-            resource = data['resource']
-            if configure_plugin(resource, data['version'], plugins_folder,
-                                config_options=values, script=script, script_folder=self.scripts_folder, **kwargs):
-                print("Configuration for %s has been created to your likings!" % data['name'])
-            else:
-                print("Failed to create configuration for %s." % data['name'])
+        # Collect all the available spigot & bukkit resources desired to be configured,
+        # and configure them concurrently.
+        jobs = [self.__configure_job(data, plugins_folder)
+                for data in list(self.spigot_resources.values()) + list(self.bukkit_resources.values())
+                if data['configure']]
 
-    def run(self):
-        print("Collecting requested resources to run the Plugin Resolver by!")
-        if not os.path.exists(os.path.expanduser(self.output_folder)):
-            try:
-                os.makedirs(os.path.expanduser(self.output_folder))
-            except OSError:
-                print("Unable to create directory: %s" % self.output_folder)
-                return
-
-        # Change the working directory to the requested
-        # Folder to save plugins in.
-        with ChangeDir(os.path.expanduser(self.output_folder)):
-            print("Loading Resource information")
-            tokens, user_agent = cfscrape.get_tokens('http://www.spigotmc.org')
-            # First, iterate through all the bukkit plugins to resolve
-            # and begin downloading them.
-            print("Retrieving Bukkit Resources")
-            for plugin, data in self.bukkit_resources.items():
-                resource = data['resource']
-                version = data['version']
-                download_url = resource.get_download_link(version=version)
-                file_name = resource.get_versioned_file_name(version=version)
+        return configure_all(jobs, max_workers=self.max_workers, processes=self.render_processes)
 
-                try:
-                    download(file_name, download_url, tokens, user_agent)
-                    print("Downloaded plugin %s to %s" % (resource.plugin_name, file_name))
+    def configure(self):
+        """
+        Configure every resolved plugin that requested it (resolving them first if they haven't been).
+        :return: ConfigureResult holding a ConfigureJob per plugin configured.
+        """
+        from mcresolver.metrics import get_metrics
+        from mcresolver.results import ConfigureResult
 
-                except FileNotFoundError:
-                    print("Unable to download resource %s from %s" % (resource.plugin_name, download_url))
+        if self.resolution is None:
+            self.resolve()
 
-            print("Retrieving Spigot Resources")
-            for plugin, data in self.spigot_resources.items():
-                resource = data['resource']
-                version = data['version']
-                name = data['name']
-                download_url = resource.get_download_link(version=version)
-                requested_version = resource.version if version == "latest" else version
+        started = time.time()
+        with get_metrics().phase('configure'):
+            jobs = self.generate_plugin_configuration()
+        return ConfigureResult(jobs, time.time() - started)
 
-                file_name = "%s-%s%s" % (name, requested_version, resource.file_type)
-                try:
-                    download(file_name, download_url, tokens, user_agent)
-                    print("Downloaded plugin %s to %s" % (resource.name, file_name))
-                except FileNotFoundError:
-                    print("Unable to download resource %s from %s" % (resource.name, download_url))
+    def run(self):
+        """
+        Resolve, download and configure every plugin of the requirements file.
+
+        Each plugin is a small graph of tasks (resolve, then download alongside fetching its template, defaults
+        and script, then configure) run by a PipelineExecutor; So plugins configure while others still download.
+        When the plugins were resolved beforehand (see resolve) they're downloaded, then configured, as a whole.
+        :return: RunResult of every step.
+        """
+        from mcresolver.metrics import get_metrics
+        from mcresolver.results import RunResult
+
+        with get_metrics().phase('run'):
+            if self.resolution is not None:
+                print("Collecting requested resources to run the Plugin Resolver by!")
+                downloads = self.download()
+
+                print("Beginning configuration generation!")
+                result = RunResult(self.resolution, downloads, self.configure())
+            else:
+                result = self.__run_pipeline()
 
-        print("Beginning configuration generation!")
-        self.generate_plugin_configuration()
         # Cleanup the access data retrieved by the plugin!
-
         print("Cleaning the trash!")
         self.__cleanup()
         print("Finished Operations! Resolution complete!")
+        return result
+
+    def export_metrics(self):
+        """
+        Write the metrics collected so far to the JSON report and Prometheus textfile requested, if any.
+        """
+        from mcresolver.files import sync_written_files
+        from mcresolver.metrics import write_report, write_textfile
+
+        if self.metrics_report is not None:
+            write_report(os.path.expanduser(self.metrics_report))
+            print("Metrics report saved to %s" % self.metrics_report)
+
+        if self.metrics_textfile is not None:
+            write_textfile(os.path.expanduser(self.metrics_textfile))
+            print("Metrics textfile saved to %s" % self.metrics_textfile)
+        sync_written_files()
+
+    def export_trace(self):
+        """
+        Write the spans recorded so far to the trace file requested (if any), and stop tracing.
+        """
+        from mcresolver.files import sync_written_files
+        from mcresolver.tracing import write_trace, stop_tracing
+
+        if self.trace_file is None:
+            return
+
+        write_trace(os.path.expanduser(self.trace_file), stop_tracing())
+        sync_written_files()
+        print("Trace saved to %s (Open it in https://ui.perfetto.dev or chrome://tracing)" % self.trace_file)
+
+    def __run_pipeline(self):
+        from urllib.parse import urlsplit
+        from tqdm import tqdm
+        from mcresolver.configuration import ThreadLocalOutput, run_configure_job, run_configure_job_and_sync, \
+            merge_worker_results, prefetch_configuration, print_summary
+        from mcresolver.downloads import SharedProgress, run_download_job, complete_downloads
+        from mcresolver.files import sync_written_files
+        from mcresolver.lockfile import locked_lookup, write_lockfile
+        from mcresolver.metrics import get_metrics
+        from mcresolver.pipeline import Task, PipelineExecutor, stage_times, critical_path, print_pipeline_summary
+        from mcresolver.pool import worker_process_pool
+        from mcresolver.results import ResolveResult, DownloadResult, ConfigureResult, RunResult
+
+        started = time.time()
+        self.__reset()
+        requested, locked = self.read_requirements()
+        output_folder = self.__prepare_downloads()
+        plugins_folder = self.__plugins_folder()
+
+        print("Resolving, downloading and configuring %s plugins" % len(requested))
+        # Jobs are handed to the render processes from the pipeline's worker threads; See worker_process_pool.
+        render_pool = worker_process_pool(self.render_processes) if self.render_processes > 0 else None
+        progress_bar = tqdm(unit='B', unit_scale=True, desc='Downloading %s plugins' % len(requested))
+        progress = SharedProgress(progress_bar)
+
+        def resolve(source, plugin, entry, record):
+            record = self.__lookup(source, plugin, entry) if record is None else record.result()
+            self.__merge_resolved(source, plugin, entry, record)
+            return entry
+
+        def download(source, plugin, entry):
+            return run_download_job(self.__download_job(source, plugin, entry, output_folder), self.clearance,
+                                    self.artifacts, progress)
+
+        def configure(entry):
+            job = self.__configure_job(entry, plugins_folder)
+            if render_pool is not None:
+                job = render_pool.submit(run_configure_job_and_sync, job).result()
+                merge_worker_results([job])
+                return job
+            return run_configure_job(job)
+
+        tasks = []
+        resolutions = []
+        for source, plugin, entry in requested:
+            name = entry['name']
+            # Plugins recorded in the lockfile resolve (locally) straight away, and how big they are is known;
+            # Others are weighed once resolved. The biggest downloads are started first.
+            record = locked_lookup(locked, source, plugin, entry['version'])
+            resolved = Task("resolve %s" % name, 'resolve', functools.partial(resolve, source, plugin, entry, record),
+                            host=None if record is not None else self.__lookup_host(source), plugin=name)
+            downloaded = Task("download %s" % name, 'download', functools.partial(download, source, plugin, entry),
+                              dependencies=[resolved], plugin=name,
+                              host=lambda entry=entry: urlsplit(entry['download-url']).netloc,
+                              weight=functools.partial(self.__expected_size, source, plugin, entry)
+                              if record is None else record.result()['size'] or 0)
+            tasks += [resolved, downloaded]
+            resolutions.append((source, plugin, entry, resolved, downloaded))
+
+            if not entry['configure']:
+                continue
+
+            # Templates, defaults and scripts are fetched into the HTTP cache while the plugin downloads,
+            # so configuring it only has to render them.
+            urls = [url for url in (entry['template'], entry['defaults'], entry['script'])
+                    if url is not None and is_url(url)]
+            fetched = Task("fetch %s" % name, 'fetch', functools.partial(prefetch_configuration, urls),
+                           dependencies=[resolved], host=urlsplit(urls[0]).netloc if len(urls) > 0 else None,
+                           plugin=name)
+            # A plugin is configured even if downloading it failed (Ex: a copy of it is already installed).
+            tasks += [fetched, Task("configure %s" % name, 'configure', functools.partial(configure, entry),
+                                    dependencies=[fetched], after=[downloaded], plugin=name)]
+
+        def report(task):
+            if task.stage == 'resolve' and not task.skipped:
+                source, plugin, entry = next((source, plugin, entry) for source, plugin, entry, resolved, _
+                                             in resolutions if resolved is task)
+                self.__report_resolved(source, plugin, entry, task.error)
+
+        stdout = sys.stdout
+        sys.stdout = ThreadLocalOutput(stdout)
+        try:
+            with progress_bar:
+                PipelineExecutor(max_workers=self.max_workers, per_host=self.per_host_limit,
+                                 local_workers=self.render_processes or self.max_workers,
+                                 on_complete=report).run(tasks)
+        finally:
+            sys.stdout = stdout
+            if render_pool is not None:
+                render_pool.shutdown()
+        elapsed = time.time() - started
+
+        # Results are gathered in the order of the requirements file, whichever order the tasks ran in.
+        jobs = []
+        for source, plugin, entry, resolved, downloaded in resolutions:
+            if resolved.failed:
+                continue
+            self.__resources(source)[plugin] = entry
+            jobs.append(downloaded.result)
+
+        self.resolution = ResolveResult(self.requirements_file, self.output_folder, self.bukkit_resources,
+                                        self.spigot_resources, self.errors,
+                                        max([task.finished for task in tasks if task.stage == 'resolve'] or
+                                            [started]) - started)
+
+        complete_downloads(jobs, self.artifacts, elapsed)
+        self.__report_downloads(jobs)
+        write_lockfile(self.lockfile, self.bukkit_resources, self.spigot_resources)
+
+        configured = [task.result for task in tasks if task.stage == 'configure' and task.result is not None]
+        if render_pool is None:
+            sync_written_files()
+        if len(configured) > 0:
+            print_summary(configured, elapsed)
+
+        metrics = get_metrics()
+        for stage, times in stage_times(tasks).items():
+            metrics.set('mcresolver_stage_busy_seconds', times['busy'], stage=stage)
+        path = critical_path(tasks)
+        if len(path) > 0:
+            metrics.set('mcresolver_critical_path_seconds', path[-1].finished - path[0].started)
+
+        print_pipeline_summary(tasks, elapsed)
+        return RunResult(self.resolution, DownloadResult(jobs, elapsed), ConfigureResult(configured, elapsed))
+
+
+def run_from_arguments(arguments):
+    """
+    Run mcresolver as requested on the command line; Generating templates when -g is given,
+    otherwise resolving, downloading and configuring the plugins of the requirements file.
+    """
+    app = MinecraftPluginResolver(arguments)
+
+    if app.generate_base_config_file is not None and (app.generate_plugin_name is not None or app.batch_generate):
+        if app.output_folder is None:
+            print(
+                "To generate plugin configuration, you also require the '-l [Folder]' flag, specifying where to save the generated configuration")
+            get_parser().print_help()
+            sys.exit(0)
+
+        if app.batch_generate:
+            app.generate_batch_templates()
+            app.export_metrics()
+            app.export_trace()
+            sys.exit(0)
+
+        app.generate_templates()
+        print("Generated config templates for %s and saved them to %s" % (
+            app.generate_plugin_name, app.output_folder))
+        app.export_metrics()
+        app.export_trace()
+        sys.exit(0)
+
+    elif app.requirements_file is None:
+        print(textwrap.dedent("""\n
+        ==================================
+            McResolver Execution Error
+        ==================================
 
+            McResolver has limited ways it can be utilized, each of which
+            with their own required options, variables, functionality and
+            purpose.
 
-def download(filename, url, cookies, useragent):
-    scraper = cfscrape.create_scraper()
-    with open(filename, 'wb') as handle:
-        response = scraper.get(url, cookies=cookies, headers={"User-Agent": useragent}, stream=True)
 
-        if not response.ok:
-            raise FileNotFoundError(
-                'Unable to locate the resource %s at %s; Assure its valid in your spigot-test.txt file' % (
-                    filename, url))
-        # Something went wrong
+            Retrieve and Configure Plugins
+            ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-        for block in tqdm(response.iter_content(1024)):
-            handle.write(block)
+                Download plugins from Bukkit and Spigot, then automatically configure
+                them to your likings.
+
+                This option requires you to use the '-r' or '--requirements' flag, to pass
+                a yml based file outlining the location to store your plugins and config (locally),
+                what plugins to download, and what options to pass to the configuration template, or script,
+                to generate the plugins config.
+
+
+            Generate Configuration Files
+            ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+                Using fresh plugin configuration, or previously configured plugins you
+                pass a few flags (-g [config file], -gl [store location], and -gpl [Plugin name])
+                then McResolver will generate a Jinja2 Template, along with defaults file for you to
+                configure your plugins by.
+
+                Pass a server's plugins folder (or a glob of configuration files) to -g instead, and the
+                templates of every plugin are generated at once, named after the plugins' folders.
+
+                The template will hold the structure of the configuration file, while the defaults file
+                is used to replace all variables that aren't defined when executing the 'Retrieve and Configure'
+                method described above.
+
+                This way, if you wish to deploy the same configuration for every plugin install, or have some deviate
+                in different ways you can do so, modifying only the values you wish to modify, while keeping all the
+                others exactly how you like them!
+
+
+            Please use one of the methods listed above, and their required options when executing McResolver.
+        """).format())
+        get_parser().print_help()
+        sys.exit(0)
+
+    app.run()
+    app.export_metrics()
+    app.export_trace()
+
+
+def manage_cache(arguments):
+    """
+    Handle the 'mcresolver cache' command.
+    """
+    from mcresolver.cache import ArtifactCache
+    from mcresolver.downloads import format_size
+
+    artifacts = ArtifactCache(os.path.expanduser("~/.mcresolver/cache"), max_size=arguments.cache_size * 1024 ** 2)
+
+    if arguments.action == 'gc':
+        evicted, freed = artifacts.collect_garbage()
+        print("Evicted %s plugins (%s) from the artifact cache" % (evicted, format_size(freed)))
+
+
+def lookup_bukkit_resource(plugin_name, version, latest_on_version_error=False, cache=None):
+    """
+    Retrieve the BukGet information on a plugin, determine the version of it to use, and where to download it from.
+    :param cache: MetadataCache to serve the information from (and store it in) if available.
+    :return: Dictionary holding the BukkitResource, the version to retrieve ('latest' if the requested version
+    is unavailable), the version that resolves to, and the download link & file name of the plugin.
+    """
+    from mcresolver.metrics import get_metrics
+
+    if cache is not None:
+        record = cache.get('bukkit', plugin_name, version, revalidate_url=BUKGET_PLUGIN_URL % plugin_name,
+                           allow_latest=latest_on_version_error)
+        get_metrics().increment('mcresolver_cache_requests_total', cache='metadata',
+                                result='miss' if record is None else 'hit')
+        if record is not None:
+            from mcresolver.lockfile import LockedBukkitResource
+
+            return dict(record, resource=LockedBukkitResource(plugin_name, {
+                'requested-version': version,
+                'version': record['resolved-version'],
+                'download-url': record['download-url'],
+                'file-name': record['file-name'],
+            }))
+
+    from bukget import BukkitResource
+
+    requested_version = version
+    bukkit_resource = BukkitResource.from_name(plugin_name)
+
+    if bukkit_resource.has_version(version=version):
+        # 'latest' is resolved to the version it stands for, so the lockfile pins that.
+        resolved_version = bukkit_resource.get_latest_version() if version == 'latest' else version
+    elif not latest_on_version_error:
+        raise ValueError("Unable to retrieve version %s for %s" % (version, plugin_name))
+    else:
+        version = 'latest'
+        resolved_version = bukkit_resource.get_latest_version()
+
+    record = {
+        'resource': bukkit_resource,
+        'version': version,
+        'resolved-version': resolved_version,
+        'download-url': bukkit_resource.get_download_link(version=version),
+        'file-name': bukkit_resource.get_versioned_file_name(version=version),
+    }
+
+    if cache is not None:
+        cache.put('bukkit', plugin_name, requested_version, record)
+    return record
+
+
+def lookup_spigot_resource(plugin_id, version, latest_on_version_error=False, cache=None):
+    """
+    Retrieve the Spiget information on a resource, determine the version of it to use, and where to download it from.
+    :param cache: MetadataCache to serve the information from (and store it in) if available.
+    :return: Dictionary holding the SpigotResource, the version to retrieve ('latest' if the requested version
+    is unavailable), the version that resolves to, and the download link of the resource.
+    """
+    from spiget import SpigotResource, get_api_url
+    from mcresolver.downloads import parse_size
+    from mcresolver.metrics import get_metrics
+
+    if cache is not None:
+        record = cache.get('spigot', plugin_id, version, revalidate_url=get_api_url('resources/%s' % plugin_id),
+                           allow_latest=latest_on_version_error)
+        get_metrics().increment('mcresolver_cache_requests_total', cache='metadata',
+                                result='miss' if record is None else 'hit')
+        if record is not None:
+            from mcresolver.lockfile import LockedSpigotResource
+
+            return dict(record, resource=LockedSpigotResource(plugin_id, {
+                'name': record['resource-name'],
+                'version': record['resolved-version'],
+                'download-url': record['download-url'],
+                'file-type': record['file-type'],
+            }))
+
+    requested_version = version
+    spigot_resource = SpigotResource.from_id(plugin_id)
+
+    if spigot_resource is None:
+        raise ValueError("Invalid plugin id %s" % plugin_id)
+
+    if spigot_resource.has_version(version=version):
+        # 'latest' is resolved to the version it stands for, so the lockfile pins that.
+        resolved_version = spigot_resource.version if version == 'latest' else version
+    elif not latest_on_version_error:
+        raise ValueError("Unable to retrieve version %s for %s" % (version, spigot_resource.name))
+    else:
+        version = 'latest'
+        resolved_version = spigot_resource.version
+
+    record = {
+        'resource': spigot_resource,
+        'version': version,
+        'resolved-version': resolved_version,
+        'download-url': spigot_resource.get_download_link(version=version),
+        # Kept (along with the plain values above) by the metadata cache, to rebuild the resource from.
+        'resource-name': spigot_resource.name,
+        'file-type': spigot_resource.file_type,
+        # Spiget only reports the size of the latest file; Close enough to start the biggest downloads first.
+        'file-size': parse_size(spigot_resource.file_size),
+    }
+
+    if cache is not None:
+        cache.put('spigot', plugin_id, requested_version, record)
+    return record
 
 
 if __name__ == "__main__":
     # TODO implement retrieval of file extension if not jar.
-    # todo implement version compare of local file for potentially updating plugin without replacing?
 
-    args = parser.parse_args()
-    app = MinecraftPluginResolver(arguments=args)
-    app.run()
+    args = get_parser().parse_args()
+    run_from_arguments(args)
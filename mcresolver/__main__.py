@@ -1,7 +1,7 @@
 #!/usr/bin/python3
 import sys
 import mcresolver
-from mcresolver import parser, MinecraftPluginResolver
+from mcresolver import get_parser, get_cache_parser, get_serve_parser, run_from_arguments, manage_cache
 
 
 def main(args=None):
@@ -10,10 +10,21 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
 
-    args = parser.parse_args()
+    # 'mcresolver cache <action>' manages the artifact cache, rather than resolving plugins.
+    if len(args) > 0 and args[0] == 'cache':
+        manage_cache(get_cache_parser().parse_args(args[1:]))
+        return
+
+    # 'mcresolver serve' runs the resolver as a daemon, taking its requests over a Unix socket or HTTP.
+    if len(args) > 0 and args[0] == 'serve':
+        serve_args = get_serve_parser().parse_args(args[1:])
+        from mcresolver.daemon import serve
+        serve(serve_args)
+        return
+
+    args = get_parser().parse_args(args)
     mcresolver.args = args
-    app = MinecraftPluginResolver(args)
-    app.run()
+    run_from_arguments(args)
 
 
 if __name__ == "__main__":
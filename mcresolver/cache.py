@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+from mcresolver.network import get_session
+
+# ioctl request cloning a file on copy-on-write filesystems (btrfs, xfs) on Linux.
+FICLONE = 0x40049409
+
+
+class MetadataCache(object):
+    """
+    On-disk cache of the plugin metadata retrieved from BukGet and Spiget, stored inside the mcresolver
+    app data folder (~/.mcresolver/metadata).
+
+    Records are keyed by the source, resource id and the version requested in the requirements file, and hold plain
+    values only; The resource objects of the API libraries aren't stored (upgrading those never breaks the cache),
+    callers rebuild what they need from the record.
+    Pinned versions never change once published so their records never expire; records for 'latest'
+    are served for `ttl` seconds, then revalidated against the API with a conditional request
+    (ETag / Last-Modified) before being refreshed.
+    """
+
+    def __init__(self, cache_folder, ttl=3600, refresh=False, timeout=10):
+        self.cache_folder = os.path.expanduser(cache_folder)
+        self.ttl = ttl
+        self.refresh = refresh
+        self.timeout = timeout
+
+        # Validators collected while revalidating stale records; they're attached to the
+        # refreshed record once it's put back into the cache.
+        self.__pending_validators = {}
+        self.__lock = threading.Lock()
+        # Records read or written so far, by their file; Saves unpickling them again in long running processes.
+        self.__records = {}
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+
+    def __record_path(self, source, resource_id, version):
+        return os.path.join(self.cache_folder, source, _safe_name(resource_id), "%s.pickle" % _safe_name(version))
+
+    def get(self, source, resource_id, version, revalidate_url=None, allow_latest=True):
+        """
+        Retrieve the cached metadata record for a resource.
+        :param source: Where the resource is retrieved from ('bukkit' or 'spigot')
+        :param resource_id: Name (Bukkit) or id (Spigot) of the resource.
+        :param version: Version of the resource requested in the requirements file.
+        :param revalidate_url: API url of the resource, used to revalidate expired 'latest' records.
+        :param allow_latest: Whether a record falling back to the latest version (stored by an earlier run
+        that allowed it, because the version requested was unavailable) may be served.
+        :return: The cached record, or None if it's missing, expired, or a refresh was requested.
+        """
+        if self.refresh:
+            return None
+
+        record_file = self.__record_path(source, resource_id, version)
+        with self.__lock:
+            record = self.__records.get(record_file)
+
+        if record is None:
+            if not os.path.exists(record_file):
+                return None
+
+            try:
+                with open(record_file, 'rb') as record_data:
+                    record = pickle.load(record_data)
+            except Exception:
+                return None
+
+            if not isinstance(record, dict) or 'resource' in record:
+                # Written by an earlier version, along with the resource object; Retrieved again.
+                return None
+
+            with self.__lock:
+                self.__records[record_file] = record
+
+        if record['version'] != 'latest':
+            return record
+
+        if version != 'latest' and not allow_latest:
+            return None
+
+        if time.time() - record['fetched'] < self.ttl:
+            return record
+
+        unchanged, validators = (False, record.get('validators')) if revalidate_url is None else \
+            self.revalidate(record, revalidate_url)
+        if not unchanged:
+            with self.__lock:
+                self.__pending_validators[record_file] = validators
+            return None
+
+        # Records are shared with other lookup threads; The refreshed one replaces it rather than changing it.
+        record = dict(record, fetched=time.time(), validators=validators)
+        self.__write(record_file, record)
+        return record
+
+    def revalidate(self, record, url):
+        """
+        Check (via a conditional request) whether the resource behind a cached record is unchanged.
+        :return: Tuple of whether the cached record is still valid (False if it has to be retrieved again),
+        and the validators to store along with the record from now on.
+        """
+        validators = record.get('validators') or {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last-modified'):
+            headers['If-Modified-Since'] = validators['last-modified']
+
+        try:
+            response = get_session().get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            return False, validators
+
+        if response.status_code == 304:
+            return True, validators
+
+        if not response.ok:
+            return False, validators
+
+        fields = _version_fields(response.content)
+        new_validators = {
+            'etag': response.headers.get('ETag'),
+            'last-modified': response.headers.get('Last-Modified'),
+            'digest': hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest(),
+        }
+
+        if validators.get('digest') is not None:
+            unchanged = validators['digest'] == new_validators['digest']
+        else:
+            # Records stored straight from a lookup hold no digest yet; Check the latest version is still the same.
+            unchanged = fields['latest'] is not None and str(fields['latest']) == str(record.get('resolved-version'))
+        return unchanged, new_validators
+
+    def put(self, source, resource_id, version, record):
+        """
+        Store the metadata record retrieved for a resource.
+        :param record: Dictionary holding (at least) the 'version' of the resource to retrieve; Its 'resource' object
+        isn't stored.
+        """
+        record_file = self.__record_path(source, resource_id, version)
+        record = dict((key, value) for key, value in record.items() if key != 'resource')
+        record['fetched'] = time.time()
+        with self.__lock:
+            record.setdefault('validators', self.__pending_validators.pop(record_file, None))
+
+        try:
+            self.__write(record_file, record)
+        except (pickle.PicklingError, TypeError, AttributeError, OSError) as e:
+            print("Unable to cache information on %s (v. %s): %s" % (resource_id, version, e))
+
+    def __write(self, record_file, record):
+        record_folder = os.path.dirname(record_file)
+        if not os.path.exists(record_folder):
+            os.makedirs(record_folder, exist_ok=True)
+
+        handle, temp_file = tempfile.mkstemp(dir=record_folder, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as record_data:
+                pickle.dump(record, record_data)
+            os.replace(temp_file, record_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+
+        with self.__lock:
+            self.__records[record_file] = record
+
+
+def _version_fields(content):
+    """
+    Extract the fields metadata records depend on from a BukGet / Spiget resource: its latest version and the
+    versions available (with their download link); Leaving out the ones changing all the time (download counts,
+    ratings, update dates)
+    """
+    try:
+        resource = json.loads(content.decode('utf-8'))
+    except ValueError:
+        resource = None
+
+    if not isinstance(resource, dict):
+        return {'latest': None, 'versions': hashlib.sha256(content).hexdigest()}
+
+    versions = []
+    for version in resource.get('versions') or []:
+        if isinstance(version, dict):
+            version = dict((key, version.get(key)) for key in ('version', 'download', 'filename'))
+        versions.append(version)
+
+    latest = resource.get('version')
+    if latest is None and versions:
+        latest = versions[0]['version'] if isinstance(versions[0], dict) else versions[0]
+
+    return {'latest': latest, 'versions': versions}
+
+
+def _safe_name(value):
+    return "".join(c if c.isalnum() or c in '-_.' else '_' for c in str(value))
+
+
+class ArtifactCache(object):
+    """
+    Content-addressed store of downloaded plugins (~/.mcresolver/cache), shared by every server folder
+    mcresolver resolves plugins into.
+
+    Files are stored by their SHA-256 checksum and indexed by the resource (source, id & version) they
+    belong to. Cached files are materialized into their target folder via a hardlink (or reflink / copy
+    when linking isn't possible), and the least recently used files are evicted once the store grows
+    past max_size bytes.
+    """
+
+    def __init__(self, cache_folder, max_size=2 * 1024 ** 3):
+        self.cache_folder = os.path.expanduser(cache_folder)
+        self.objects_folder = os.path.join(self.cache_folder, 'objects')
+        self.index_file = os.path.join(self.cache_folder, 'index.json')
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+
+        if not os.path.exists(self.objects_folder):
+            os.makedirs(self.objects_folder)
+
+        self.__index = self.__load_index()
+
+    def __load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as index_data:
+                    return json.load(index_data)
+            except ValueError:
+                print("Artifact cache index %s is corrupt; Starting with an empty cache" % self.index_file)
+
+        return {'artifacts': {}, 'objects': {}, 'validators': {}}
+
+    def save(self):
+        with self.__lock:
+            temp_file = "%s.tmp" % self.index_file
+            with open(temp_file, 'w') as index_data:
+                json.dump(self.__index, index_data, indent=2, sort_keys=True)
+            os.replace(temp_file, self.index_file)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_folder, sha256[:2], sha256)
+
+    def lookup(self, key=None, sha256=None):
+        """
+        Find a cached file by the resource it belongs to, or by its checksum.
+        :param key: Key of the resource; See artifact_key.
+        :param sha256: Checksum of the file, when it's known up front (Ex: from the lockfile)
+        :return: Checksum of the cached file, or None if it's not cached.
+        """
+        with self.__lock:
+            if sha256 is None:
+                sha256 = self.__index['artifacts'].get(key)
+
+            if sha256 is None or sha256 not in self.__index['objects']:
+                return None
+
+            if not os.path.exists(self.object_path(sha256)):
+                del self.__index['objects'][sha256]
+                return None
+
+            self.__index['objects'][sha256]['last-used'] = time.time()
+            if key is not None:
+                self.__index['artifacts'][key] = sha256
+            return sha256
+
+    def size_of(self, sha256):
+        return self.__index['objects'][sha256]['size']
+
+    def last_size(self, source, resource_id):
+        """
+        Size of the file of a resource last used out of the cache, whichever version it was.
+        :return: The size (in bytes), or None if no version of the resource is cached.
+        """
+        prefix = artifact_key(source, resource_id, '')
+        with self.__lock:
+            objects = self.__index['objects']
+            cached = [objects[sha256] for key, sha256 in self.__index['artifacts'].items()
+                      if key.startswith(prefix) and sha256 in objects]
+        if len(cached) == 0:
+            return None
+        return max(cached, key=lambda entry: entry['last-used'])['size']
+
+    def materialize(self, sha256, destination):
+        """
+        Place the cached file with the given checksum at destination, replacing whatever is there.
+        """
+        folder, name = os.path.split(os.path.abspath(destination))
+        temp_file = os.path.join(folder, '.%s.%s.tmp' % (name, sha256[:8]))
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+        link_or_copy(self.object_path(sha256), temp_file)
+        os.replace(temp_file, destination)
+
+    def store(self, key, file, sha256):
+        """
+        Add a downloaded file to the cache, under the resource it belongs to.
+        """
+        object_file = self.object_path(sha256)
+        if not os.path.exists(object_file):
+            object_folder = os.path.dirname(object_file)
+            if not os.path.exists(object_folder):
+                os.makedirs(object_folder, exist_ok=True)
+
+            temp_file = "%s.%s.tmp" % (object_file, threading.get_ident())
+            link_or_copy(file, temp_file)
+            os.replace(temp_file, object_file)
+
+        with self.__lock:
+            self.__index['objects'][sha256] = {'size': os.path.getsize(object_file), 'last-used': time.time()}
+            if key is not None:
+                self.__index['artifacts'][key] = sha256
+
+    def get_validators(self, url):
+        """
+        :return: ETag, Last-Modified and checksum of the file last downloaded from url (empty if it never was)
+        """
+        with self.__lock:
+            return dict(self.__index.setdefault('validators', {}).get(url, {}))
+
+    def set_validators(self, url, validators):
+        with self.__lock:
+            self.__index.setdefault('validators', {})[url] = dict(validators)
+
+    def collect_garbage(self, max_size=None):
+        """
+        Evict the least recently used files until the cache is within max_size bytes, and drop
+        index entries of files that no longer exist.
+        :return: Tuple of the amount of files evicted, and the bytes freed.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        evicted, freed = 0, 0
+
+        with self.__lock:
+            objects = self.__index['objects']
+            for sha256 in list(objects.keys()):
+                if not os.path.exists(self.object_path(sha256)):
+                    del objects[sha256]
+
+            total = sum(info['size'] for info in objects.values())
+            for sha256, info in sorted(objects.items(), key=lambda item: item[1]['last-used']):
+                if total <= max_size:
+                    break
+
+                os.remove(self.object_path(sha256))
+                del objects[sha256]
+                total -= info['size']
+                freed += info['size']
+                evicted += 1
+
+            self.__index['artifacts'] = dict(
+                (key, sha256) for key, sha256 in self.__index['artifacts'].items() if sha256 in objects)
+            self.__index['validators'] = dict(
+                (url, validators) for url, validators in self.__index.get('validators', {}).items()
+                if validators.get('sha256') in objects)
+
+        self.save()
+        return evicted, freed
+
+
+def artifact_key(source, resource_id, version):
+    return "%s:%s:%s" % (source, resource_id, version)
+
+
+def link_or_copy(source, destination):
+    """
+    Hardlink source to destination; falling back to a reflink (copy-on-write clone) and lastly
+    a plain copy when hardlinks aren't possible (Ex: the files are on different filesystems)
+    """
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+
+    try:
+        import fcntl
+        with open(source, 'rb') as source_data, open(destination, 'wb') as destination_data:
+            fcntl.ioctl(destination_data.fileno(), FICLONE, source_data.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+
+    shutil.copyfile(source, destination)
@@ -0,0 +1,216 @@
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from mcresolver import tracing
+from mcresolver.metrics import get_metrics, reset_metrics, plugin_scope
+from mcresolver.network import fetch_text
+from mcresolver.pool import worker_process_pool
+from mcresolver.scripts import configure_plugin, save_plugin_config_script, sync_written_files
+from mcresolver.utils import is_url
+
+
+class ConfigureJob(object):
+    """
+    A plugin to be configured by configure_all, with everything configure_plugin requires to do so.
+    """
+
+    def __init__(self, name, resource, version, plugins_folder, scripts_folder, config_options=None, script=None,
+                 template_file=None, defaults_file=None, kwargs=None):
+        self.name = name
+        self.resource = resource
+        self.version = version
+        self.plugins_folder = plugins_folder
+        self.scripts_folder = scripts_folder
+        self.config_options = config_options
+        self.script = script
+        self.template_file = template_file
+        self.defaults_file = defaults_file
+        self.kwargs = kwargs or {}
+        # Filled in once the job has finished.
+        self.configured = False
+        self.error = None
+        self.output = ""
+        self.elapsed = None
+        # Whether the run is traced; Workers that didn't inherit its tracer (spawned) record spans on one of their own.
+        self.traced = tracing.get_tracer() is not None
+        # Metrics and spans collected while configuring the plugin on a worker process, to be merged into the run's.
+        self.metrics = None
+        self.trace = None
+
+
+class ThreadLocalOutput(object):
+    """
+    Stand-in for sys.stdout routing whatever a thread prints into the buffer it's capturing to (if any),
+    so concurrently configured plugins don't interleave their output.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.__local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self, buffer):
+        self.__local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.__local.buffer = None
+
+    def write(self, data):
+        buffer = getattr(self.__local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(data)
+
+    def flush(self):
+        buffer = getattr(self.__local, 'buffer', None)
+        (buffer if buffer is not None else self.stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextlib.contextmanager
+def captured_output(buffer):
+    """
+    Capture everything the current thread prints into buffer.
+    """
+    if isinstance(sys.stdout, ThreadLocalOutput):
+        with sys.stdout.capture(buffer):
+            yield buffer
+    else:
+        with contextlib.redirect_stdout(buffer):
+            yield buffer
+
+
+def run_configure_job(job):
+    """
+    Configure the plugin of a job, capturing its output and any error raised along the way.
+    :return: The job, with its result filled in.
+    """
+    started = time.time()
+    with captured_output(io.StringIO()) as output, plugin_scope(job.name), \
+            tracing.span("configure_plugin %s" % job.name, 'configure', version=job.version) as span:
+        try:
+            script = job.script
+            if script is not None:
+                if is_url(script):
+                    script = save_plugin_config_script(job.scripts_folder, script)
+                else:
+                    script = os.path.expanduser(script)
+
+            job.configured = configure_plugin(job.resource, job.version, job.plugins_folder,
+                                              defaults_file=job.defaults_file, template_file=job.template_file,
+                                              config_options=job.config_options, script=script,
+                                              script_folder=job.scripts_folder, **job.kwargs)
+        except Exception as e:
+            job.error = "%s: %s" % (e.__class__.__name__, e)
+            traceback.print_exc(file=output)
+        span.set(configured=job.configured, error=job.error)
+
+    job.output = output.getvalue()
+    job.elapsed = time.time() - started
+    metrics = get_metrics()
+    metrics.observe('mcresolver_configure_duration_seconds', job.elapsed)
+    metrics.record_plugin(job.name, configure_seconds=job.elapsed, configured=job.configured,
+                          configure_error=job.error)
+    return job
+
+
+def run_configure_job_and_sync(job):
+    # Worker processes flush what they've written themselves, as the files they wrote are only known to them;
+    # And send back the metrics & spans collected while configuring.
+    reset_metrics()
+    with tracing.worker_trace(job.traced) as tracer:
+        job = run_configure_job(job)
+    sync_written_files()
+    job.metrics = get_metrics()
+    job.trace = None if tracer is None else tracer.recorded()
+    return job
+
+
+def merge_worker_results(jobs):
+    """
+    Merge the metrics & spans jobs collected on worker processes into those of this process.
+    """
+    for job in jobs:
+        if job.metrics is not None:
+            get_metrics().merge(job.metrics)
+        tracing.add_worker_trace(job.trace)
+        job.metrics, job.trace = None, None
+
+
+def prefetch_configuration(urls):
+    """
+    Retrieve the templates, defaults and scripts a plugin is configured by into the HTTP cache ahead of configuring it.
+    Failures are left for configuring the plugin to report.
+    :return: Number of urls retrieved.
+    """
+    retrieved = 0
+    for url in urls:
+        try:
+            fetch_text(url)
+            retrieved += 1
+        except Exception:
+            pass
+    return retrieved
+
+
+def configure_all(jobs, max_workers=8, processes=0):
+    """
+    Configure every job concurrently; on threads (the work is mostly fetching templates, defaults and scripts)
+    or, when processes is above 0, on a pool of that many processes for CPU heavy renders and scripts.
+
+    What each job prints is collected and reported per plugin, followed by a summary of the results. The files
+    written while configuring are flushed to disk together once every job is done.
+    :return: The jobs, in the order they were passed, with their results filled in.
+    """
+    jobs = list(jobs)
+    if len(jobs) == 0:
+        return jobs
+
+    started = time.time()
+    if processes > 0:
+        with worker_process_pool(processes) as pool:
+            jobs = list(pool.map(run_configure_job_and_sync, jobs))
+        merge_worker_results(jobs)
+    else:
+        stdout = sys.stdout
+        sys.stdout = ThreadLocalOutput(stdout)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                jobs = list(pool.map(run_configure_job, jobs))
+        finally:
+            sys.stdout = stdout
+        sync_written_files()
+
+    print_summary(jobs, time.time() - started)
+    return jobs
+
+
+def print_summary(jobs, elapsed):
+    for job in jobs:
+        if job.output.strip() == "":
+            continue
+
+        print("---- %s (%s) ----" % (job.name, job.version))
+        print(job.output.rstrip())
+
+    print("\nConfiguration summary")
+    for job in jobs:
+        if job.error is not None:
+            status = "error"
+        elif job.configured:
+            status = "configured"
+        else:
+            status = "failed"
+
+        print("  %-10s %-30s %6.2fs%s" % (status, "%s (%s)" % (job.name, job.version), job.elapsed,
+                                          "" if job.error is None else "  %s" % job.error))
+
+    configured = len([job for job in jobs if job.configured])
+    print("Configured %s of %s plugins in %.2fs" % (configured, len(jobs), elapsed))
@@ -0,0 +1,330 @@
+import hmac
+import io
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from mcresolver import MinecraftPluginResolver
+from mcresolver.cache import MetadataCache, ArtifactCache
+from mcresolver.configuration import captured_output
+from mcresolver.metrics import Metrics, reset_metrics
+from mcresolver.network import CloudflareClearance, get_session
+
+# Where the daemon listens when neither a socket nor a port is given.
+DEFAULT_SOCKET_FILE = os.path.expanduser("~/.mcresolver/mcresolver.sock")
+
+# Largest request body (in bytes) the daemon accepts.
+MAX_REQUEST_SIZE = 1024 ** 2
+
+# Options of a request naming a file the daemon writes; Only file names are accepted, written into the reports folder.
+REPORT_OPTIONS = ('metrics_report', 'metrics_textfile', 'trace')
+
+
+class ResolverService(object):
+    """
+    Runs the requests made to the daemon (resolving, downloading & configuring plugins, or generating templates)
+    on resolvers sharing one set of caches, so the HTTP session, plugin metadata, artifacts, Cloudflare clearance,
+    compiled templates and imported configuration scripts stay warm between requests.
+
+    Requests are handled one at a time; Each is still resolved, downloaded and configured concurrently.
+    """
+
+    def __init__(self, metadata_ttl=3600, cache_size=2048):
+        self.app_data_folder = os.path.expanduser("~/.mcresolver/")
+        self.reports_folder = os.path.join(self.app_data_folder, "reports")
+        self.metadata_ttl = metadata_ttl
+        self.metadata_cache = MetadataCache(os.path.join(self.app_data_folder, "metadata"), ttl=metadata_ttl)
+        self.artifacts = ArtifactCache(os.path.join(self.app_data_folder, "cache"), max_size=cache_size * 1024 ** 2)
+        self.clearance = CloudflareClearance(os.path.join(self.app_data_folder, "cloudflare-tokens.json"))
+        self.started = time.time()
+        self.handled = 0
+        # Metrics of every request handled, served on GET /metrics; Each request collects its own while running.
+        self.metrics = Metrics()
+        self.__lock = threading.Lock()
+        # Create the shared session up front, rather than on the first request.
+        get_session()
+
+    def resolver(self, options):
+        """
+        A resolver for the options of a request, sharing the service's caches.
+        """
+        metadata_cache = self.metadata_cache
+        if options.get('refresh'):
+            metadata_cache = MetadataCache(self.metadata_cache.cache_folder, ttl=self.metadata_ttl, refresh=True)
+
+        return MinecraftPluginResolver(metadata_cache=metadata_cache, artifacts=self.artifacts,
+                                       clearance=self.clearance, **options)
+
+    def handle(self, action, options):
+        """
+        Run an action requested of the daemon.
+        :param action: 'resolve', 'download', 'configure', 'run', 'generate' or 'status'
+        :param options: Options of the resolver to run the action by, by their dest name (See get_parser)
+        :return: Dictionary holding the result of the action, and everything printed while running it.
+        """
+        if action == 'status':
+            return self.status()
+
+        if action not in ('resolve', 'download', 'configure', 'run', 'generate'):
+            raise ValueError("Unknown action %s" % action)
+
+        options = self.__report_paths(options)
+        with self.__lock:
+            with captured_output(io.StringIO()) as output:
+                run_metrics = reset_metrics()
+                resolver = self.resolver(options)
+                try:
+                    if action == 'generate':
+                        result = self.__generate(resolver)
+                    elif action == 'run':
+                        result = resolver.run().to_dict()
+                    else:
+                        result = getattr(resolver, action)().to_dict()
+                finally:
+                    # Reports & traces requested along with the action are written (on the daemon's host) either way.
+                    self.metrics.add_run(run_metrics)
+                    resolver.export_metrics()
+                    resolver.export_trace()
+
+            self.handled += 1
+            return {'result': result, 'output': output.getvalue()}
+
+    def __report_paths(self, options):
+        """
+        Place the reports & traces a request asks for inside the reports folder, so a request can't have the daemon
+        write them over any file its user can write.
+        :return: The options, with the paths of the reports requested.
+        """
+        options = dict(options)
+        for option in REPORT_OPTIONS:
+            name = options.get(option)
+            if name is None:
+                continue
+
+            if not isinstance(name, str) or os.path.basename(name) != name or name in ('', '.', '..'):
+                raise ValueError("The '%s' option takes a file name (written into %s), not a path" % (
+                    option, self.reports_folder))
+
+            if not os.path.exists(self.reports_folder):
+                os.makedirs(self.reports_folder)
+            options[option] = os.path.join(self.reports_folder, name)
+        return options
+
+    def __generate(self, resolver):
+        if resolver.generate_base_config_file is None or resolver.output_folder is None:
+            raise ValueError("Generating templates requires the 'generate' and 'location' options")
+
+        if resolver.batch_generate:
+            return [{
+                'plugin': job.plugin,
+                'config-file': job.config_file,
+                'template': job.template_file,
+                'defaults': job.defaults_file,
+                'nodes': job.nodes,
+                'delta': None if job.delta is None else str(job.delta),
+                'error': job.error,
+            } for job in resolver.generate_batch_templates()]
+
+        if resolver.generate_plugin_name is None:
+            raise ValueError("Generating the templates of a single configuration requires the 'genplugin' option")
+
+        generator, delta = resolver.generate_templates()
+        return [{
+            'plugin': resolver.generate_plugin_name,
+            'config-file': resolver.generate_base_config_file,
+            'template': os.path.join(resolver.output_folder, '%s-template.yml' % resolver.generate_plugin_name),
+            'defaults': os.path.join(resolver.output_folder, '%s-defaults.yml' % resolver.generate_plugin_name),
+            'nodes': len(generator.nodes),
+            'delta': None if delta is None else str(delta),
+            'error': None,
+        }]
+
+    def status(self):
+        return {'result': {
+            'uptime': time.time() - self.started,
+            'handled': self.handled,
+            'pid': os.getpid(),
+        }, 'output': ''}
+
+
+class ResolverRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the daemon; POST /<action> with a JSON object of options, GET /status,
+    or GET /metrics for the metrics collected over every request (in the Prometheus text format).
+
+    When the server has a token, every request has to carry it as an 'Authorization: Bearer <token>' header.
+    """
+
+    def do_GET(self):
+        if not self.__authorized():
+            return
+        if self.path.rstrip('/') == '/metrics':
+            return self.__respond_text(200, self.server.service.metrics.to_prometheus())
+        if self.path.rstrip('/') != '/status':
+            return self.__respond(404, {'error': "Unknown path %s" % self.path})
+        self.__respond(200, self.server.service.status())
+
+    def do_POST(self):
+        if not self.__authorized():
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            return self.__respond(413, {'error': "Requests are limited to %s bytes" % MAX_REQUEST_SIZE})
+
+        try:
+            options = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            if not isinstance(options, dict):
+                raise ValueError("Options have to be a JSON object")
+        except ValueError as e:
+            return self.__respond(400, {'error': "Invalid request: %s" % e})
+
+        try:
+            response = self.server.service.handle(self.path.strip('/'), options)
+        except (ValueError, FileNotFoundError) as e:
+            return self.__respond(400, {'error': str(e)})
+        except Exception as e:
+            traceback.print_exc()
+            return self.__respond(500, {'error': "%s: %s" % (e.__class__.__name__, e)})
+
+        self.__respond(200, response)
+
+    def __authorized(self):
+        token = getattr(self.server, 'token', None)
+        if token is None:
+            return True
+
+        if hmac.compare_digest(self.headers.get('Authorization', '').encode('utf-8'),
+                               ('Bearer %s' % token).encode('utf-8')):
+            return True
+
+        self.__respond(401, {'error': "Requests require a valid 'Authorization: Bearer <token>' header"})
+        return False
+
+    def __respond(self, status, body):
+        self.__send(status, 'application/json', json.dumps(body, default=str).encode('utf-8'))
+
+    def __respond_text(self, status, text):
+        self.__send(status, 'text/plain; version=0.0.4', text.encode('utf-8'))
+
+    def __send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Clients of a Unix socket have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class ResolverHTTPServer(HTTPServer):
+    def __init__(self, address, service, token=None):
+        self.service = service
+        self.token = token
+        HTTPServer.__init__(self, address, ResolverRequestHandler)
+
+
+class ResolverUnixServer(socketserver.UnixStreamServer):
+    def __init__(self, socket_file, service):
+        self.service = service
+        if os.path.exists(socket_file):
+            # Left behind by a daemon that didn't shut down cleanly, unless one is still listening on it.
+            if not stat.S_ISSOCK(os.stat(socket_file).st_mode):
+                raise ValueError("%s exists, and isn't a socket" % socket_file)
+            if is_listening(socket_file):
+                raise ValueError("A daemon is already listening on %s" % socket_file)
+            os.remove(socket_file)
+        socketserver.UnixStreamServer.__init__(self, socket_file, ResolverRequestHandler)
+
+    def server_bind(self):
+        # Create the socket accessible to its owner only; Restricting it after binding leaves a window to connect in.
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+
+
+def is_listening(socket_file):
+    """
+    :return: True if something accepts connections on the Unix socket.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_file)
+    except OSError:
+        return False
+    finally:
+        client.close()
+    return True
+
+
+def is_loopback(host):
+    """
+    :return: True if every address host resolves to is a loopback address.
+    """
+    try:
+        addresses = set(address[4][0] for address in socket.getaddrinfo(host, None))
+    except (socket.gaierror, UnicodeError):
+        return False
+
+    return len(addresses) > 0 and all(
+        ipaddress.ip_address(address.split('%', 1)[0]).is_loopback for address in addresses)
+
+
+def create_server(service, socket_file=None, host='127.0.0.1', port=None, allow_remote=False, token=None):
+    """
+    Create the server of the daemon; Listening on a Unix socket, or on host:port when a port is given.
+
+    Requests run configuration scripts and write wherever their options point, so HTTP is only served on a
+    loopback address, unless allow_remote is given along with a token every request has to carry.
+    """
+    if port is None:
+        return ResolverUnixServer(os.path.expanduser(socket_file or DEFAULT_SOCKET_FILE), service)
+
+    if not is_loopback(host):
+        if not allow_remote:
+            raise ValueError("Refusing to serve on %s, which isn't a loopback address; Pass --allow-remote "
+                             "(along with a token) to accept requests from other hosts" % host)
+        if not token:
+            raise ValueError("Serving on %s requires a token (--token or MCRESOLVER_TOKEN) to authenticate "
+                             "requests by" % host)
+
+    return ResolverHTTPServer((host, port), service, token=token or None)
+
+
+def serve(arguments):
+    """
+    Handle the 'mcresolver serve' command; Serve requests until interrupted.
+    """
+    service = ResolverService(metadata_ttl=arguments.metadata_ttl, cache_size=arguments.cache_size)
+    try:
+        server = create_server(service, socket_file=arguments.socket, host=arguments.host, port=arguments.port,
+                               allow_remote=arguments.allow_remote, token=arguments.token)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if arguments.port is not None:
+        print("mcresolver serving on http://%s:%s" % server.server_address[:2])
+    else:
+        print("mcresolver serving on %s" % server.server_address)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if arguments.port is None and os.path.exists(server.server_address):
+            os.remove(server.server_address)
@@ -0,0 +1,476 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from urllib.parse import urlsplit
+
+from mcresolver import tracing
+from mcresolver.metrics import get_metrics, plugin_scope
+from mcresolver.network import get_session
+from mcresolver.pool import HostLimitedPool
+
+# Downloads with these extensions are validated as zip archives before being moved into place.
+ARCHIVE_EXTENSIONS = ('.jar', '.zip')
+
+# Bounds of the buffer downloads are read into; It grows while reads keep filling it.
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Minimum seconds between progress bar updates.
+PROGRESS_INTERVAL = 0.1
+
+# Seconds to wait for a connection to the server, and for every read from it.
+DOWNLOAD_TIMEOUT = (10, 60)
+
+
+class DownloadJob(object):
+    """
+    A file to be downloaded by download_all; data is whatever the caller wants handed back with the result.
+
+    cache_key identifies the resource in the ArtifactCache, and checksum (when known up front, Ex: from the
+    lockfile) is the SHA-256 the downloaded file is expected to have.
+    """
+
+    def __init__(self, name, url, file_name, data=None, cache_key=None, checksum=None):
+        self.name = name
+        self.url = url
+        self.file_name = file_name
+        self.data = data
+        self.cache_key = cache_key
+        self.checksum = checksum
+        # Filled in once the job has finished.
+        self.size = None
+        self.sha256 = None
+        self.elapsed = None
+        self.error = None
+        self.cached = False
+        self.unchanged = False
+
+    @property
+    def host(self):
+        return urlsplit(self.url).netloc
+
+
+class SharedProgress(object):
+    """
+    Wraps a tqdm bar so every download thread can report its progress to it.
+    """
+
+    def __init__(self, progress_bar):
+        self.progress_bar = progress_bar
+        self.__lock = threading.Lock()
+
+    def update(self, amount):
+        with self.__lock:
+            self.progress_bar.update(amount)
+
+
+class NotModified(Exception):
+    """
+    Raised by download when the server reports the file hasn't changed since it was last downloaded.
+    """
+
+
+def download(filename, url, cookies=None, useragent=None, progress=None, checksum=None, validators=None,
+             timeout=DOWNLOAD_TIMEOUT):
+    """
+    Download a file (through the shared session), saving it as filename.
+
+    The file is streamed into '<filename>.part' next to its destination, computing its SHA-256 along the way.
+    If a previous attempt left a partial file behind, it's resumed with an HTTP Range request rather than
+    starting over. Once complete, the checksum is verified, jars (and zips) have their central directory
+    validated, and only then is the file moved into place; A failed or corrupt download never replaces filename.
+    :param progress: Optional progress bar (tqdm or SharedProgress) updated with the amount of bytes received.
+    :param checksum: SHA-256 the file is expected to have (Ex: from the lockfile)
+    :param validators: ETag / Last-Modified of the last download of url, sent as a conditional request
+    (raising NotModified if the file hasn't changed). Updated with those of this download once it completes.
+    :param timeout: Seconds to wait for the connection, and for every read; As a (connect, read) tuple or a number.
+    :return: Tuple of the size (in bytes) and SHA-256 checksum of the downloaded file.
+    """
+    part_file = "%s.part" % filename
+    state_file = "%s.part.json" % filename
+    headers = {} if useragent is None else {"User-Agent": useragent}
+    digest = hashlib.sha256()
+    size = 0
+
+    # Resume the partial download, if it belongs to the same url. If-Range makes the server send
+    # the whole file instead, when it's changed since the partial download was started.
+    state = _read_part_state(state_file)
+    if state is not None and state['url'] == url and os.path.exists(part_file):
+        size = _hash_file(part_file, digest)
+        if size > 0:
+            headers['Range'] = 'bytes=%s-' % size
+            if state.get('etag') or state.get('last-modified'):
+                headers['If-Range'] = state.get('etag') or state.get('last-modified')
+    else:
+        _remove_files(part_file, state_file)
+
+    if 'Range' not in headers and validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last-modified'):
+            headers['If-Modified-Since'] = validators['last-modified']
+
+    response = get_session().get(url, cookies=cookies, headers=headers, stream=True, timeout=timeout)
+
+    # A 206 has to continue right where the partial file ends; Anything else is only a fragment of the file.
+    mismatched = response.status_code == 206 and _range_start(response) != size
+    if 'Range' in headers and (response.status_code == 416 or mismatched):
+        # The partial file is no longer valid for what the server has; Start from scratch (without a Range, so once).
+        response.close()
+        _remove_files(part_file, state_file)
+        return download(filename, url, cookies, useragent, progress=progress, checksum=checksum,
+                        validators=validators, timeout=timeout)
+
+    if response.status_code == 304:
+        raise NotModified("%s hasn't changed since it was last downloaded" % url)
+
+    if not response.ok:
+        raise FileNotFoundError(
+            'Unable to locate the resource %s at %s; Assure its valid in your requirements file' % (filename, url))
+
+    if mismatched or (response.status_code == 206 and 'Range' not in headers):
+        response.close()
+        raise ValueError("Unable to download %s; %s sent part of the file, which wasn't requested" % (filename, url))
+
+    if response.status_code == 206:
+        mode = 'ab'
+    else:
+        mode = 'wb'
+        digest = hashlib.sha256()
+        size = 0
+        _write_part_state(state_file, url, response)
+
+    with open(part_file, mode) as part_data:
+        size += stream_response(response, part_data, digest, progress)
+
+    sha256 = digest.hexdigest()
+    try:
+        if checksum is not None and sha256 != checksum:
+            raise ValueError("Checksum of %s (%s) doesn't match the expected checksum (%s)" % (
+                filename, sha256, checksum))
+
+        if os.path.splitext(filename)[1].lower() in ARCHIVE_EXTENSIONS:
+            _validate_archive(part_file)
+    except ValueError:
+        _remove_files(part_file, state_file)
+        raise
+
+    if validators is not None:
+        state = _read_part_state(state_file) or {}
+        validators.clear()
+        validators.update({'etag': state.get('etag'), 'last-modified': state.get('last-modified'), 'sha256': sha256})
+
+    os.replace(part_file, filename)
+    _remove_files(state_file)
+    return size, sha256
+
+
+def stream_response(response, file, digest, progress=None):
+    """
+    Stream the body of a (stream=True) response into file, updating digest along the way.
+
+    Unencoded bodies are read (through urllib3's readinto) into a reused buffer that grows from
+    MIN_CHUNK_SIZE up to MAX_CHUNK_SIZE while reads keep filling it, and progress is updated at
+    most every PROGRESS_INTERVAL seconds rather than per block.
+    :return: Amount of bytes written.
+    """
+    written = 0
+    reported = 0
+    last_report = time.time()
+    source = response.raw
+    view = None
+
+    if response.headers.get('Content-Encoding', 'identity') != 'identity' or not hasattr(source, 'readinto'):
+        # Encoded (Ex: gzip) bodies have to be decoded by requests; Fall back to its (allocating) iterator.
+        source = None
+        blocks = response.iter_content(MAX_CHUNK_SIZE)
+    else:
+        buffer = bytearray(MIN_CHUNK_SIZE)
+        view = memoryview(buffer)
+
+    complete = False
+    try:
+        while True:
+            if source is None:
+                block = next(blocks, b'')
+                count = len(block)
+            else:
+                count = source.readinto(view)
+                block = view[:count]
+
+            if count == 0:
+                break
+
+            file.write(block)
+            digest.update(block)
+            written += count
+
+            if source is not None and count == len(buffer) and len(buffer) < MAX_CHUNK_SIZE:
+                # The link keeps up with the buffer; Read larger chunks at a time.
+                view.release()
+                buffer = bytearray(len(buffer) * 2)
+                view = memoryview(buffer)
+
+            if progress is not None and time.time() - last_report >= PROGRESS_INTERVAL:
+                progress.update(written - reported)
+                reported, last_report = written, time.time()
+
+        # Unless told to enforce it, urllib3 ends the body of a connection closed early without complaint.
+        expected = response.headers.get('Content-Length', '')
+        if source is not None and expected.isdigit() and written != int(expected):
+            raise ValueError("Download of %s ended after %s of %s bytes" % (response.url, written, expected))
+        complete = True
+    finally:
+        if view is not None:
+            view.release()
+
+        if not complete:
+            # The connection is left halfway a body; Drop it rather than handing it back to the pool.
+            response.close()
+        elif source is not None:
+            # Hand the (fully read) connection back to the pool.
+            response.raw.release_conn()
+
+    if progress is not None and written > reported:
+        progress.update(written - reported)
+
+    return written
+
+
+def _range_start(response):
+    # Content-Range: bytes <start>-<end>/<total>
+    content_range = response.headers.get('Content-Range', '')
+    try:
+        return int(content_range.split(' ', 1)[1].split('-', 1)[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def _read_part_state(state_file):
+    if not os.path.exists(state_file):
+        return None
+
+    try:
+        with open(state_file, 'r') as state_data:
+            return json.load(state_data)
+    except (ValueError, OSError):
+        return None
+
+
+def _write_part_state(state_file, url, response):
+    with open(state_file, 'w') as state_data:
+        json.dump({
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last-modified': response.headers.get('Last-Modified'),
+        }, state_data)
+
+
+def _hash_file(file, digest):
+    size = 0
+    with open(file, 'rb') as file_data:
+        for block in iter(lambda: file_data.read(1024 * 1024), b''):
+            digest.update(block)
+            size += len(block)
+    return size
+
+
+def _validate_archive(file):
+    """
+    Validate the central directory of a jar (or zip) file, raising a ValueError if it's corrupt or truncated.
+    """
+    try:
+        with zipfile.ZipFile(file) as archive:
+            if len(archive.infolist()) == 0:
+                raise ValueError("%s is an empty archive" % file)
+    except zipfile.BadZipFile as e:
+        raise ValueError("%s is not a valid archive: %s" % (file, e))
+
+
+def _remove_files(*files):
+    for file in files:
+        if os.path.exists(file):
+            os.remove(file)
+
+
+def download_all(jobs, clearance=None, artifacts=None, max_workers=8, per_host=4):
+    """
+    Download every job concurrently, with at most max_workers transfers in flight at once,
+    and per_host transfers against any single host.
+
+    Jobs whose file is already in place (with the expected checksum) are left untouched, and
+    failed jobs don't stop the others; their error is stored on the job.
+    :param clearance: CloudflareClearance used for downloads from hosts behind Cloudflare; Its tokens
+    are only acquired if one of the jobs actually needs them.
+    :param artifacts: ArtifactCache consulted before downloading a file, and storing every file downloaded.
+    :return: The jobs, in the order they were passed, with their size, checksum (or error) filled in.
+    """
+    from tqdm import tqdm
+
+    jobs = list(jobs)
+    started = time.time()
+
+    with tqdm(unit='B', unit_scale=True, desc='Downloading %s plugins' % len(jobs)) as progress_bar:
+        progress = SharedProgress(progress_bar)
+
+        with HostLimitedPool(max_workers=max_workers, per_host=per_host) as pool:
+            futures = [pool.submit(job.host, run_download_job, job, clearance, artifacts, progress) for job in jobs]
+            jobs = [future.result() for future in futures]
+
+    complete_downloads(jobs, artifacts, time.time() - started)
+    return jobs
+
+
+def run_download_job(job, clearance=None, artifacts=None, progress=None):
+    """
+    Put the file of a job in place (see download_all), storing the error on the job if it fails.
+    :return: The job, with its size, checksum (or error) filled in.
+    """
+    with plugin_scope(_plugin_name(job)), tracing.span("download %s" % job.name, 'download', url=job.url) as span:
+        started = time.time()
+        try:
+            _retrieve(job, clearance, artifacts, progress)
+        except Exception as e:
+            job.error = e
+        job.elapsed = time.time() - started
+        span.set(size=job.size, cached=job.cached, unchanged=job.unchanged,
+                 error=None if job.error is None else str(job.error))
+    _record_download(job, artifacts)
+    return job
+
+
+def _plugin_name(job):
+    return job.name if job.data is None else job.data.get('name', job.name)
+
+
+def _record_download(job, artifacts):
+    metrics = get_metrics()
+    plugin = _plugin_name(job)
+    if job.error is not None:
+        metrics.record_plugin(plugin, download_seconds=job.elapsed, download_error=str(job.error))
+        return
+
+    downloaded = not (job.cached or job.unchanged)
+    if artifacts is not None:
+        metrics.increment('mcresolver_cache_requests_total', cache='artifact',
+                          result='hit' if job.cached else 'revalidated' if job.unchanged else 'miss')
+    if downloaded:
+        metrics.increment('mcresolver_download_bytes_total', job.size or 0, host=job.host)
+    metrics.observe('mcresolver_download_duration_seconds', job.elapsed, host=job.host)
+    metrics.record_plugin(plugin, download_bytes=job.size, download_seconds=job.elapsed,
+                          download_source='network' if downloaded else 'cache' if job.cached else 'unchanged',
+                          download_throughput=(job.size or 0) / job.elapsed if downloaded and job.elapsed > 0 else None)
+
+
+def complete_downloads(jobs, artifacts, elapsed):
+    """
+    Save the artifact cache once the jobs are done, keeping it within its size, and report on the downloads.
+    """
+    if artifacts is not None:
+        artifacts.save()
+        evicted, freed = artifacts.collect_garbage()
+        if evicted > 0:
+            print("Evicted %s plugins (%s) from the artifact cache" % (evicted, format_size(freed)))
+
+    total = sum(job.size for job in jobs if job.size is not None and not (job.cached or job.unchanged))
+    completed = len([job for job in jobs if job.error is None])
+    cached = len([job for job in jobs if job.cached])
+    unchanged = len([job for job in jobs if job.unchanged])
+    print("Retrieved %s of %s plugins (%s unchanged, %s from cache); Downloaded %s in %.2fs [%s/s]" % (
+        completed, len(jobs), unchanged, cached, format_size(total), elapsed,
+        format_size(total / elapsed if elapsed > 0 else total)))
+
+
+def _retrieve(job, clearance, artifacts, progress):
+    """
+    Put the file of a job in place; Skipping it when the file that's there is already up to date,
+    taking it from the artifact cache when possible, and only downloading it otherwise.
+    """
+    expected = job.checksum
+    if expected is None and artifacts is not None:
+        expected = artifacts.lookup(key=job.cache_key)
+
+    if expected is not None and _is_unchanged(job, expected):
+        return
+
+    cached = None if artifacts is None else artifacts.lookup(key=job.cache_key, sha256=expected)
+    if cached is not None:
+        artifacts.materialize(cached, job.file_name)
+        job.size, job.sha256, job.cached = artifacts.size_of(cached), cached, True
+        return
+
+    cookies, useragent = None, None
+    if clearance is not None and clearance.applies_to(job.url):
+        cookies, useragent = clearance.get_tokens()
+
+    # When the file last downloaded from this url is at hand (locally, or in the artifact cache)
+    # ask the server whether it's changed since, rather than downloading it again.
+    validators = {} if artifacts is None else artifacts.get_validators(job.url)
+    previous = validators.get('sha256')
+    if previous is None or (job.checksum is not None and previous != job.checksum):
+        validators = {}
+    elif _file_checksum(job.file_name)[1] != previous and artifacts.lookup(sha256=previous) is None:
+        validators = {}
+
+    try:
+        job.size, job.sha256 = download(job.file_name, job.url, cookies, useragent, progress=progress,
+                                        checksum=job.checksum, validators=validators)
+    except NotModified:
+        if not _is_unchanged(job, previous):
+            artifacts.materialize(previous, job.file_name)
+            job.size, job.sha256, job.cached = artifacts.size_of(previous), previous, True
+        return
+
+    if artifacts is not None:
+        artifacts.store(job.cache_key, job.file_name, job.sha256)
+        artifacts.set_validators(job.url, validators)
+
+
+def _is_unchanged(job, sha256):
+    """
+    Check whether the file of a job is already in place with the given checksum; Marking the job unchanged if so.
+    """
+    size, file_sha256 = _file_checksum(job.file_name)
+    if file_sha256 is None or file_sha256 != sha256:
+        return False
+
+    job.size, job.sha256, job.unchanged = size, sha256, True
+    return True
+
+
+def _file_checksum(file):
+    """
+    :return: Tuple of the size and SHA-256 checksum of a file, or (None, None) if it doesn't exist.
+    """
+    if not os.path.exists(file):
+        return None, None
+
+    digest = hashlib.sha256()
+    size = _hash_file(file, digest)
+    return size, digest.hexdigest()
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return "%.1f %s" % (size, unit)
+        size /= 1024.0
+
+
+def parse_size(size):
+    """
+    Read a size the way format_size writes it (and Spiget reports it; Ex: '1.5 MB').
+    :return: The size in bytes, or None if it can't be read.
+    """
+    units = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+    parts = str(size).split()
+    if len(parts) != 2 or parts[1].upper() not in units:
+        return None
+
+    try:
+        return int(float(parts[0]) * units[parts[1].upper()])
+    except ValueError:
+        return None
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import stat
+import threading
+
+# Files written since the last sync_written_files, whose folders are to be flushed to disk together.
+__unsynced_files = set()
+__unsynced_files_lock = threading.Lock()
+
+
+def write_file(file, data):
+    """
+    Write data to file, unless it already holds exactly that data (leaving its modification time untouched).
+
+    The data is written (and flushed to disk) to a temporary file that replaces file once complete, so neither
+    readers nor a crash ever leave a partial file; The renames are flushed to disk in one go by sync_written_files.
+    :return: True if the file was written, False if it was unchanged.
+    """
+    encoded = data.encode('utf-8')
+    if os.path.exists(file) and os.path.getsize(file) == len(encoded):
+        with open(file, 'rb') as data_file:
+            if data_file.read() == encoded:
+                return False
+
+    temp_file = "%s.%s.tmp" % (file, threading.get_ident())
+    try:
+        with open(temp_file, 'wb') as data_file:
+            data_file.write(encoded)
+            _flush(data_file)
+        _copy_mode(file, temp_file)
+        os.replace(temp_file, file)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    with __unsynced_files_lock:
+        __unsynced_files.add(os.path.abspath(file))
+    return True
+
+
+def write_stream(file, chunks):
+    """
+    Write the (text) chunks of an iterable to file as they're produced; Like write_file, the file is only
+    replaced (atomically) when the data differs from what it already holds.
+    :return: SHA-256 checksum of the data.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    temp_file = "%s.%s.tmp" % (file, threading.get_ident())
+    try:
+        with open(temp_file, 'wb') as data_file:
+            for chunk in chunks:
+                encoded = chunk.encode('utf-8')
+                digest.update(encoded)
+                size += len(encoded)
+                data_file.write(encoded)
+            _flush(data_file)
+
+        sha256 = digest.hexdigest()
+        if os.path.exists(file) and os.path.getsize(file) == size and file_sha256(file) == sha256:
+            os.remove(temp_file)
+            return sha256
+
+        _copy_mode(file, temp_file)
+        os.replace(temp_file, file)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    with __unsynced_files_lock:
+        __unsynced_files.add(os.path.abspath(file))
+    return sha256
+
+
+def _flush(data_file):
+    """
+    Flush a temporary file to disk before it replaces anything; Otherwise a crash could leave an empty file behind.
+    """
+    data_file.flush()
+    os.fsync(data_file.fileno())
+
+
+def _copy_mode(file, temp_file):
+    """
+    Give the temporary file replacing file the permissions file has (if it exists); Replacing it would drop them.
+    """
+    try:
+        mode = os.stat(file).st_mode
+    except FileNotFoundError:
+        return
+    os.chmod(temp_file, stat.S_IMODE(mode))
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    with open(file, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sync_written_files():
+    """
+    Flush the folders files were written into by write_file (their renames) to disk; The files themselves are
+    flushed as they're written.
+    :return: Amount of files written since the last sync.
+    """
+    with __unsynced_files_lock:
+        files = list(__unsynced_files)
+        __unsynced_files.clear()
+
+    for path in sorted(set(os.path.dirname(file) for file in files)):
+        try:
+            handle = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(handle)
+        except OSError:
+            pass
+        finally:
+            os.close(handle)
+
+    return len(files)
@@ -0,0 +1,618 @@
+from collections import OrderedDict
+
+import glob
+import json
+import os
+import re
+import time
+import yaml
+from yaml.events import StreamStartEvent, StreamEndEvent, DocumentStartEvent, DocumentEndEvent, \
+    MappingStartEvent, MappingEndEvent, ScalarEvent
+from yaml.resolver import Resolver
+
+from mcresolver import tracing, yamlio
+from mcresolver.files import write_file, sync_written_files
+from mcresolver.metrics import get_metrics
+from mcresolver.pool import worker_process_pool
+
+STR_TAG = 'tag:yaml.org,2002:str'
+MAP_TAG = 'tag:yaml.org,2002:map'
+
+# Name of the index written alongside a batch of generated templates.
+GENERATE_INDEX_NAME = "templates-index.yml"
+
+# Suffix of the snapshot (next to each generated template) of the configuration nodes it was generated from.
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Key (and value) of a mapping entry on a line of a template; Keys are either quoted, or run up to the first ': '
+TEMPLATE_KEY_LINE = re.compile(r"""^( *)('(?:[^']|'')*'|"(?:[^"\\]|\\.)*"|[^\s#'"][^#]*?):(?: +(.*))?$""")
+TEMPLATE_LOOP_LINE = re.compile(r"^\{% for .* in (.*?) %\}")
+TEMPLATE_VARIABLE = re.compile(r"\{\{\s*(.*?)\s*(?:\|.*?)?\}\}")
+
+# Types of values that are rendered without quotes in templates.
+UNQUOTED_TYPES = ('bool', 'int', 'float')
+
+
+class TemplateGenerator(object):
+    """
+    Generates a Jinja2 configuration template, and the defaults to render it with, from a plugin's
+    default configuration.
+
+    Every configuration node is visited once: its template variable, default value and type are collected
+    while walking the configuration, the template is emitted as a single stream of YAML events, and the
+    comments of the default configuration, unquoted values and list loops are applied line by line as
+    the template is assembled. Generation time grows linearly with the size of the configuration.
+    """
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        # Template variable of each node, by the (dotted) path of the node.
+        self.nodes = OrderedDict()
+        # Default value, type & list depth of each template variable.
+        self.defaults = OrderedDict()
+        self.types = {}
+        self.depths = {}
+        self.__resolver = Resolver()
+
+    def generate(self):
+        """
+        :return: Tuple of the template, and the contents of its defaults file.
+        """
+        config = yamlio.load_file(self.config_file)
+        with open(self.config_file, 'r') as config_data:
+            comments, eof_comment = collect_comments(config_data.read())
+
+        for key, value in config.items():
+            self.__collect(str(key), value, top_level=True)
+
+        template = yamlio.emit(self.__template_events(), indent=2, width=1000)
+
+        lines = []
+        for line in template.splitlines():
+            comment = comments.get(line.split(':')[0].strip())
+            if comment is not None:
+                lines.append(comment)
+            lines.append(self.__typed_line(line))
+            lines.append("\n")
+        if eof_comment is not None:
+            lines.append(eof_comment)
+
+        defaults = yamlio.dump(self.defaults)
+        # Blank rather than 'none', as yaml would read "none" back as a string.
+        return "".join(lines), defaults.replace(": none", ": ")
+
+    def __collect(self, key, value, top_level=False):
+        if isinstance(value, dict):
+            for child_key, child_value in value.items():
+                self.__collect("%s.%s" % (key, child_key), child_value)
+            return
+
+        node_name = get_name_from_key(".".join(key.split('.')[-2:]) if '.' in key else key)
+        if isinstance(value, list):
+            # Lists are rendered in a loop; indented by 2 spaces per parent node (or 1 on top level nodes).
+            self.depths[node_name] = 1 if top_level else len(key.split('.')) * 2
+
+        self.nodes[key] = node_name
+        self.defaults[node_name] = value
+        self.types[node_name] = value.__class__.__name__
+
+    def __template_events(self):
+        tree = OrderedDict()
+        for key, node_name in self.nodes.items():
+            assign_nested_path(tree, key, "{{%s}}" % node_name)
+
+        yield StreamStartEvent()
+        yield DocumentStartEvent(explicit=None)
+        yield from self.__mapping_events(tree)
+        yield DocumentEndEvent(explicit=None)
+        yield StreamEndEvent()
+
+    def __mapping_events(self, mapping):
+        yield MappingStartEvent(None, MAP_TAG, True, flow_style=False)
+        for key, value in mapping.items():
+            yield self.__scalar_event(key)
+            if isinstance(value, dict):
+                yield from self.__mapping_events(value)
+            else:
+                yield self.__scalar_event(value)
+        yield MappingEndEvent()
+
+    def __scalar_event(self, value):
+        value = str(value)
+        implicit = (self.__resolver.resolve(yaml.ScalarNode, value, (True, False)) == STR_TAG, True)
+        return ScalarEvent(None, STR_TAG, implicit, value)
+
+    def __typed_line(self, line):
+        # Values are emitted as quoted '{{variable}}' strings; numbers & booleans are unquoted,
+        # and lists are replaced by a loop over their items.
+        if not line.endswith("}}'"):
+            return line
+
+        start = line.rfind("'{{")
+        if start == -1:
+            return line
+
+        node_name = line[start + 3:-3]
+        value_type = self.types.get(node_name)
+        if value_type in UNQUOTED_TYPES:
+            return "%s{{%s}}" % (line[:start], node_name)
+
+        if value_type == 'list' and line[start - 1:start] == ' ':
+            return "%s\n{%% for %s_item in %s %%}%s- {{list_item}}\n{%% endfor %%}" % (
+                line[:start - 1], node_name, node_name, ' ' * self.depths[node_name])
+
+        return line
+
+    def snapshot(self):
+        """
+        The configuration nodes the template was generated from; Their template variable, type and list depth by path.
+        """
+        return OrderedDict((key, [node_name, self.types[node_name], self.depths.get(node_name)])
+                           for key, node_name in self.nodes.items())
+
+
+class TemplateDelta(object):
+    """
+    Paths of the configuration nodes added, removed and retyped (changed type) between two snapshots.
+    """
+
+    def __init__(self, previous, current):
+        self.added = [path for path in current if path not in previous]
+        self.removed = [path for path in previous if path not in current]
+        self.retyped = [path for path in current if path in previous and previous[path] != current[path]]
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.retyped)
+
+    def __str__(self):
+        return "+%s -%s ~%s nodes" % (len(self.added), len(self.removed), len(self.retyped))
+
+
+class TemplateBlock(object):
+    """
+    A mapping entry of a template; The comments preceding it, its key line and the lines belonging to its value
+    (Ex: the loop rendering a list)
+    """
+
+    def __init__(self, path, indent, start, line, value):
+        self.path = path
+        self.indent = indent
+        self.start = start
+        self.line = line
+        self.end = line + 1
+        self.value = value
+        # Template variable rendering the value of the entry; None for mappings, and values without a variable.
+        self.variable = None
+
+    def is_mapping(self):
+        return self.variable is None and not self.value and self.end == self.line + 1
+
+
+def parse_template_blocks(lines):
+    """
+    Split the lines of a template into the mapping entries they belong to, with the path (of keys) to each entry.
+    """
+    blocks = []
+    parents = []
+    comment_start = None
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped == "" or stripped.startswith('#'):
+            if comment_start is None:
+                comment_start = index
+            continue
+
+        match = None
+        if not stripped.startswith(('{%', '- ')) and stripped != '-':
+            match = TEMPLATE_KEY_LINE.match(line.rstrip('\n'))
+        if match is None:
+            # Part of the previous entry's value; Like a list loop, or its items.
+            if len(blocks) > 0:
+                block = blocks[-1]
+                block.end = index + 1
+                loop = TEMPLATE_LOOP_LINE.match(stripped)
+                if block.variable is None and loop is not None:
+                    block.variable = loop.group(1)
+            comment_start = None
+            continue
+
+        indent = len(match.group(1))
+        while len(parents) > 0 and parents[-1].indent >= indent:
+            parents.pop()
+
+        path = tuple(parent.path[-1] for parent in parents) + (match.group(2),)
+        block = TemplateBlock(path, indent, index if comment_start is None else comment_start, index, match.group(3))
+        variable = TEMPLATE_VARIABLE.search(block.value or "")
+        if variable is not None:
+            block.variable = variable.group(1)
+
+        blocks.append(block)
+        parents.append(block)
+        comment_start = None
+
+    return blocks
+
+
+def patch_template(lines, new_lines, delta, previous, current):
+    """
+    Patch the nodes of a delta into (the lines of) an existing template, keeping everything else as it is.
+    :param new_lines: Lines of the template generated from the current configuration.
+    :param previous: Snapshot the existing template was generated from.
+    :param current: Snapshot of the current configuration.
+    :return: The patched lines.
+    """
+    lines = list(lines)
+    new_blocks = parse_template_blocks(new_lines)
+    new_variables = dict((block.variable, block) for block in new_blocks if block.variable is not None)
+
+    # Variables still rendering nodes that are kept, which mustn't be removed along with a removed node.
+    kept = set(current[path][0] for path in current if path not in delta.added and path not in delta.retyped)
+    removed = set(previous[path][0] for path in delta.removed) - kept
+    retyped = set(current[path][0] for path in delta.retyped)
+
+    removed_paths = []
+    for block in reversed(parse_template_blocks(lines)):
+        if block.variable in retyped and block.variable in new_variables:
+            replacement = new_variables[block.variable]
+            lines[block.line:block.end] = new_lines[replacement.line:replacement.end]
+        elif block.variable in removed:
+            del lines[block.line:block.end]
+            removed_paths.append(block.path)
+
+    # Drop the mappings left without any entries once their nodes were removed.
+    while True:
+        blocks = parse_template_blocks(lines)
+        emptied = [block for index, block in enumerate(blocks) if block.is_mapping() and
+                   any(path[:len(block.path)] == block.path for path in removed_paths) and
+                   (index + 1 == len(blocks) or blocks[index + 1].indent <= block.indent)]
+        if len(emptied) == 0:
+            break
+        for block in reversed(emptied):
+            del lines[block.line:block.end]
+
+    # Insert the added nodes (and the mappings holding them) after the entry preceding them in the new template.
+    added = set(current[path][0] for path in delta.added)
+    existing = set(block.path for block in parse_template_blocks(lines))
+    inserted = [block for block in new_blocks if block.path not in existing and block.variable in added]
+    inserted_paths = set(block.path for block in inserted)
+    for block in new_blocks:
+        if block.path not in existing and block.is_mapping() and \
+                any(path[:len(block.path)] == block.path for path in inserted_paths):
+            inserted.append(block)
+    inserted = set(id(block) for block in inserted)
+
+    runs = []
+    anchor, run = None, None
+    for block in new_blocks:
+        if id(block) in inserted:
+            if run is None:
+                run = (anchor, [])
+                runs.append(run)
+            run[1].append(block)
+            continue
+
+        if block.path in existing:
+            anchor = block.path
+        run = None
+
+    for anchor, run in reversed(runs):
+        position = __insert_position(parse_template_blocks(lines), anchor, run[0].path)
+        inserted_lines = []
+        for block in run:
+            inserted_lines.extend(new_lines[block.start:block.end])
+        if position is None:
+            position = len(lines)
+        lines[position:position] = inserted_lines
+
+    return lines
+
+
+def __insert_position(blocks, anchor, path):
+    # Where an entry at path is inserted, following the anchor (the entry preceding it in the new template)
+    if anchor is None:
+        return blocks[0].line if len(blocks) > 0 else 0
+
+    if anchor == path[:len(anchor)]:
+        # The anchor is the mapping the entry belongs to.
+        for block in blocks:
+            if block.path == anchor:
+                return block.end
+
+    # Otherwise the entry follows the anchor's mapping (or the anchor itself) on the entry's level.
+    sibling = anchor[:len(path)]
+    position = None
+    for block in blocks:
+        if block.path[:len(sibling)] == sibling:
+            position = block.end
+        elif position is not None:
+            break
+    return position
+
+
+def patch_defaults(lines, delta, previous, current, defaults):
+    """
+    Patch the defaults of the nodes in a delta into (the lines of) an existing defaults file.
+    :param defaults: Defaults of the current configuration, by template variable.
+    :return: The patched lines.
+    """
+    lines = list(lines)
+    kept = set(current[path][0] for path in current if path not in delta.added and path not in delta.retyped)
+    removed = set(previous[path][0] for path in delta.removed) - kept
+    retyped = set(current[path][0] for path in delta.retyped)
+
+    # Entries of the defaults file; Spanning the nested lines of their value (Ex: lists of mappings)
+    entries = []
+    for block in parse_template_blocks(lines):
+        if block.indent == 0:
+            entries.append(block)
+        elif len(entries) > 0:
+            entries[-1].end = block.end
+
+    existing = set()
+    for block in reversed(entries):
+        name = yamlio.load(block.path[0]) if block.path[0][:1] in ('"', "'") else block.path[0]
+        existing.add(name)
+        if name in retyped:
+            lines[block.line:block.end] = __dump_defaults(OrderedDict([(name, defaults[name])]))
+        elif name in removed:
+            del lines[block.line:block.end]
+
+    added = OrderedDict()
+    for path in delta.added:
+        name = current[path][0]
+        if name not in existing:
+            added[name] = defaults[name]
+    if len(added) > 0:
+        if len(lines) > 0 and not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        lines.extend(__dump_defaults(added))
+
+    return lines
+
+
+def __dump_defaults(defaults):
+    dump = yamlio.dump(defaults)
+    return dump.replace(": none", ": ").splitlines(True)
+
+
+def snapshot_path(template_file):
+    folder, name = os.path.split(template_file)
+    return os.path.join(folder, ".%s%s" % (name, SNAPSHOT_SUFFIX))
+
+
+def read_snapshot(template_file):
+    """
+    :return: The snapshot the template was generated from, or None if there isn't any.
+    """
+    try:
+        with open(snapshot_path(template_file), 'r') as snapshot_data:
+            return OrderedDict((node[0], node[1:]) for node in json.load(snapshot_data)['nodes'])
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+
+
+def write_snapshot(template_file, snapshot):
+    write_file(snapshot_path(template_file),
+               json.dumps({'nodes': [[path] + node for path, node in snapshot.items()]}, indent=1))
+
+
+def generate_template_files(config_file, template_file, defaults_file, incremental=False):
+    """
+    Generate the template & defaults of a configuration file, and write them (with the snapshot of the nodes they
+    were generated from) to template_file & defaults_file.
+
+    When incremental, and the files were generated before, only the nodes added, removed or retyped since are
+    patched into them; Keeping any edits made to the template and defaults.
+    :return: Tuple of the generator, and the delta patched in (None if the files were generated from scratch)
+    """
+    generator = TemplateGenerator(config_file)
+    template, defaults = generator.generate()
+    current = generator.snapshot()
+    previous = read_snapshot(template_file) if incremental else None
+
+    if previous is None or not os.path.exists(template_file) or not os.path.exists(defaults_file):
+        write_file(template_file, template)
+        write_file(defaults_file, defaults)
+        write_snapshot(template_file, current)
+        return generator, None
+
+    delta = TemplateDelta(previous, current)
+    if len(delta) > 0:
+        with open(template_file, 'r') as template_data:
+            template_lines = template_data.read().splitlines(True)
+        with open(defaults_file, 'r') as defaults_data:
+            defaults_lines = defaults_data.read().splitlines(True)
+
+        write_file(template_file, "".join(patch_template(template_lines, template.splitlines(True), delta,
+                                                         previous, current)))
+        write_file(defaults_file, "".join(patch_defaults(defaults_lines, delta, previous, current,
+                                                         generator.defaults)))
+    write_snapshot(template_file, current)
+    return generator, delta
+
+
+def generate_template(config_file):
+    """
+    Generate a configuration template (and its defaults) from a plugin's default configuration file.
+    :return: Tuple of the template, and the contents of its defaults file.
+    """
+    return TemplateGenerator(config_file).generate()
+
+
+def get_name_from_key(key):
+    return key.lower().replace('-', '_').replace('.', '_')
+
+
+def assign_nested_path(tree, path, value):
+    """
+    Assign value to the (dotted) path inside tree, creating the mappings along the way.
+    """
+    keys = path.split('.')
+    for key in keys[:-1]:
+        if key not in tree:
+            tree[key] = OrderedDict()
+        tree = tree[key]
+    tree[keys[-1]] = value
+
+
+def collect_comments(config):
+    """
+    Collect the comments (and blank lines) of a configuration, by the key of the node they precede.
+    :return: Tuple of the comments by key, and the comment ending the configuration (None if there isn't one).
+    """
+    comments = {}
+    eof_comment = None
+    lines = iter(config.splitlines())
+    for line in lines:
+        if not line:
+            comment = "\n"
+        elif line.startswith("#"):
+            comment = "%s\n" % line
+        else:
+            continue
+
+        for line in lines:
+            if line and not line.startswith("#"):
+                break
+            comment += "%s\n" % line
+        else:
+            eof_comment = comment
+
+        comments[line.split(':')[0].strip()] = comment
+
+    return comments, eof_comment
+
+
+class GenerateJob(object):
+    """
+    A configuration file to generate a template & defaults from, as part of a batch run by generate_all.
+    """
+
+    def __init__(self, plugin, config_file, output_folder, incremental=False):
+        self.plugin = plugin
+        self.config_file = config_file
+        self.output_folder = output_folder
+        self.incremental = incremental
+        # Name the generated files after the plugin; Suffixed by the configuration's name unless it's config.yml
+        config_name = os.path.splitext(os.path.basename(config_file))[0]
+        self.name = plugin if config_name == 'config' else "%s-%s" % (plugin, config_name)
+        self.template_file = os.path.join(output_folder, '%s-template.yml' % self.name)
+        self.defaults_file = os.path.join(output_folder, '%s-defaults.yml' % self.name)
+        # Filled in once the job has finished.
+        self.nodes = 0
+        self.delta = None
+        self.error = None
+        self.elapsed = None
+        # Whether the run is traced; Workers that didn't inherit its tracer (spawned) record spans on one of their own.
+        self.traced = tracing.get_tracer() is not None
+        # Spans recorded while generating on a worker process, to be merged into the trace of the run.
+        self.trace = None
+
+
+def run_generate_job(job):
+    """
+    Generate the template & defaults of a job's configuration file, and write them to its output folder.
+    :return: The job, with its result filled in.
+    """
+    started = time.time()
+    with tracing.span("generate %s" % job.name, 'generate', config=job.config_file) as span:
+        try:
+            generator, job.delta = generate_template_files(job.config_file, job.template_file, job.defaults_file,
+                                                           incremental=job.incremental)
+            sync_written_files()
+            job.nodes = len(generator.nodes)
+        except Exception as e:
+            job.error = "%s: %s" % (e.__class__.__name__, e)
+        span.set(nodes=job.nodes, error=job.error)
+
+    job.elapsed = time.time() - started
+    return job
+
+
+def run_generate_job_in_worker(job):
+    # Worker processes send the spans they recorded back along with the job.
+    with tracing.worker_trace(job.traced) as tracer:
+        job = run_generate_job(job)
+    job.trace = None if tracer is None else tracer.recorded()
+    return job
+
+
+def discover_config_files(source):
+    """
+    Find the plugin configuration files to generate templates from.
+    :param source: A server's plugins folder (every .yml file directly inside each plugin's folder is used),
+    or a glob pattern matching configuration files (Ex: plugins/*/config.yml)
+    :return: List of tuples holding the name of the plugin (the folder it's in) and the configuration file.
+    """
+    source = os.path.expanduser(source)
+    if os.path.isdir(source):
+        config_files = glob.glob(os.path.join(glob.escape(source), '*', '*.yml'))
+    else:
+        config_files = glob.glob(source)
+
+    return [(os.path.basename(os.path.dirname(os.path.abspath(file))), file)
+            for file in sorted(config_files) if os.path.isfile(file)]
+
+
+def is_batch_source(source):
+    """
+    Whether the source to generate templates from is a plugins folder or glob, rather than a single configuration.
+    """
+    return os.path.isdir(os.path.expanduser(source)) or glob.has_magic(source)
+
+
+def generate_all(jobs, processes=None):
+    """
+    Generate the templates of every job on a pool of processes (one per core, unless told otherwise),
+    reporting the result of each.
+    :return: The jobs, in the order they were passed, with their results filled in.
+    """
+    jobs = list(jobs)
+    processes = processes or os.cpu_count() or 1
+
+    if processes > 1 and len(jobs) > 1:
+        with worker_process_pool(min(processes, len(jobs))) as pool:
+            jobs = list(pool.map(run_generate_job_in_worker, jobs))
+        for job in jobs:
+            tracing.add_worker_trace(job.trace)
+            job.trace = None
+    else:
+        jobs = [run_generate_job(job) for job in jobs]
+
+    metrics = get_metrics()
+    for job in jobs:
+        metrics.observe('mcresolver_generate_duration_seconds', job.elapsed)
+        metrics.record_plugin(job.name, generate_seconds=job.elapsed, nodes=job.nodes, generate_error=job.error)
+
+        if job.error is None and job.delta is not None:
+            print("  updated    %-40s %6s nodes %6.2fs  %s" % (job.name, job.nodes, job.elapsed, job.delta))
+        elif job.error is None:
+            print("  generated  %-40s %6s nodes %6.2fs" % (job.name, job.nodes, job.elapsed))
+        else:
+            print("  error      %-40s %s" % (job.name, job.error))
+
+    return jobs
+
+
+def write_index(output_folder, jobs):
+    """
+    Write the index of a batch of generated templates (by plugin) to the output folder.
+    :return: Location of the index.
+    """
+    index = OrderedDict()
+    for job in jobs:
+        entry = OrderedDict([('config', os.path.abspath(job.config_file))])
+        if job.error is None:
+            entry['template'] = os.path.basename(job.template_file)
+            entry['defaults'] = os.path.basename(job.defaults_file)
+            entry['nodes'] = job.nodes
+        else:
+            entry['error'] = job.error
+        index.setdefault(job.plugin, OrderedDict())[os.path.basename(job.config_file)] = entry
+
+    index_file = os.path.join(output_folder, GENERATE_INDEX_NAME)
+    write_file(index_file, "# Generated by mcresolver; The templates generated from each plugin's configuration.\n" +
+               yamlio.dump(index))
+    sync_written_files()
+    return index_file
@@ -0,0 +1,145 @@
+from concurrent.futures import Future
+
+from bukget import BukkitResource
+from spiget import SpigotResource
+
+import os
+
+from mcresolver import yamlio
+from mcresolver.files import write_file
+
+LOCKFILE_NAME = "mcresolver.lock"
+
+# Keys every locked plugin has.
+LOCKED_KEYS = ('name', 'requested-version', 'version', 'download-url', 'file-name')
+
+
+class LockedBukkitResource(BukkitResource):
+    """
+    BukkitResource rebuilt from its lockfile entry, so a locked plugin can be downloaded
+    and configured without contacting BukGet.
+    """
+
+    def __init__(self, plugin_name, entry):
+        self.plugin_name = plugin_name
+        self.entry = entry
+
+    def has_version(self, version):
+        return version in ('latest', self.entry['version'], self.entry['requested-version'])
+
+    def get_latest_version(self):
+        return self.entry['version']
+
+    def get_download_link(self, version="latest"):
+        return self.entry['download-url']
+
+    def get_versioned_file_name(self, version="latest"):
+        return self.entry['file-name']
+
+
+class LockedSpigotResource(SpigotResource):
+    """
+    SpigotResource rebuilt from its lockfile entry, so a locked resource can be downloaded
+    and configured without contacting Spiget.
+    """
+
+    def __init__(self, resource_id, entry):
+        self.resource_id = resource_id
+        self.entry = entry
+        self.name = entry['name']
+        self.version = entry['version']
+        self.versions = [entry['version']]
+        self.file_type = entry['file-type'] if 'file-type' in entry else os.path.splitext(entry['file-name'])[1]
+        self.external = False
+
+    def get_download_link(self, version="latest"):
+        return self.entry['download-url']
+
+
+def lockfile_path(requirements_file):
+    """
+    Location of the lockfile belonging to a requirements file; It's kept right next to it.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(os.path.expanduser(requirements_file))), LOCKFILE_NAME)
+
+
+def read_lockfile(file):
+    """
+    Read the resolved plugins from a lockfile.
+    :return: Dictionary indexed by the source ('Bukkit' / 'Spigot') holding the locked entries of each plugin,
+    or an empty dictionary if there's no lockfile (or it's corrupt, in which case every plugin is resolved again).
+    """
+    if not os.path.exists(file):
+        return {}
+
+    try:
+        locked = yamlio.load_file(file) or {}
+        for entries in locked.values():
+            for entry in entries.values():
+                missing = [key for key in LOCKED_KEYS if key not in entry]
+                if len(missing) > 0:
+                    raise KeyError(", ".join(missing))
+    except Exception as e:
+        print("Lockfile %s is corrupt (%s: %s); Resolving every plugin again" % (file, e.__class__.__name__, e))
+        return {}
+
+    return locked
+
+
+def write_lockfile(file, bukkit_resources, spigot_resources):
+    """
+    Write the resolved Bukkit & Spigot plugins (as collected by MinecraftPluginResolver) to a lockfile.
+    """
+    locked = {}
+
+    for source, resources in (('Bukkit', bukkit_resources), ('Spigot', spigot_resources)):
+        if len(resources) == 0:
+            continue
+
+        locked[source] = {}
+        for plugin, data in resources.items():
+            locked[source][plugin] = {
+                'name': data['name'],
+                'requested-version': data['requested-version'],
+                # Whether the version requested was unavailable, and the latest was retrieved instead.
+                'latest-fallback': data.get('version') == 'latest' and str(data['requested-version']) != 'latest',
+                'version': data['resolved-version'],
+                'download-url': data['download-url'],
+                'file-name': data['file-name'],
+                'size': data.get('size'),
+                'sha256': data.get('sha256'),
+            }
+
+    # Written atomically; An interrupted run never leaves a truncated lockfile behind.
+    write_file(file, "# Generated by mcresolver; Plugins listed here are downloaded without resolving them again.\n"
+                     "# Delete this file, or run with --refresh, to resolve your requirements again.\n" +
+               yamlio.dump(locked))
+
+
+def locked_lookup(locked, source, plugin, requested_version):
+    """
+    Retrieve the record of a plugin from the lockfile, in the same form lookup_bukkit_resource
+    and lookup_spigot_resource produce.
+    :return: Completed Future holding the record, or None if the plugin (at the requested version) isn't locked.
+    """
+    entry = locked.get(source, {}).get(plugin)
+    if entry is None or str(entry['requested-version']) != str(requested_version):
+        return None
+
+    if source == 'Bukkit':
+        resource = LockedBukkitResource(plugin, entry)
+    else:
+        resource = LockedSpigotResource(plugin, entry)
+
+    lookup = Future()
+    lookup.set_result({
+        'resource': resource,
+        # The version configure_plugin is given; The same as resolving the plugin (again) would give it.
+        'version': 'latest' if entry.get('latest-fallback') else entry['requested-version'],
+        'resolved-version': entry['version'],
+        'download-url': entry['download-url'],
+        'file-name': entry['file-name'],
+        'size': entry.get('size'),
+        'sha256': entry.get('sha256'),
+    })
+    return lookup
@@ -0,0 +1,379 @@
+import contextlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Upper bounds (in seconds) of the buckets latencies and durations are counted in.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Description of every metric; Written along with them to the Prometheus textfile.
+METRICS = OrderedDict([
+    ('mcresolver_http_requests_total', ('counter', "HTTP requests made, by host and status code")),
+    ('mcresolver_http_request_duration_seconds', ('histogram', "Time until the response headers of HTTP requests "
+                                                               "were received, by host")),
+    ('mcresolver_lookup_duration_seconds', ('histogram', "Time taken to resolve the metadata of a plugin, by host")),
+    ('mcresolver_cloudflare_solve_duration_seconds', ('histogram', "Time taken to solve the Cloudflare challenge")),
+    ('mcresolver_download_bytes_total', ('counter', "Bytes of plugins downloaded, by host")),
+    ('mcresolver_download_duration_seconds', ('histogram', "Time taken to put a plugin file in place, by host")),
+    ('mcresolver_cache_requests_total', ('counter', "Cache lookups, by cache and result (hit, revalidated or miss)")),
+    ('mcresolver_render_duration_seconds', ('histogram', "Time taken to render the configuration of a plugin")),
+    ('mcresolver_script_duration_seconds', ('histogram', "Time taken to configure a plugin by its script")),
+    ('mcresolver_configure_duration_seconds', ('histogram', "Time taken to configure a plugin, fetching included")),
+    ('mcresolver_generate_duration_seconds', ('histogram', "Time taken to generate the templates of a configuration")),
+    ('mcresolver_phase_duration_seconds', ('gauge', "Time spent on each phase of the last run")),
+    ('mcresolver_stage_busy_seconds', ('gauge', "Time the tasks of each pipeline stage ran for in the last run")),
+    ('mcresolver_critical_path_seconds', ('gauge', "Length of the chain of tasks the last run had to wait on")),
+    ('mcresolver_plugin_download_bytes', ('gauge', "Size of the file of each plugin")),
+    ('mcresolver_plugin_duration_seconds', ('gauge', "Time spent on each step of each plugin in the last run")),
+    ('mcresolver_last_run_timestamp_seconds', ('gauge', "When the last run finished")),
+])
+
+# Values recorded on plugins that are also exported (as mcresolver_plugin_duration_seconds) by step.
+PLUGIN_STEPS = ('resolve', 'download', 'render', 'script', 'configure', 'generate')
+
+__metrics = None
+__metrics_lock = threading.Lock()
+__scope = threading.local()
+
+
+class Histogram(object):
+    """
+    Count of observed values per bucket (bucket counts aren't cumulative until exported), with their sum.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def cumulative(self):
+        """
+        :return: List of tuples holding the upper bound of each bucket ('+Inf' last) and the values observed up to it.
+        """
+        total = 0
+        buckets = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count > 0 else 0,
+            'buckets': OrderedDict((str(bound), count) for bound, count in self.cumulative()),
+        }
+
+
+class Metrics(object):
+    """
+    Counters, gauges and histograms collected while running (by their name and labels), along with what was
+    recorded on each plugin; Exported as a JSON run report (to_dict) or a Prometheus textfile (to_prometheus).
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = OrderedDict()
+        self.gauges = OrderedDict()
+        self.histograms = OrderedDict()
+        self.phases = OrderedDict()
+        self.plugins = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        # Metrics collected on worker processes are sent back to be merged; Locks can't be pickled.
+        state = self.__dict__.copy()
+        del state['_Metrics__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self.__lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.__lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self.__lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        """
+        Observe how long the block takes (in seconds) in the histogram name.
+        """
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - started, **labels)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Record how long a phase of the run (Ex: resolve, download, configure) takes.
+        """
+        from mcresolver import tracing
+
+        started = time.time()
+        try:
+            yield
+        finally:
+            finished = time.time()
+            elapsed = finished - started
+            with self.__lock:
+                self.phases[name] = self.phases.get(name, 0) + elapsed
+            self.set('mcresolver_phase_duration_seconds', self.phases[name], phase=name)
+            # The run finishes along with its last (outermost) phase.
+            self.set('mcresolver_last_run_timestamp_seconds', finished)
+            tracing.complete(name, 'phase', started, elapsed)
+
+    def record_plugin(self, plugin=None, **values):
+        """
+        Record values (by their name, with underscores written as dashes) on a plugin; By default on the plugin
+        of the current plugin_scope, if any.
+        """
+        plugin = current_plugin() if plugin is None else plugin
+        if plugin is None:
+            return
+
+        with self.__lock:
+            record = self.plugins.setdefault(str(plugin), OrderedDict())
+            for name, value in values.items():
+                record[name.replace('_', '-')] = value
+
+    def cache_results(self):
+        """
+        :return: Dictionary indexed by cache, holding the number of hits, revalidations & misses and the hit ratio;
+        Revalidated entries (served from the cache after checking they're unchanged) count as hits.
+        """
+        caches = OrderedDict()
+        for (name, labels), count in list(self.counters.items()):
+            if name != 'mcresolver_cache_requests_total':
+                continue
+            labels = dict(labels)
+            results = caches.setdefault(labels['cache'], OrderedDict([('hit', 0), ('revalidated', 0), ('miss', 0)]))
+            results[labels['result']] = results.get(labels['result'], 0) + count
+
+        for results in caches.values():
+            total = sum(results.values())
+            results['hit-ratio'] = (results['hit'] + results['revalidated']) / total if total > 0 else 0
+        return caches
+
+    def host_results(self):
+        """
+        :return: Dictionary indexed by host, holding the requests made to it (by status), their latency,
+        and the bytes downloaded from it along with the throughput.
+        """
+        hosts = OrderedDict()
+
+        def host(name):
+            return hosts.setdefault(name, OrderedDict([('requests', 0), ('statuses', OrderedDict())]))
+
+        for (name, labels), value in list(self.counters.items()):
+            labels = dict(labels)
+            if name == 'mcresolver_http_requests_total':
+                results = host(labels['host'])
+                results['requests'] += value
+                results['statuses'][labels['status']] = value
+            elif name == 'mcresolver_download_bytes_total':
+                host(labels['host'])['downloaded-bytes'] = value
+
+        for (name, labels), histogram in list(self.histograms.items()):
+            labels = dict(labels)
+            if name == 'mcresolver_http_request_duration_seconds':
+                host(labels['host'])['latency'] = histogram.to_dict()
+            elif name == 'mcresolver_lookup_duration_seconds':
+                host(labels['host'])['lookups'] = histogram.to_dict()
+            elif name == 'mcresolver_download_duration_seconds':
+                results = host(labels['host'])
+                results['downloads'] = histogram.to_dict()
+                if histogram.sum > 0:
+                    results['throughput'] = results.get('downloaded-bytes', 0) / histogram.sum
+        return hosts
+
+    def merge(self, other):
+        """
+        Add the metrics collected by other (Ex: on a worker process) to these.
+        """
+        with self.__lock:
+            self.__add_totals(other)
+            self.gauges.update(other.gauges)
+            for name, elapsed in other.phases.items():
+                self.phases[name] = self.phases.get(name, 0) + elapsed
+            for plugin, values in other.plugins.items():
+                self.plugins.setdefault(plugin, OrderedDict()).update(values)
+
+    def add_run(self, run):
+        """
+        Add the metrics of a run to these, collected over every run of a long running process (Ex: the daemon);
+        Counters and histograms add up, while the gauges and plugin values describe the last run only.
+        """
+        with self.__lock:
+            self.__add_totals(run)
+            self.gauges = OrderedDict(run.gauges)
+            self.phases = OrderedDict(run.phases)
+            self.plugins = OrderedDict((plugin, OrderedDict(values)) for plugin, values in run.plugins.items())
+
+    def __add_totals(self, other):
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, histogram in other.histograms.items():
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(histogram.buckets)
+            self.histograms[key].merge(histogram)
+
+    def to_dict(self):
+        return OrderedDict([
+            ('started', self.started),
+            ('elapsed', time.time() - self.started),
+            ('phases', OrderedDict(self.phases)),
+            ('plugins', OrderedDict((plugin, OrderedDict(values)) for plugin, values in list(self.plugins.items()))),
+            ('hosts', self.host_results()),
+            ('caches', self.cache_results()),
+            ('histograms', [OrderedDict([('name', name), ('labels', dict(labels))] + list(histogram.to_dict().items()))
+                            for (name, labels), histogram in list(self.histograms.items())]),
+            ('counters', [{'name': name, 'labels': dict(labels), 'value': value}
+                          for (name, labels), value in list(self.counters.items())]),
+        ])
+
+    def to_prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format; Per plugin values are exported as gauges.
+        """
+        samples = OrderedDict((name, []) for name in METRICS)
+
+        for (name, labels), value in list(self.counters.items()):
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), value in list(self.gauges.items()):
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), histogram in list(self.histograms.items()):
+            for bound, count in histogram.cumulative():
+                samples.setdefault(name, []).append(("%s_bucket" % name, labels + (('le', str(bound)),), count))
+            samples[name].append(("%s_sum" % name, labels, histogram.sum))
+            samples[name].append(("%s_count" % name, labels, histogram.count))
+
+        for plugin, values in list(self.plugins.items()):
+            if 'download-bytes' in values:
+                samples['mcresolver_plugin_download_bytes'].append(
+                    ('mcresolver_plugin_download_bytes', (('plugin', plugin),), values['download-bytes']))
+            for step in PLUGIN_STEPS:
+                if values.get('%s-seconds' % step) is not None:
+                    samples['mcresolver_plugin_duration_seconds'].append(
+                        ('mcresolver_plugin_duration_seconds', (('plugin', plugin), ('step', step)),
+                         values['%s-seconds' % step]))
+
+        lines = []
+        for name, metric_samples in samples.items():
+            if len(metric_samples) == 0:
+                continue
+            kind, description = METRICS.get(name, ('untyped', name))
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for sample_name, labels, value in metric_samples:
+                lines.append("%s%s %s" % (sample_name, _format_labels(labels), _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics():
+    """
+    The metrics shared by everything running in this process; Created on first use.
+    """
+    global __metrics
+
+    with __metrics_lock:
+        if __metrics is None:
+            __metrics = Metrics()
+        return __metrics
+
+
+def reset_metrics():
+    """
+    Start collecting metrics anew (Ex: for every job ran on a worker process).
+    :return: The new metrics.
+    """
+    global __metrics
+
+    with __metrics_lock:
+        __metrics = Metrics()
+        return __metrics
+
+
+@contextlib.contextmanager
+def plugin_scope(plugin):
+    """
+    Attribute what's recorded on the current thread (through record_plugin) to plugin.
+    """
+    previous = getattr(__scope, 'plugin', None)
+    __scope.plugin = plugin
+    try:
+        yield
+    finally:
+        __scope.plugin = previous
+
+
+def current_plugin():
+    return getattr(__scope, 'plugin', None)
+
+
+def write_report(file, metrics=None):
+    """
+    Write the metrics as a JSON run report.
+    """
+    from mcresolver.files import write_file
+
+    write_file(file, json.dumps((metrics or get_metrics()).to_dict(), indent=2, default=str))
+
+
+def write_textfile(file, metrics=None):
+    """
+    Write the metrics as a Prometheus textfile (for node_exporter's textfile collector); The file is replaced
+    atomically, so it's never collected half written.
+    """
+    from mcresolver.files import write_file
+
+    write_file(file, (metrics or get_metrics()).to_prometheus())
+
+
+def _labels(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for name, value in labels)
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,327 @@
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from mcresolver import tracing
+from mcresolver.metrics import get_metrics
+
+# Amount of connections kept alive per host in the shared session.
+MAX_POOL_CONNECTIONS = 32
+
+# How long clearance tokens are trusted when Cloudflare doesn't say when they expire.
+DEFAULT_CLEARANCE_LIFETIME = 30 * 60
+
+# Hosts whose downloads redirect to SpigotMC, and so need its clearance as well.
+SPIGOTMC_REDIRECTING_HOSTS = ('api.spiget.org',)
+
+# Where fetch_text caches responses, and the response headers relevant to caching them.
+HTTP_CACHE_FOLDER = os.path.expanduser("~/.mcresolver/http-cache")
+CACHE_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Date', 'Age')
+
+# Upper bound of how long responses without explicit freshness are considered fresh (RFC 7234, 4.2.2)
+MAX_HEURISTIC_FRESHNESS = 24 * 60 * 60
+
+__session = None
+__session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    The HTTP session shared by every download and metadata request mcresolver makes.
+
+    It's a cfscrape scraper (so it can get past Cloudflare's anti-bot page) with keep-alive connection
+    pools large enough for every download worker; created on first use.
+    """
+    global __session
+
+    with __session_lock:
+        if __session is None:
+            # cfscrape is slow to import, and only needed once something is actually requested.
+            import cfscrape
+
+            session = cfscrape.create_scraper()
+            adapter = HTTPAdapter(pool_connections=MAX_POOL_CONNECTIONS, pool_maxsize=MAX_POOL_CONNECTIONS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.hooks['response'].append(_record_response)
+            __session = session
+
+        return __session
+
+
+class CloudflareClearance(object):
+    """
+    Cloudflare clearance cookies & user agent required to download from SpigotMC.
+
+    Solving the anti-bot challenge takes several seconds, so the tokens are only acquired the first time
+    a download from a protected host (or one redirecting to it, like Spiget's) needs them, and are persisted
+    (with their expiry) to reuse them across runs until they expire.
+    """
+
+    def __init__(self, tokens_file, protected_domain='spigotmc.org', challenge_url='https://www.spigotmc.org',
+                 redirecting_hosts=SPIGOTMC_REDIRECTING_HOSTS, timeout=30):
+        self.tokens_file = os.path.expanduser(tokens_file)
+        self.protected_domain = protected_domain
+        self.challenge_url = challenge_url
+        self.redirecting_hosts = tuple(redirecting_hosts)
+        self.timeout = timeout
+        self.__tokens = None
+        self.__lock = threading.Lock()
+
+    def applies_to(self, url):
+        """
+        :return: Whether downloading url requires the clearance; Its cookies are sent along the redirects it follows.
+        """
+        host = urlsplit(url).hostname or ''
+        return host == self.protected_domain or host.endswith('.%s' % self.protected_domain) or \
+            host in self.redirecting_hosts
+
+    def get_tokens(self):
+        """
+        Retrieve the clearance cookies and user agent; loaded from disk if they're still valid,
+        otherwise the challenge is solved again.
+        :return: Tuple of the cookies (dictionary) and the user agent to send along with them.
+        """
+        with self.__lock:
+            if self.__tokens is None or self.__expired(self.__tokens):
+                self.__tokens = self.__load()
+
+            if self.__tokens is None or self.__expired(self.__tokens):
+                self.__tokens = self.__solve_challenge()
+                self.__save(self.__tokens)
+
+            return self.__tokens['cookies'], self.__tokens['user-agent']
+
+    def __expired(self, tokens):
+        return tokens['expires'] <= time.time()
+
+    def __load(self):
+        if not os.path.exists(self.tokens_file):
+            return None
+
+        try:
+            with open(self.tokens_file, 'r') as tokens_data:
+                return json.load(tokens_data)
+        except (ValueError, OSError):
+            return None
+
+    def __save(self, tokens):
+        temp_file = "%s.tmp" % self.tokens_file
+        with open(temp_file, 'w') as tokens_data:
+            json.dump(tokens, tokens_data)
+        os.replace(temp_file, self.tokens_file)
+
+    def __solve_challenge(self):
+        print("Retrieving Cloudflare clearance for %s" % self.challenge_url)
+        session = get_session()
+        with get_metrics().timed('mcresolver_cloudflare_solve_duration_seconds'), \
+                tracing.span("cloudflare challenge", 'http', url=self.challenge_url):
+            session.get(self.challenge_url, timeout=self.timeout).raise_for_status()
+
+        cookies = {}
+        expires = time.time() + DEFAULT_CLEARANCE_LIFETIME
+        for cookie in session.cookies:
+            if not cookie.domain.lstrip('.').endswith(self.protected_domain):
+                continue
+            cookies[cookie.name] = cookie.value
+            if cookie.expires is not None:
+                expires = min(expires, cookie.expires)
+
+        return {
+            'cookies': cookies,
+            'user-agent': session.headers['User-Agent'],
+            'expires': expires,
+        }
+
+
+class HttpCache(object):
+    """
+    On-disk cache of the responses to GET requests (templates, defaults files, configuration scripts)
+    following the caching rules of RFC 7234.
+
+    Responses are fresh for their Cache-Control max-age (or until Expires, or heuristically for a tenth
+    of the time since they were last modified), and are revalidated with a conditional request
+    (If-None-Match / If-Modified-Since) once stale. Responses marked no-store aren't cached, and those
+    marked no-cache are revalidated on every use. When the origin can't be reached, the cached copy
+    is served (stale or not).
+    """
+
+    def __init__(self, cache_folder, timeout=30):
+        self.cache_folder = os.path.expanduser(cache_folder)
+        self.timeout = timeout
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder, exist_ok=True)
+
+    def __entry_path(self, url):
+        return os.path.join(self.cache_folder, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def get(self, url):
+        """
+        Retrieve the body of url, from the cache when it's fresh.
+        :return: The body of the response, as bytes.
+        """
+        entry_file = self.__entry_path(url)
+        entry = self.__read_entry(entry_file)
+
+        metrics = get_metrics()
+        if entry is not None and self.__is_fresh(entry):
+            metrics.increment('mcresolver_cache_requests_total', cache='http', result='hit')
+            return self.__read_body(entry_file)
+
+        headers = {}
+        if entry is not None:
+            if entry['headers'].get('etag'):
+                headers['If-None-Match'] = entry['headers']['etag']
+            if entry['headers'].get('last-modified'):
+                headers['If-Modified-Since'] = entry['headers']['last-modified']
+
+        try:
+            response = get_session().get(url, headers=headers, timeout=self.timeout)
+            if response.status_code >= 500:
+                raise requests.HTTPError("%s responded with %s" % (url, response.status_code), response=response)
+        except requests.RequestException as e:
+            if entry is None:
+                raise
+            print("Unable to reach %s (%s); Using the cached copy" % (url, e))
+            metrics.increment('mcresolver_cache_requests_total', cache='http', result='hit')
+            return self.__read_body(entry_file)
+
+        if response.status_code == 304 and entry is not None:
+            metrics.increment('mcresolver_cache_requests_total', cache='http', result='revalidated')
+            entry['headers'].pop('age', None)
+            entry['headers'].update(_cache_headers(response))
+            entry['stored'] = time.time()
+            self.__write_entry(entry_file, entry)
+            return self.__read_body(entry_file)
+
+        response.raise_for_status()
+        metrics.increment('mcresolver_cache_requests_total', cache='http', result='miss')
+
+        cache_control = _parse_cache_control(response.headers.get('Cache-Control', ''))
+        if 'no-store' in cache_control:
+            self.__remove(entry_file)
+        else:
+            self.__write_body(entry_file, response.content)
+            self.__write_entry(entry_file, {'url': url, 'stored': time.time(), 'headers': _cache_headers(response)})
+
+        return response.content
+
+    def __is_fresh(self, entry):
+        headers = entry['headers']
+        cache_control = _parse_cache_control(headers.get('cache-control', ''))
+        if 'no-cache' in cache_control:
+            return False
+
+        age = time.time() - entry['stored'] + _to_seconds(headers.get('age'))
+        if 'max-age' in cache_control:
+            return age < _to_seconds(cache_control['max-age'])
+
+        date = _parse_http_date(headers.get('date')) or entry['stored']
+        expires = _parse_http_date(headers.get('expires'))
+        if expires is not None:
+            return age < expires - date
+
+        last_modified = _parse_http_date(headers.get('last-modified'))
+        if last_modified is not None:
+            return age < min((date - last_modified) / 10, MAX_HEURISTIC_FRESHNESS)
+
+        return False
+
+    def __read_entry(self, entry_file):
+        if not os.path.exists("%s.json" % entry_file) or not os.path.exists("%s.body" % entry_file):
+            return None
+
+        try:
+            with open("%s.json" % entry_file, 'r') as entry_data:
+                return json.load(entry_data)
+        except (ValueError, OSError):
+            return None
+
+    def __write_entry(self, entry_file, entry):
+        temp_file = "%s.json.%s.tmp" % (entry_file, threading.get_ident())
+        with open(temp_file, 'w') as entry_data:
+            json.dump(entry, entry_data)
+        os.replace(temp_file, "%s.json" % entry_file)
+
+    def __read_body(self, entry_file):
+        with open("%s.body" % entry_file, 'rb') as body_data:
+            return body_data.read()
+
+    def __write_body(self, entry_file, body):
+        temp_file = "%s.body.%s.tmp" % (entry_file, threading.get_ident())
+        with open(temp_file, 'wb') as body_data:
+            body_data.write(body)
+        os.replace(temp_file, "%s.body" % entry_file)
+
+    def __remove(self, entry_file):
+        for file in ("%s.json" % entry_file, "%s.body" % entry_file):
+            if os.path.exists(file):
+                os.remove(file)
+
+
+__http_cache = None
+
+
+def fetch_text(url):
+    """
+    Retrieve the text behind url, through the shared session and HTTP cache (~/.mcresolver/http-cache)
+    """
+    global __http_cache
+
+    with __session_lock:
+        if __http_cache is None:
+            __http_cache = HttpCache(HTTP_CACHE_FOLDER)
+
+    with tracing.span("fetch %s" % os.path.basename(urlsplit(url).path), 'fetch', url=url):
+        return __http_cache.get(url).decode('utf-8')
+
+
+def _record_response(response, *args, **kwargs):
+    # Response hook of the shared session; Counts every request (redirects included) and its latency, by host,
+    # and traces it.
+    host = urlsplit(response.url).netloc
+    elapsed = response.elapsed.total_seconds()
+    metrics = get_metrics()
+    metrics.increment('mcresolver_http_requests_total', host=host, status=response.status_code)
+    metrics.observe('mcresolver_http_request_duration_seconds', elapsed, host=host)
+    tracing.complete("%s %s" % (response.request.method, host), 'http', time.time() - elapsed, elapsed,
+                     url=response.url, status=response.status_code)
+    return response
+
+
+def _cache_headers(response):
+    return dict((name.lower(), response.headers[name]) for name in CACHE_HEADERS if name in response.headers)
+
+
+def _parse_cache_control(value):
+    directives = {}
+    for directive in value.split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def _parse_http_date(value):
+    if not value:
+        return None
+
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from mcresolver import tracing
+from mcresolver.metrics import plugin_scope
+
+
+class Task(object):
+    """
+    A step of a plugin (resolving it, downloading it, fetching what configures it, configuring it) run by
+    a PipelineExecutor once every task it depends on is done.
+
+    host is the host the task talks to (tasks sharing a host share its concurrency limit), or None for local work;
+    It can be a callable, when it's only known once the dependencies are done (Ex: the host a plugin downloads from).
+    weight is what the task is expected to transfer (in bytes); Tasks leading to the heaviest work are started first.
+    Like host, it can be a callable evaluated once the task is ready (Ex: the size of a download found on resolving).
+    after are tasks it waits for without depending on them: It still runs when one of those failed.
+    """
+
+    def __init__(self, name, stage, function, dependencies=(), host=None, weight=0, plugin=None, after=()):
+        self.name = name
+        self.stage = stage
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.after = list(after)
+        self.host = host
+        self.weight = weight
+        self.plugin = plugin
+        self.priority = 0 if callable(weight) else weight
+        # Filled in once the task has finished.
+        self.result = None
+        self.error = None
+        self.skipped = False
+        self.started = None
+        self.finished = None
+        self.worker = None
+
+    @property
+    def failed(self):
+        return self.error is not None or self.skipped
+
+    @property
+    def waits_on(self):
+        """
+        Every task this task waits for; Those it depends on, and those it only runs after.
+        """
+        return self.dependencies + self.after
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0
+        return self.finished - self.started
+
+    @property
+    def waited(self):
+        """
+        Time between the task's dependencies being done and the task starting (Ex: waiting on a worker or host)
+        """
+        if self.started is None:
+            return 0
+        ready = max([task.finished for task in self.waits_on if task.finished is not None] or [self.started])
+        return max(0, self.started - ready)
+
+    def run(self):
+        self.worker = threading.current_thread().name
+        with plugin_scope(self.plugin), tracing.span(self.name, 'task', stage=self.stage) as span:
+            self.started = time.time()
+            try:
+                self.result = self.function()
+            except Exception as e:
+                self.error = e
+            self.finished = time.time()
+            span.set(waited=self.waited, error=None if self.error is None else str(self.error))
+        return self
+
+
+class PipelineExecutor(object):
+    """
+    Runs a graph of tasks, starting every task as soon as the tasks it depends on are done; So the stages of
+    different plugins overlap (one plugin renders while others are still downloading).
+
+    At most max_workers network tasks run at once (per_host against any single host), next to local_workers
+    local tasks. Of the tasks ready to run, the one heading the heaviest chain of work goes first.
+    """
+
+    def __init__(self, max_workers=8, per_host=4, local_workers=None, on_complete=None):
+        self.max_workers = max(1, int(max_workers))
+        self.per_host = max(1, int(per_host))
+        self.local_workers = max(1, int(local_workers or os.cpu_count() or 1))
+        # Called (on the thread running the executor) with every task once it's done.
+        self.on_complete = on_complete
+
+    def run(self, tasks):
+        """
+        Run every task; A task whose dependency failed is skipped.
+        :return: The tasks, in the order they were passed, with their results filled in.
+        """
+        tasks = list(tasks)
+        dependents = defaultdict(list)
+        remaining = {}
+        for task in tasks:
+            remaining[task] = len(task.waits_on)
+            for dependency in task.waits_on:
+                dependents[dependency].append(task)
+
+        assign_priorities(tasks, dependents)
+
+        order = itertools.count()
+        ready = []
+        running = {}
+        host_load = defaultdict(int)
+        load = {'network': 0, 'local': 0}
+
+        def make_ready(task):
+            if callable(task.weight):
+                # Only known now; Its dependencies are done, so only its place among the ready tasks changes.
+                task.weight = task.weight()
+                task.priority += task.weight
+            heapq.heappush(ready, (-task.priority, next(order), task))
+
+        def complete(task):
+            if self.on_complete is not None:
+                self.on_complete(task)
+
+            for dependent in dependents[task]:
+                remaining[dependent] -= 1
+                if remaining[dependent] > 0:
+                    continue
+
+                failed = [dependency for dependency in dependent.dependencies if dependency.failed]
+                if len(failed) > 0:
+                    dependent.skipped = True
+                    dependent.error = "Skipped; %s failed" % failed[0].name
+                    dependent.started = dependent.finished = time.time()
+                    complete(dependent)
+                else:
+                    make_ready(dependent)
+
+        for task in tasks:
+            if remaining[task] == 0:
+                make_ready(task)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers + self.local_workers) as pool:
+            while len(ready) > 0 or len(running) > 0:
+                deferred = []
+                while len(ready) > 0:
+                    entry = heapq.heappop(ready)
+                    task = entry[2]
+                    if callable(task.host):
+                        task.host = task.host()
+
+                    kind = 'local' if task.host is None else 'network'
+                    limit = self.local_workers if kind == 'local' else self.max_workers
+                    if load[kind] >= limit or (task.host is not None and host_load[task.host] >= self.per_host):
+                        deferred.append(entry)
+                        continue
+
+                    load[kind] += 1
+                    if task.host is not None:
+                        host_load[task.host] += 1
+                    running[pool.submit(task.run)] = (task, kind)
+
+                for entry in deferred:
+                    heapq.heappush(ready, entry)
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, kind = running.pop(future)
+                    load[kind] -= 1
+                    if task.host is not None:
+                        host_load[task.host] -= 1
+                    complete(task)
+
+        return tasks
+
+
+def assign_priorities(tasks, dependents):
+    """
+    Give every task the weight of the heaviest chain of tasks it starts (its own weight included).
+    """
+    remaining = dict((task, len(dependents[task])) for task in tasks)
+    pending = [task for task in tasks if remaining[task] == 0]
+    visited = 0
+    while len(pending) > 0:
+        task = pending.pop()
+        visited += 1
+        weight = 0 if callable(task.weight) else task.weight
+        task.priority = weight + max([dependent.priority for dependent in dependents[task]] or [0])
+        for dependency in task.waits_on:
+            remaining[dependency] -= 1
+            if remaining[dependency] == 0:
+                pending.append(dependency)
+
+    if visited != len(tasks):
+        raise ValueError("The tasks depend on each other in a cycle")
+
+
+def critical_path(tasks):
+    """
+    The chain of tasks that determined how long the run took: Starting from the task that finished last,
+    following the dependency that finished last (the one it was waiting on) back to the first task.
+    :return: List of the tasks on the critical path, in the order they ran.
+    """
+    finished = [task for task in tasks if task.finished is not None]
+    if len(finished) == 0:
+        return []
+
+    path = [max(finished, key=lambda task: task.finished)]
+    while len(path[0].waits_on) > 0:
+        path.insert(0, max(path[0].waits_on, key=lambda task: task.finished or 0))
+    return path
+
+
+def stage_times(tasks):
+    """
+    :return: Dictionary indexed by stage (in the order they first appear) holding its number of tasks, how many
+    of them failed, and how long its tasks ran for altogether ('busy', in seconds).
+    """
+    stages = OrderedDict()
+    for task in tasks:
+        stage = stages.setdefault(task.stage, {'tasks': 0, 'failed': 0, 'busy': 0})
+        stage['tasks'] += 1
+        stage['failed'] += 1 if task.failed else 0
+        stage['busy'] += task.elapsed
+    return stages
+
+
+def print_pipeline_summary(tasks, elapsed):
+    stages = stage_times(tasks)
+    print("\nPipeline summary (%s tasks in %.2fs)" % (len(tasks), elapsed))
+    for name, stage in stages.items():
+        print("  %-10s %4s tasks %4s failed  %8.2fs busy" % (name, stage['tasks'], stage['failed'], stage['busy']))
+
+    path = critical_path(tasks)
+    if len(path) > 0:
+        print("Critical path (%.2fs):" % (path[-1].finished - path[0].started))
+        for task in path:
+            print("  %-40s %7.2fs%s" % (task.name, task.elapsed,
+                                        "" if task.waited < 0.01 else "  (waited %.2fs to start)" % task.waited))
@@ -0,0 +1,107 @@
+import multiprocessing
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class HostLimitedPool(object):
+    """
+    Thread pool used to fan network bound work (metadata lookups, downloads) out over a
+    bounded set of workers, while capping how many requests are in flight against any one host.
+
+    Jobs are submitted with the host they're going to talk to; Once a host has per_host jobs running, further
+    jobs for it wait in a queue of their own (instead of on a worker) so a slow API can't hog every worker in the pool.
+    """
+
+    def __init__(self, max_workers=8, per_host=4):
+        self.max_workers = max(1, int(max_workers))
+        self.per_host = max(1, int(per_host))
+        self.__executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.__lock = threading.Lock()
+        self.__idle = threading.Condition(self.__lock)
+        self.__running = defaultdict(int)
+        self.__queued = defaultdict(deque)
+        self.__pending = 0
+
+    def submit(self, host, func, *args, **kwargs):
+        """
+        Schedule func(*args, **kwargs) to run on the pool, limited by the concurrency allowed for host.
+        :param host: Host (or any key) the job talks to; jobs sharing a host share its concurrency limit.
+        :return: concurrent.futures.Future for the job.
+        """
+        future = Future()
+        job = (future, func, args, kwargs)
+
+        with self.__lock:
+            self.__pending += 1
+            if self.__running[host] >= self.per_host:
+                self.__queued[host].append(job)
+                return future
+            self.__running[host] += 1
+
+        self.__start(host, job)
+        return future
+
+    def __start(self, host, job):
+        self.__executor.submit(self.__run, host, *job)
+
+    def __run(self, host, future, func, args, kwargs):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            self.__finished(host)
+
+    def __finished(self, host):
+        """
+        Hand the slot of a job that finished to the next job queued for its host (if any).
+        """
+        with self.__lock:
+            self.__pending -= 1
+            queued = self.__queued[host]
+            job = queued.popleft() if queued else None
+            if job is None:
+                self.__running[host] -= 1
+            if not self.__pending:
+                self.__idle.notify_all()
+
+        if job is not None:
+            self.__start(host, job)
+
+    def shutdown(self, wait=True):
+        """
+        :param wait: Wait for every job submitted to finish; Otherwise jobs still queued for their host are cancelled.
+        """
+        with self.__lock:
+            if wait:
+                while self.__pending:
+                    self.__idle.wait()
+            else:
+                for queued in self.__queued.values():
+                    while queued:
+                        queued.popleft()[0].cancel()
+                        self.__pending -= 1
+
+        self.__executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.shutdown(wait=True)
+
+
+def worker_process_pool(processes):
+    """
+    A pool of processes to run jobs on (Ex: configuring plugins, generating templates), safe to create while other
+    threads are running: Its workers are started by a fork server (or spawned) rather than forked from this process,
+    so they can't inherit a lock (metrics, tracing, output) that another thread was holding at that moment.
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context)
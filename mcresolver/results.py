@@ -0,0 +1,115 @@
+class ResolveResult(object):
+    """
+    The plugins of a requirements file resolved by MinecraftPluginResolver.resolve, and those that couldn't be.
+    """
+
+    def __init__(self, requirements_file, output_folder, bukkit_resources, spigot_resources, errors, elapsed):
+        self.requirements_file = requirements_file
+        self.output_folder = output_folder
+        self.bukkit_resources = bukkit_resources
+        self.spigot_resources = spigot_resources
+        # Dictionaries holding the source, plugin and error of every plugin that couldn't be resolved.
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def plugins(self):
+        return list(self.bukkit_resources.values()) + list(self.spigot_resources.values())
+
+    def to_dict(self):
+        plugins = []
+        for source, resources in (('Bukkit', self.bukkit_resources), ('Spigot', self.spigot_resources)):
+            for plugin, data in resources.items():
+                plugins.append({
+                    'source': source,
+                    'plugin': plugin,
+                    'name': data['name'],
+                    'requested-version': data['requested-version'],
+                    'version': data['version'],
+                    'resolved-version': data.get('resolved-version'),
+                    'download-url': data.get('download-url'),
+                    'file-name': data.get('file-name'),
+                    'configure': data['configure'],
+                })
+
+        return {
+            'requirements': self.requirements_file,
+            'output-folder': self.output_folder,
+            'plugins': plugins,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+        }
+
+
+class DownloadResult(object):
+    """
+    The plugin files put in place by MinecraftPluginResolver.download; One DownloadJob per plugin.
+    """
+
+    def __init__(self, jobs, elapsed):
+        self.jobs = jobs
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return [job for job in self.jobs if job.error is not None]
+
+    def to_dict(self):
+        return {
+            'files': [{
+                'name': job.name,
+                'file': job.file_name,
+                'size': job.size,
+                'sha256': job.sha256,
+                'cached': job.cached,
+                'unchanged': job.unchanged,
+                'elapsed': job.elapsed,
+                'error': None if job.error is None else str(job.error),
+            } for job in self.jobs],
+            'elapsed': self.elapsed,
+        }
+
+
+class ConfigureResult(object):
+    """
+    The plugins configured by MinecraftPluginResolver.configure; One ConfigureJob per plugin.
+    """
+
+    def __init__(self, jobs, elapsed):
+        self.jobs = jobs
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return [job for job in self.jobs if not job.configured]
+
+    def to_dict(self):
+        return {
+            'plugins': [{
+                'name': job.name,
+                'version': job.version,
+                'configured': job.configured,
+                'error': job.error,
+                'output': job.output,
+                'elapsed': job.elapsed,
+            } for job in self.jobs],
+            'elapsed': self.elapsed,
+        }
+
+
+class RunResult(object):
+    """
+    Result of every step of MinecraftPluginResolver.run.
+    """
+
+    def __init__(self, resolution, downloads, configuration):
+        self.resolution = resolution
+        self.downloads = downloads
+        self.configuration = configuration
+
+    def to_dict(self):
+        return {
+            'resolve': self.resolution.to_dict(),
+            'download': self.downloads.to_dict(),
+            'configure': self.configuration.to_dict(),
+        }
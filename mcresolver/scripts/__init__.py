@@ -1,32 +1,151 @@
 from collections import OrderedDict
-import yaml
+from collections.abc import Mapping
+from types import MappingProxyType
+from mcresolver import tracing, yamlio
+from mcresolver._version import __version__
 from mcresolver.utils import is_url, filename_from_url
+from mcresolver.files import write_file, write_stream, sync_written_files, file_sha256
+from mcresolver.metrics import get_metrics
+from mcresolver.network import fetch_text
 
 from bukget import BukkitResource
 from spiget import SpigotResource
 from importlib.util import spec_from_file_location
-from jinja2 import Environment
+from jinja2 import Environment, BaseLoader, FileSystemBytecodeCache, TemplateNotFound
 
+import ast
 import fnmatch
+import hashlib
+import json
 import os
-import requests
+import pickle
+import threading
+import time
 
 # from yamlbro
 
 __dirname, __init_python_script = os.path.split(os.path.abspath(__file__))
 
+# Name of the file (inside a scripts folder) caching the metadata of its configuration scripts.
+SCRIPT_INDEX_FILE = ".mcresolver-index.json"
+
+# Compiled templates kept in memory, and where their bytecode is cached on disk between runs.
+TEMPLATE_CACHE_SIZE = 256
+TEMPLATE_BYTECODE_FOLDER = os.path.expanduser("~/.mcresolver/template-bytecode")
+
+
+class TemplateSourceLoader(BaseLoader):
+    """
+    Jinja2 loader serving template sources by the SHA-256 of their content.
+
+    Loading templates by their content hash (rather than Environment.from_string) lets the environment
+    keep the compiled templates in its LRU cache, and its bytecode cache persist them across runs.
+    """
+
+    def __init__(self, max_sources=TEMPLATE_CACHE_SIZE * 4):
+        self.max_sources = max_sources
+        self.__sources = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def register(self, source):
+        """
+        Make source available to the loader.
+        :return: Name of the template to retrieve it by.
+        """
+        name = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        with self.__lock:
+            self.__sources[name] = source
+            self.__sources.move_to_end(name)
+            while len(self.__sources) > self.max_sources:
+                self.__sources.popitem(last=False)
+        return name
+
+    def load(self, environment, name, globals=None):
+        # Only called for templates missing from the environment's cache; Compiles them (or loads their bytecode).
+        with tracing.span("compile template", 'template', template=name[:12]):
+            return BaseLoader.load(self, environment, name, globals)
+
+    def get_source(self, environment, template):
+        with self.__lock:
+            if template not in self.__sources:
+                raise TemplateNotFound(template)
+            # Sources are immutable (named by their content) so they're always up to date.
+            return self.__sources[template], None, lambda: True
+
+
+# Suffix of the file (next to each rendered configuration) holding the fingerprint of its last render.
+FINGERPRINT_SUFFIX = ".fingerprint"
+
+# Parsed configuration defaults, by the hash of their content.
+DEFAULTS_CACHE_FOLDER = os.path.expanduser("~/.mcresolver/defaults")
+__defaults_cache = {}
+__defaults_cache_lock = threading.Lock()
+
+# Configuration scripts imported so far, by their location; Alongside the modification time & size they had.
+__script_modules = {}
+__script_modules_lock = threading.Lock()
+
+# Guards rebuilding (and saving) the script index; Configuration jobs running on threads read it concurrently.
+__script_index_lock = threading.Lock()
+
+__template_loader = TemplateSourceLoader()
+__template_environment = None
+__template_environment_lock = threading.Lock()
+
+
+def get_template_environment():
+    """
+    The Jinja2 environment shared by every render; Created on first use.
+    """
+    global __template_environment
+
+    with __template_environment_lock:
+        if __template_environment is None:
+            if not os.path.exists(TEMPLATE_BYTECODE_FOLDER):
+                os.makedirs(TEMPLATE_BYTECODE_FOLDER, exist_ok=True)
+
+            __template_environment = Environment(loader=__template_loader, cache_size=TEMPLATE_CACHE_SIZE,
+                                                 auto_reload=False,
+                                                 bytecode_cache=FileSystemBytecodeCache(TEMPLATE_BYTECODE_FOLDER))
+        return __template_environment
+
+
+def get_template(source):
+    """
+    Retrieve the compiled Jinja2 template of source. Each distinct source is only parsed and compiled
+    once per process, and its bytecode is reused across runs.
+    """
+    return get_template_environment().get_template(__template_loader.register(source))
+
 
 def get_config_from_url(url):
-    return requests.get(url).text
+    return fetch_text(url)
 
 
 def render_config_from_url(url, variables):
     config_data = get_config_from_url(url)
-    return Environment().from_string(config_data).render(variables)
+    return get_template(config_data).render(variables)
 
 
 def render_config_from_string(config, variables):
-    return Environment().from_string(config).render(variables)
+    return get_template(config).render(variables)
+
+
+def render_config_to_file(config, variables, file):
+    """
+    Render the template config straight into file, chunk by chunk as it's generated, without holding the
+    whole rendered configuration in memory.
+    :return: SHA-256 checksum of the rendered configuration.
+    """
+    return write_stream(file, get_template(config).generate(variables))
+
+
+def render_config_from_url_to_file(url, variables, file):
+    """
+    Render the template behind url straight into file; See render_config_to_file.
+    :return: SHA-256 checksum of the rendered configuration.
+    """
+    return render_config_to_file(get_config_from_url(url), variables, file)
 
 
 def merge_configuration_options(config_options=None, defaults={}):
@@ -56,30 +175,79 @@ def get_configuration_defaults(url=None, file=None):
     Creates a dictionary of the default configuration values to provide when
     a value or option is not specified.
 
-    Can be retrieved via a URL, or read from a file.
+    Can be retrieved via a URL, or read from a file. Parsed defaults are cached (in memory, and on disk)
+    by the hash of their content, so each defaults file is only parsed once; They're handed out read-only
+    so callers can share them without copying.
 
     :param url: URL of the page which contains the raw template defaults (think hosting a text file on a website)
     :param file: File to read the template defaults from.
-    :return: Dictionary indexed by the key (template variable) and the value assigned to that template variable.
+    :return: Read-only mapping indexed by the key (template variable) and the value assigned to that template variable.
     """
 
     if url is None and file is None:
         raise ValueError("You must include either a url to retrieve the defaults from, or a file to read them from")
 
-    defaults = OrderedDict()
     template_default_content = None
     if url is not None:
         template_default_content = get_config_from_url(url)
     elif file is not None:
-        template_default_content = get_config_from_file(file)
+        template_default_content = get_config_from_file(file, trim_newlines=False)
 
     if template_default_content is None:
         raise Exception("Unable to retrieve the configuration defaults from url or file")
 
-    defaults = yaml.load(template_default_content)
+    return parse_configuration_defaults(template_default_content)
+
+
+def parse_configuration_defaults(content):
+    """
+    Parse the contents of a defaults file, using the parsed defaults cached for the same content when available.
+    :return: Read-only mapping of the defaults.
+    """
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    with __defaults_cache_lock:
+        if content_hash in __defaults_cache:
+            return __defaults_cache[content_hash]
+
+    cache_file = os.path.join(DEFAULTS_CACHE_FOLDER, "%s.pickle" % content_hash)
+    defaults = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as cache_data:
+                defaults = pickle.load(cache_data)
+        except Exception:
+            defaults = None
+
+    if defaults is None:
+        defaults = yamlio.load(content) or {}
+        try:
+            if not os.path.exists(DEFAULTS_CACHE_FOLDER):
+                os.makedirs(DEFAULTS_CACHE_FOLDER, exist_ok=True)
+            temp_file = "%s.%s.tmp" % (cache_file, threading.get_ident())
+            with open(temp_file, 'wb') as cache_data:
+                pickle.dump(defaults, cache_data)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            print("Unable to cache configuration defaults: %s" % e)
+
+    defaults = freeze(defaults)
+    with __defaults_cache_lock:
+        __defaults_cache[content_hash] = defaults
     return defaults
 
 
+def freeze(value):
+    """
+    Read-only copy of parsed yaml data; Mappings become read-only mappings, and lists become tuples.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType(OrderedDict((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
 def configure_plugin(resource, version, parent_folder, defaults_file=None, template_file=None, config_options=None,
                      script=None, script_folder=None, **kwargs):
     resource_name = resource.plugin_name if isinstance(resource, BukkitResource) else resource.name
@@ -102,7 +270,13 @@ def configure_plugin(resource, version, parent_folder, defaults_file=None, templ
         if configure_method is None:
             raise AttributeError("Unable to find 'configure' method in configuration script")
 
-        configure_method(parent_folder, config_options=config_options, **kwargs)
+        started = time.time()
+        with tracing.span("script %s" % resource_name, 'script',
+                          script=getattr(configuration_script, '__file__', None)):
+            configure_method(parent_folder, config_options=config_options, **kwargs)
+        elapsed = time.time() - started
+        get_metrics().observe('mcresolver_script_duration_seconds', elapsed)
+        get_metrics().record_plugin(script_seconds=elapsed)
         return True
 
     if defaults_file is None or template_file is None:
@@ -135,22 +309,84 @@ def configure_plugin(resource, version, parent_folder, defaults_file=None, templ
     # todo implement config file name in options.
     config_file = os.path.join(plugin_folder, 'config.yml')
 
-    # Render the configuration of the url, with the options (and defaults included)
     if is_url(template_file):
-        plugin_config = render_config_from_url(template_file, options)
+        template = get_config_from_url(template_file)
     else:
         if not os.path.exists(template_file):
             print("Unable to locate template file for %s %s" % (resource_name, defaults_file))
             return False
-        plugin_config = render_config_from_string(get_config_from_file(template_file), options)
-
+        template = get_config_from_file(template_file, trim_newlines=False)
+
+    # Nothing to do when the configuration was already rendered from the same template & options.
+    metrics = get_metrics()
+    fingerprint = render_fingerprint(template, options)
+    if is_rendered(config_file, fingerprint):
+        metrics.increment('mcresolver_cache_requests_total', cache='render', result='hit')
+        print("Configuration for {plugin} ({version}) is up to date".format(plugin=resource_name, version=version))
+        return True
 
-    # Lastly write the configuration to the file specified!
-    write_file(config_file, plugin_config)
-    print("Configuration for {plugin} ({version}) has been rendered!".format(resource_name, version))
+    # Render the configuration of the template, with the options (and defaults included), to the file specified!
+    metrics.increment('mcresolver_cache_requests_total', cache='render', result='miss')
+    started = time.time()
+    with tracing.span("render %s" % resource_name, 'render', file=config_file):
+        config_sha256 = render_config_to_file(template, options, config_file)
+    elapsed = time.time() - started
+    metrics.observe('mcresolver_render_duration_seconds', elapsed)
+    metrics.record_plugin(render_seconds=elapsed)
+    write_render_fingerprint(config_file, fingerprint, config_sha256)
+    print("Configuration for {plugin} ({version}) has been rendered!".format(plugin=resource_name, version=version))
     return True
 
 
+def render_fingerprint(template, options):
+    """
+    Fingerprint of a render; The hash of the template, the options it's rendered with and the version of mcresolver.
+    """
+    template_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()
+    options_hash = hashlib.sha256(__canonical(options).encode('utf-8')).hexdigest()
+    return hashlib.sha256(("%s:%s:%s" % (template_hash, options_hash, __version__)).encode('utf-8')).hexdigest()
+
+
+def __canonical(value):
+    # Representation of (parsed yaml) options that's independent of the order of their keys.
+    if isinstance(value, Mapping):
+        return "{%s}" % ",".join(sorted("%s:%s" % (__canonical(key), __canonical(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ",".join(__canonical(item) for item in value)
+    return repr(value)
+
+
+def fingerprint_path(file):
+    folder, name = os.path.split(file)
+    return os.path.join(folder, ".%s%s" % (name, FINGERPRINT_SUFFIX))
+
+
+def is_rendered(file, fingerprint):
+    """
+    Check whether file was rendered with the given fingerprint, and hasn't been changed since.
+    """
+    if not os.path.exists(file) or not os.path.exists(fingerprint_path(file)):
+        return False
+
+    try:
+        with open(fingerprint_path(file), 'r') as fingerprint_data:
+            rendered = json.load(fingerprint_data)
+    except (ValueError, OSError):
+        return False
+
+    if rendered.get('fingerprint') != fingerprint:
+        return False
+
+    return file_sha256(file) == rendered.get('sha256')
+
+
+def write_render_fingerprint(file, fingerprint, sha256):
+    """
+    Store the fingerprint of the render that produced file (with the given checksum) next to it.
+    """
+    write_file(fingerprint_path(file), json.dumps({'fingerprint': fingerprint, 'sha256': sha256}))
+
+
 def get_config_from_file(file, trim_newlines=True):
     with open(file, 'r') as config_file:
         data = config_file.read()
@@ -159,19 +395,12 @@ def get_config_from_file(file, trim_newlines=True):
         return data
 
 
-def write_file(file, data):
-    with open(file, 'w') as data_file:
-        data_file.write(data)
-
-
 def save_plugin_config_script(script_folder, script_url):
-    import requests
-
     if not os.path.exists(script_folder):
         os.makedirs(script_folder)
 
     script_name = filename_from_url(script_url)
-    script_data = requests.get(script_url).text
+    script_data = fetch_text(script_url)
 
     script_loc = os.path.join(script_folder, script_name)
 
@@ -248,28 +477,42 @@ def __is_valid_configuration_script(script_location, resource, version):
     if plugin_identifier.lower() != config_plugin_id.lower():
         return False, None
 
-    # Version checking in a list, that way a config script can support multiple versions
-    found_version = False
-
-    if "all" in config_plugin_versions:
-        found_version = True
-
-    if found_version is False:
-        for usable_version in config_plugin_versions:
-            if version.lower() in usable_version.lower():
-                found_version = True
-                break
-
-    if found_version:
+    if __supports_version(config_plugin_versions, version):
         return True, config_module
     else:
         return False, None
 
 
+def __supports_version(plugin_versions, version):
+    # Version checking in a list, that way a config script can support multiple versions
+    if "all" in plugin_versions:
+        return True
+
+    for usable_version in plugin_versions:
+        if version.lower() in usable_version.lower():
+            return True
+
+    return False
+
+
 def __get_configuring_script(scripts_folder, resource, version):
-    config_script_names = __get_files_recursive(scripts_folder, "*.py")
+    """
+    Find the script (inside scripts_folder) that configures the resource at the given version.
+
+    Scripts are matched through the index of their metadata, so only the matching script is imported;
+    Scripts whose metadata couldn't be read statically are imported to check them instead.
+    """
+    plugin_identifier = str(__get_plugin_identifier(resource)).lower()
+    script_index = get_script_index(scripts_folder)
+
+    for config_script, metadata in script_index.items():
+        if metadata is False:
+            continue
+
+        if metadata is not None and (metadata['plugin-id'].lower() != plugin_identifier or
+                                     not __supports_version(metadata['plugin-versions'], version)):
+            continue
 
-    for config_script in config_script_names:
         config_module = __load_configuring_script(config_script, resource, version)
         if config_module is not None:
             return config_module
@@ -277,6 +520,126 @@ def __get_configuring_script(scripts_folder, resource, version):
     return None
 
 
+def get_script_index(scripts_folder):
+    """
+    Index the metadata (_plugin_id_ & _plugin_versions_) of every configuration script inside scripts_folder,
+    without executing any of them.
+
+    The index is cached inside the scripts folder, and a script is only parsed again once its
+    modification time or size changes.
+    :return: Dictionary indexed by the location of each script, holding its metadata; Or None for scripts
+    whose metadata can't be determined without executing them.
+    """
+    with __script_index_lock:
+        index_file = os.path.join(scripts_folder, SCRIPT_INDEX_FILE)
+        cached_index = {}
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r') as index_data:
+                    cached_index = json.load(index_data)
+            except (ValueError, OSError):
+                cached_index = {}
+
+        script_index = OrderedDict()
+        updated = False
+        for config_script in __get_files_recursive(scripts_folder, "*.py"):
+            if "__init__" in config_script:
+                continue
+
+            stat = os.stat(config_script)
+            cached = cached_index.get(config_script)
+            if cached is not None and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+                script_index[config_script] = cached['metadata']
+                continue
+
+            metadata = read_script_metadata(config_script)
+            cached_index[config_script] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'metadata': metadata}
+            script_index[config_script] = metadata
+            updated = True
+
+        if updated or len(cached_index) != len(script_index):
+            try:
+                # Replaced atomically, so processes reading it concurrently never see it half written.
+                write_file(index_file, json.dumps(dict((script, cached_index[script]) for script in script_index)))
+            except OSError as e:
+                print("Unable to save the script index %s: %s" % (index_file, e))
+
+        return script_index
+
+
+def read_script_metadata(script_location):
+    """
+    Statically read (by parsing, not executing it) the metadata of a configuration script.
+    :return: Dictionary with the 'plugin-id' and 'plugin-versions' of the script. None if they aren't literal
+    assignments that can be read without executing the script, and False if it isn't a configuration script at all.
+    """
+    try:
+        with open(script_location, 'r') as script_data:
+            tree = ast.parse(script_data.read(), filename=script_location)
+    except (SyntaxError, ValueError, OSError):
+        return False
+
+    metadata = {}
+    has_configure = False
+    for node in tree.body:
+        if 'configure' in __bound_names(node):
+            has_configure = True
+
+        if not isinstance(node, ast.Assign):
+            continue
+
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id in ('_plugin_id_', '_plugin_versions_'):
+                try:
+                    metadata[target.id] = ast.literal_eval(node.value)
+                except Exception:
+                    # Not a literal (or one too large / deeply nested to evaluate); Requires executing the script.
+                    return None
+
+    if not has_configure or '_plugin_id_' not in metadata or '_plugin_versions_' not in metadata:
+        # Anything defined dynamically (Ex: star imports, conditional definitions) requires executing the script.
+        return None if __has_dynamic_definitions(tree) else False
+
+    if metadata['_plugin_id_'] is None or metadata['_plugin_versions_'] is None:
+        return False
+
+    return {
+        'plugin-id': str(metadata['_plugin_id_']),
+        'plugin-versions': [str(version) for version in metadata['_plugin_versions_']],
+    }
+
+
+def __bound_names(node):
+    """
+    :return: Names bound by a top-level statement of a script (definitions, assignments & imports)
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {node.name}
+
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return set((alias.asname or alias.name).split('.', 1)[0] for alias in node.names)
+
+    targets = []
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+        targets = [node.target]
+
+    return set(name.id for target in targets for name in ast.walk(target) if isinstance(name, ast.Name))
+
+
+def __has_dynamic_definitions(tree):
+    for node in tree.body:
+        if isinstance(node, (ast.If, ast.Try, ast.For, ast.While, ast.With)):
+            return True
+        if isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names):
+            return True
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and \
+                __bound_names(node) & {'_plugin_id_', '_plugin_versions_'}:
+            return True
+    return False
+
+
 def __get_files_recursive(path, match='*.py'):
     matches = []
     for root, dirnames, filenames in os.walk(path):
@@ -290,20 +653,31 @@ def __import_module_from_file(full_path_to_module):
     """
     Import a module given the full path/filename of the .py file
     Python 3.4
+
+    Imported scripts are kept in memory, and only imported again once the file changes.
     """
 
     module = None
 
     try:
+        stat = os.stat(full_path_to_module)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with __script_modules_lock:
+            cached = __script_modules.get(full_path_to_module)
+        if cached is not None and cached[0] == version:
+            module = cached[1]
+        else:
+            # Get module name and path from full path
+            module_dir, module_file = os.path.split(full_path_to_module)
+            module_name, module_ext = os.path.splitext(module_file)
 
-        # Get module name and path from full path
-        module_dir, module_file = os.path.split(full_path_to_module)
-        module_name, module_ext = os.path.splitext(module_file)
-
-        # Get module "spec" from filename
-        spec = spec_from_file_location(module_name, full_path_to_module)
+            # Get module "spec" from filename
+            spec = spec_from_file_location(module_name, full_path_to_module)
 
-        module = spec.loader.load_module()
+            with tracing.span("import %s" % module_name, 'script', file=full_path_to_module):
+                module = spec.loader.load_module()
+            with __script_modules_lock:
+                __script_modules[full_path_to_module] = (version, module)
 
     except Exception as ec:
         # Simple error printing
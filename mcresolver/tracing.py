@@ -0,0 +1,215 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from mcresolver.metrics import current_plugin
+
+# The tracer spans are recorded by; None while tracing is disabled.
+__tracer = None
+__tracer_lock = threading.Lock()
+
+
+class Span(object):
+    """
+    A span of work being traced; Recorded (as a complete trace event) once its block exits.
+    """
+    __slots__ = ('tracer', 'name', 'category', 'args', 'started')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started = None
+
+    def set(self, **args):
+        """
+        Attach more arguments to the span (Ex: the size of a download, once it's known).
+        """
+        self.args.update(args)
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args['error'] = "%s: %s" % (exc_type.__name__, exc_value)
+        self.tracer.complete(self.name, self.category, self.started, time.time() - self.started, **self.args)
+        return False
+
+
+class NullSpan(object):
+    """
+    Stand-in for Span while tracing is disabled; Does nothing, and is shared by every untraced block.
+    """
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer(object):
+    """
+    Collects spans as Chrome trace events (the Trace Event Format, as opened by chrome://tracing and Perfetto);
+    One row per worker thread (and process), each span tagged with the plugin it was recorded for.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.threads = {}
+        self.__lock = threading.Lock()
+
+    def span(self, name, category, **args):
+        plugin = current_plugin()
+        if plugin is not None:
+            args.setdefault('plugin', str(plugin))
+        return Span(self, name, category, args)
+
+    def complete(self, name, category, started, duration, **args):
+        """
+        Record a span that started (time.time()) and lasted duration seconds.
+        """
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': started * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.native_id,
+            'args': args,
+        }
+        with self.__lock:
+            self.events.append(event)
+            self.threads[(event['pid'], event['tid'])] = thread.name
+
+    def recorded(self):
+        """
+        :return: Tuple of the events recorded, and the names of the threads they were recorded on.
+        """
+        with self.__lock:
+            return list(self.events), dict(self.threads)
+
+    def add_recorded(self, recorded):
+        """
+        Add what another tracer recorded (Ex: on a worker process); See recorded.
+        """
+        events, threads = recorded
+        with self.__lock:
+            self.events.extend(events)
+            self.threads.update(threads)
+
+    def to_dict(self):
+        events, threads = self.recorded()
+        for (pid, tid), name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for pid in set(event['pid'] for event in events):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                           'args': {'name': 'mcresolver' if pid == os.getpid() else 'mcresolver worker %s' % pid}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def start_tracing():
+    """
+    Start recording spans, discarding any recorded before.
+    :return: The tracer recording them.
+    """
+    global __tracer
+
+    with __tracer_lock:
+        __tracer = Tracer()
+        return __tracer
+
+
+def stop_tracing():
+    """
+    Stop recording spans.
+    :return: The tracer that was recording them (None if tracing wasn't enabled)
+    """
+    global __tracer
+
+    with __tracer_lock:
+        tracer, __tracer = __tracer, None
+        return tracer
+
+
+def get_tracer():
+    return __tracer
+
+
+def span(name, category, **args):
+    """
+    Trace the block ran inside the returned context manager as a span; Tagged with the plugin of the current
+    plugin_scope (if any) and the worker it ran on. Costs a single lookup while tracing is disabled.
+    """
+    tracer = __tracer
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, category, **args)
+
+
+def complete(name, category, started, duration, **args):
+    """
+    Record a span that already finished; See Tracer.complete.
+    """
+    tracer = __tracer
+    if tracer is not None:
+        plugin = current_plugin()
+        if plugin is not None:
+            args.setdefault('plugin', str(plugin))
+        tracer.complete(name, category, started, duration, **args)
+
+
+@contextlib.contextmanager
+def worker_trace(enabled=False):
+    """
+    Record the spans of the block on a tracer of its own (when tracing is enabled); For jobs ran on worker processes,
+    which send what they recorded back along with their results (see add_worker_trace).
+    :param enabled: Whether the process the job came from is tracing; Workers that were spawned (or started by a
+    fork server) don't inherit its tracer, so they can't tell on their own.
+    :return: The tracer the spans are recorded by, or None when tracing is disabled.
+    """
+    global __tracer
+
+    previous = __tracer
+    if previous is None and not enabled:
+        yield None
+        return
+
+    tracer = Tracer()
+    __tracer = tracer
+    try:
+        yield tracer
+    finally:
+        __tracer = previous
+
+
+def add_worker_trace(recorded):
+    """
+    Add the spans recorded on a worker process (by the tracer of worker_trace, see Tracer.recorded) to the trace.
+    """
+    tracer = __tracer
+    if tracer is not None and recorded is not None:
+        tracer.add_recorded(recorded)
+
+
+def write_trace(file, tracer=None):
+    """
+    Write the spans recorded as a Chrome trace-event (JSON) file.
+    """
+    from mcresolver.files import write_file
+
+    write_file(file, json.dumps((tracer or __tracer or Tracer()).to_dict(), default=str))
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+
+import yaml
+from yaml.constructor import SafeConstructor
+from yaml.scanner import ScannerError
+
+# YAML is read & written by libyaml's C parser and emitter when PyYAML was built with them, as they're several times
+# quicker than the pure python ones. Either way, mappings keep the order they're written in (read as OrderedDicts,
+# like yamlbro does) and None is written blank.
+LIBYAML = getattr(yaml, '__with_libyaml__', False)
+
+MAP_TAG = 'tag:yaml.org,2002:map'
+NULL_TAG = 'tag:yaml.org,2002:null'
+
+
+def construct_ordered_mapping(loader, node):
+    mapping = OrderedDict()
+    yield mapping
+    mapping.update(SafeConstructor.construct_mapping(loader, node))
+
+
+def represent_ordered_mapping(dumper, mapping):
+    return dumper.represent_mapping(MAP_TAG, mapping.items())
+
+
+def represent_blank(dumper, data):
+    return dumper.represent_scalar(NULL_TAG, '')
+
+
+class PyLoader(yaml.SafeLoader):
+    """
+    Pure python loader; Like yamlbro's, plain strings may begin with '%'
+    """
+
+    def check_plain(self):
+        return super(PyLoader, self).check_plain() or self.peek() == '%'
+
+
+class PyDumper(yaml.SafeDumper):
+    pass
+
+
+if LIBYAML:
+    class Loader(yaml.CSafeLoader):
+        pass
+
+    class Dumper(yaml.CSafeDumper):
+        pass
+else:
+    Loader = PyLoader
+    Dumper = PyDumper
+
+for loader in {Loader, PyLoader}:
+    loader.add_constructor(MAP_TAG, construct_ordered_mapping)
+    loader.add_constructor('tag:yaml.org,2002:omap', construct_ordered_mapping)
+
+for dumper in {Dumper, PyDumper}:
+    dumper.add_representer(OrderedDict, represent_ordered_mapping)
+    dumper.add_representer(dict, represent_ordered_mapping)
+    dumper.add_representer(type(None), represent_blank)
+
+
+def load(data, loader=None):
+    """
+    Read a YAML document from a string (or stream)
+    :param loader: Loader to read it with; libyaml's when it's available, unless told otherwise.
+    :return: The document, with its mappings as OrderedDicts.
+    """
+    loader = loader or Loader
+    try:
+        return yaml.load(data, Loader=loader)
+    except ScannerError:
+        # libyaml refuses plain strings starting with '%', which the pure python loader accepts.
+        if loader is PyLoader:
+            raise
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        return yaml.load(data, Loader=PyLoader)
+
+
+def load_file(file, loader=None):
+    """
+    Read a YAML document from a file; See load.
+    """
+    with open(file, 'r') as yaml_data:
+        return load(yaml_data.read(), loader=loader)
+
+
+def dump(data, stream=None, **kwargs):
+    """
+    Write data as YAML (to stream, or returned as a string), in block style unless told otherwise.
+    """
+    kwargs.setdefault('Dumper', Dumper)
+    kwargs.setdefault('default_flow_style', False)
+    kwargs.setdefault('sort_keys', False)
+    return yaml.dump(data, stream, **kwargs)
+
+
+def emit(events, stream=None, **kwargs):
+    """
+    Write a stream of YAML events (to stream, or returned as a string)
+    """
+    kwargs.setdefault('Dumper', Dumper)
+    return yaml.emit(events, stream, **kwargs)
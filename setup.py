@@ -1,8 +1,17 @@
+import os
+
 from setuptools import setup
 
+# Read the version without importing the package (and its dependencies); It's also part of the render fingerprint.
+version = {}
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcresolver', '_version.py')) as version_file:
+    exec(version_file.read(), version)
+
+YAMLBRO = 'yamlbro @ https://github.com/TechnicalBro/yaml-bro/archive/0.0.1.zip'
+
 setup(
     name='mcresolver',
-    version='0.1.0',
+    version=version['__version__'],
     packages=[
         'mcresolver',
         'mcresolver.scripts',
@@ -30,7 +39,6 @@ setup(
         'argparse',
         'pyBukGet==1.0.2',
         'PyYaml',
-        'yamlbro==0.0.1',
         'requests',
         'Jinja2==2.8',
     ],
@@ -38,10 +46,15 @@ setup(
         'pytest-runner'
     ],
     tests_require=[
-        'pytest'
+        'pytest',
+        YAMLBRO
     ],
+    # yamlbro is only the reference the YAML output is checked (and benchmarked) against.
+    extras_require={
+        'test': ['pytest', YAMLBRO],
+        'bench': ['invoke', YAMLBRO],
+    },
     dependency_links=[
-        "https://github.com/TechnicalBro/pybukget/archive/1.0.2.zip#egg=pyBukGet-1.0.2",
-        'https://github.com/TechnicalBro/yaml-bro/archive/0.0.1.zip#egg=yamlbro-0.0.1'
+        "https://github.com/TechnicalBro/pybukget/archive/1.0.2.zip#egg=pyBukGet-1.0.2"
     ]
 )
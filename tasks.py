@@ -13,3 +13,14 @@ def test(file=None, test=None, k=None):
             run('py.test -s %s' % file)
         elif file is not None and test is not None:
             run('py.test -s %s::%s' % (file, test))
+
+
+@task
+def bench(name=None):
+    run('python setup.py clean build install')
+    if name is not None:
+        run('python benchmarks/bench_%s.py' % name)
+    else:
+        import glob
+        for benchmark in sorted(glob.glob('benchmarks/bench_*.py')):
+            run('python %s' % benchmark)
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import time
+
+from mcresolver.cache import ArtifactCache, artifact_key
+
+
+def store_file(cache, folder, name, contents):
+    file = folder.join(name)
+    file.write_binary(contents)
+    sha256 = hashlib.sha256(contents).hexdigest()
+    cache.store(artifact_key('spigot', name, '1.0'), str(file), sha256)
+    return sha256
+
+
+def test_store_and_materialize(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    downloads = tmpdir.mkdir('downloads')
+    sha256 = store_file(cache, downloads, 'Essentials.jar', b'essentials jar')
+    cache.save()
+
+    # A fresh instance reads the index persisted by the previous one.
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    assert cache.lookup(key=artifact_key('spigot', 'Essentials.jar', '1.0')) == sha256
+    assert cache.lookup(sha256=sha256) == sha256
+    assert cache.lookup(key=artifact_key('spigot', 'Essentials.jar', '2.0')) is None
+
+    server = tmpdir.mkdir('server')
+    destination = str(server.join('Essentials-1.0.jar'))
+    cache.materialize(sha256, destination)
+
+    with open(destination, 'rb') as materialized:
+        assert materialized.read() == b'essentials jar'
+    assert os.listdir(str(server)) == ['Essentials-1.0.jar']
+
+
+def test_collect_garbage_evicts_least_recently_used(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), max_size=20)
+    downloads = tmpdir.mkdir('downloads')
+
+    oldest = store_file(cache, downloads, 'first.jar', b'0' * 10)
+    time.sleep(0.01)
+    newest = store_file(cache, downloads, 'second.jar', b'1' * 10)
+    time.sleep(0.01)
+    cache.lookup(sha256=oldest)
+    time.sleep(0.01)
+    recent = store_file(cache, downloads, 'third.jar', b'2' * 10)
+
+    evicted, freed = cache.collect_garbage()
+
+    assert (evicted, freed) == (1, 10)
+    assert cache.lookup(sha256=newest) is None
+    assert cache.lookup(sha256=oldest) == oldest
+    assert cache.lookup(sha256=recent) == recent
+    assert cache.lookup(key=artifact_key('spigot', 'second.jar', '1.0')) is None
+
+
+def test_last_size_of_any_cached_version(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    downloads = tmpdir.mkdir('downloads')
+    store_file(cache, downloads, 'Essentials.jar', b'essentials jar')
+
+    assert cache.last_size('spigot', 'Essentials.jar') == len(b'essentials jar')
+    assert cache.last_size('spigot', 'Essentials') is None
+    assert cache.last_size('bukkit', 'Essentials.jar') is None
@@ -0,0 +1,81 @@
+import io
+import os
+import threading
+
+from mcresolver.configuration import ConfigureJob, ThreadLocalOutput, configure_all
+
+
+class Resource(object):
+    def __init__(self, name):
+        self.name = name
+
+
+def test_thread_local_output():
+    stdout = io.StringIO()
+    output = ThreadLocalOutput(stdout)
+    captured = {}
+
+    def worker(name):
+        with output.capture(io.StringIO()) as buffer:
+            output.write("configuring %s\n" % name)
+            captured[name] = buffer.getvalue()
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in ('Essentials', 'Vault')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    output.write("summary\n")
+
+    assert captured == {'Essentials': "configuring Essentials\n", 'Vault': "configuring Vault\n"}
+    assert stdout.getvalue() == "summary\n"
+
+
+def test_configure_all(tmpdir, capsys):
+    tmpdir.join('template.yml').write("near-radius: {{near_radius}}\nupdate-check: {{update_check}}\n")
+    tmpdir.join('defaults.yml').write("near_radius: 200\nupdate_check: true\n")
+    plugins = tmpdir.mkdir('plugins')
+
+    jobs = [ConfigureJob(name, Resource(name), '1.0', str(plugins), str(tmpdir.mkdir('scripts-%s' % name)),
+                         config_options={'near_radius': radius}, template_file=str(tmpdir.join('template.yml')),
+                         defaults_file=str(tmpdir.join('defaults.yml')))
+            for name, radius in (('Essentials', 100), ('EssentialsX', 50))]
+    jobs.append(ConfigureJob('Missing', Resource('Missing'), '1.0', str(plugins), str(tmpdir),
+                             template_file=str(tmpdir.join('missing.yml')),
+                             defaults_file=str(tmpdir.join('defaults.yml'))))
+
+    results = configure_all(jobs, max_workers=3)
+
+    assert [job.configured for job in results] == [True, True, False]
+    assert plugins.join('Essentials', 'config.yml').read() == "near-radius: 100\nupdate-check: True"
+    assert plugins.join('EssentialsX', 'config.yml').read() == "near-radius: 50\nupdate-check: True"
+    assert "Unable to locate template file" in results[2].output
+    assert "Configured 2 of 3 plugins" in capsys.readouterr().out
+
+
+def test_unchanged_configuration_is_not_rewritten(tmpdir):
+    tmpdir.join('template.yml').write("near-radius: {{near_radius}}\n")
+    tmpdir.join('defaults.yml').write("near_radius: 200\n")
+    plugins = tmpdir.mkdir('plugins')
+
+    def configure(radius):
+        job = ConfigureJob('Essentials', Resource('Essentials'), '1.0', str(plugins), str(tmpdir),
+                           config_options={'near_radius': radius}, template_file=str(tmpdir.join('template.yml')),
+                           defaults_file=str(tmpdir.join('defaults.yml')))
+        return configure_all([job])[0]
+
+    config_file = plugins.join('Essentials', 'config.yml')
+    assert configure(100).configured
+    os.utime(str(config_file), (0, 0))
+
+    assert "is up to date" in configure(100).output
+    assert config_file.mtime() == 0
+
+    assert "has been rendered" in configure(50).output
+    assert config_file.read() == "near-radius: 50"
+    assert config_file.mtime() != 0
+
+    # Configurations edited by hand are rendered again.
+    config_file.write("near-radius: 1")
+    assert "has been rendered" in configure(50).output
+    assert config_file.read() == "near-radius: 50"
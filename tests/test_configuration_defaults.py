@@ -0,0 +1,33 @@
+import pytest
+
+from mcresolver.scripts import get_configuration_defaults, parse_configuration_defaults, merge_configuration_options
+
+DEFAULTS = """
+update_check: true
+near_radius: 200
+worlds:
+  - world
+  - world_nether
+"""
+
+
+def test_defaults_are_parsed_once():
+    assert parse_configuration_defaults(DEFAULTS) is parse_configuration_defaults(DEFAULTS)
+
+
+def test_defaults_are_read_only():
+    defaults = parse_configuration_defaults(DEFAULTS)
+
+    assert defaults['worlds'] == ('world', 'world_nether')
+    with pytest.raises(TypeError):
+        defaults['near_radius'] = 100
+
+    options = merge_configuration_options({'near_radius': 100}, defaults)
+    assert options == {'near_radius': 100, 'update_check': True, 'worlds': ('world', 'world_nether')}
+
+
+def test_defaults_from_file(tmpdir):
+    defaults_file = tmpdir.join('defaults.yml')
+    defaults_file.write(DEFAULTS)
+
+    assert get_configuration_defaults(file=str(defaults_file))['near_radius'] == 200
@@ -0,0 +1,163 @@
+import json
+import os
+import socket
+import stat
+import threading
+import urllib.request
+
+import pytest
+
+from mcresolver import MinecraftPluginResolver, resolver_arguments
+from mcresolver.daemon import ResolverService, create_server
+from mcresolver.metrics import reset_metrics
+
+
+def test_resolver_arguments():
+    arguments = resolver_arguments(requirements='server.yml', workers=2)
+
+    assert arguments.requirements == 'server.yml'
+    assert arguments.workers == 2
+    assert arguments.host_limit == 4
+
+    with pytest.raises(ValueError):
+        resolver_arguments(unknown=True)
+
+
+def test_resolver_steps_return_results(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    requirements = tmpdir.join('requirements.yml')
+    requirements.write("target-folder: %s\n" % tmpdir.join('server'))
+
+    with pytest.raises(ValueError):
+        MinecraftPluginResolver().resolve()
+
+    resolver = MinecraftPluginResolver(requirements=str(requirements))
+    resolution = resolver.resolve()
+    assert resolution.plugins == []
+    assert resolution.to_dict()['output-folder'] == str(tmpdir.join('server'))
+
+    result = resolver.run()
+    assert result.resolution is resolution
+    assert result.downloads.jobs == [] and result.configuration.jobs == []
+    assert tmpdir.join('mcresolver.lock').check()
+
+
+def serve_in_background(server):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_daemon_generates_templates_over_http(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    config = tmpdir.join('config.yml')
+    config.write("radius: 200\nworlds:\n- world\n")
+    reset_metrics()
+
+    server = create_server(ResolverService(), port=0)
+    serve_in_background(server)
+    url = "http://127.0.0.1:%s" % server.server_address[1]
+    try:
+        request = urllib.request.Request(url + '/generate', data=json.dumps({
+            'generate': str(config), 'genplugin': 'plugin', 'location': str(tmpdir.join('templates'))
+        }).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            generated = json.loads(response.read().decode('utf-8'))['result']
+
+        assert generated[0]['nodes'] == 2
+        assert tmpdir.join('templates', 'plugin-template.yml').check()
+
+        # Reports only cover their own request, while the metrics served add up over every request.
+        request = urllib.request.Request(url + '/generate', data=json.dumps({
+            'generate': str(config), 'genplugin': 'plugin', 'location': str(tmpdir.join('templates')),
+            'metrics_report': 'report.json'
+        }).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request).close()
+        report = json.loads(tmpdir.join('.mcresolver', 'reports', 'report.json').read())
+        assert [histogram['count'] for histogram in report['histograms']
+                if histogram['name'] == 'mcresolver_generate_duration_seconds'] == [1]
+
+        with urllib.request.urlopen(url + '/status') as response:
+            assert json.loads(response.read().decode('utf-8'))['result']['handled'] == 2
+
+        with urllib.request.urlopen(url + '/metrics') as response:
+            assert 'mcresolver_generate_duration_seconds_count 2' in response.read().decode('utf-8').splitlines()
+
+        request = urllib.request.Request(url + '/resolve', data=b'{"unknown": true}')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        assert error.value.code == 400
+
+        # Reports can't be written outside of the reports folder.
+        request = urllib.request.Request(url + '/generate', data=json.dumps({
+            'generate': str(config), 'genplugin': 'plugin', 'location': str(tmpdir.join('templates')),
+            'trace': str(tmpdir.join('trace.json'))
+        }).encode('utf-8'))
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        assert error.value.code == 400 and not tmpdir.join('trace.json').check()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_listens_on_unix_socket(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    socket_file = str(tmpdir.join('mcresolver.sock'))
+
+    server = create_server(ResolverService(), socket_file=socket_file)
+    serve_in_background(server)
+    try:
+        assert stat.S_IMODE(os.stat(socket_file).st_mode) == 0o600
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_file)
+        client.sendall(b"GET /status HTTP/1.0\r\n\r\n")
+        response = b""
+        for data in iter(lambda: client.recv(4096), b""):
+            response += data
+        client.close()
+
+        headers, _, body = response.partition(b"\r\n\r\n")
+        assert headers.startswith(b"HTTP/1.0 200")
+        assert json.loads(body.decode('utf-8'))['result']['handled'] == 0
+
+        # The socket of a running daemon is left alone.
+        with pytest.raises(ValueError):
+            create_server(ResolverService(), socket_file=socket_file)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # While the socket left behind by a daemon that's gone is replaced.
+    server = create_server(ResolverService(), socket_file=socket_file)
+    server.server_close()
+
+    with pytest.raises(ValueError):
+        create_server(ResolverService(), socket_file=str(tmpdir.join('config.yml').ensure()))
+
+
+def test_daemon_only_serves_remote_hosts_with_a_token(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    service = ResolverService()
+
+    with pytest.raises(ValueError):
+        create_server(service, host='0.0.0.0', port=0)
+    with pytest.raises(ValueError):
+        create_server(service, host='0.0.0.0', port=0, allow_remote=True)
+
+    server = create_server(service, port=0, token='s3cret')
+    serve_in_background(server)
+    url = "http://127.0.0.1:%s/status" % server.server_address[1]
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url)
+        assert error.value.code == 401
+
+        request = urllib.request.Request(url, headers={'Authorization': 'Bearer s3cret'})
+        with urllib.request.urlopen(request) as response:
+            assert json.loads(response.read().decode('utf-8'))['result']['handled'] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
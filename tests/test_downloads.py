@@ -0,0 +1,264 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+import requests
+
+from mcresolver.cache import ArtifactCache
+from mcresolver.downloads import DownloadJob, download, download_all, NotModified, format_size, parse_size
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    SimpleHTTPRequestHandler with just enough Range support (bytes=<start>-) to resume downloads.
+    (SimpleHTTPRequestHandler already answers If-Modified-Since with 304 Not Modified)
+    """
+    range_requests = []
+    requests = []
+
+    def do_GET(self):
+        requested_range = self.headers.get('Range')
+        self.range_requests.append(requested_range)
+        self.requests.append(self.path)
+        path = self.translate_path(self.path)
+
+        if self.path.endswith('/truncated.yml'):
+            # Announce more than is sent, then drop the connection.
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'motd: truncated\n')
+            self.close_connection = True
+            return
+
+        if self.path.endswith('/gzipped.yml'):
+            body = gzip.compress(b'motd: compressed\n' * 100)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if self.path.endswith('/stalled.yml'):
+            time.sleep(1)
+
+        if self.path.endswith('/unsatisfiable.jar'):
+            self.send_response(416)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if requested_range is None or not os.path.isfile(path):
+            return SimpleHTTPRequestHandler.do_GET(self)
+
+        with open(path, 'rb') as served:
+            contents = served.read()
+
+        start = int(requested_range.split('=', 1)[1].rstrip('-'))
+        if 'misaligned' in self.path:
+            # Answer with another part of the file than the one requested.
+            start += 10
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, len(contents) - 1, len(contents)))
+        self.send_header('Content-Length', str(len(contents) - start))
+        self.end_headers()
+        self.wfile.write(contents[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def plugin_jar(index):
+    jar = io.BytesIO()
+    with zipfile.ZipFile(jar, 'w') as archive:
+        archive.writestr('plugin.yml', 'name: plugin-%s\nversion: 1.0\n' % index)
+        archive.writestr('data.bin', os.urandom(64 * 1024))
+    return jar.getvalue()
+
+
+@pytest.fixture
+def plugin_server(tmpdir):
+    served = tmpdir.mkdir('served')
+    for index in range(4):
+        served.join('plugin-%s.jar' % index).write_binary(plugin_jar(index))
+    served.join('corrupt.jar').write_binary(os.urandom(1024))
+
+    RangeRequestHandler.range_requests = []
+    RangeRequestHandler.requests = []
+    server = HTTPServer(('127.0.0.1', 0), partial(RangeRequestHandler, directory=str(served)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield served, 'http://127.0.0.1:%s' % server.server_address[1]
+    server.shutdown()
+
+
+def test_download_all(plugin_server, tmpdir):
+    served, url = plugin_server
+    target = tmpdir.mkdir('plugins')
+
+    jobs = [DownloadJob('plugin-%s' % index, '%s/plugin-%s.jar' % (url, index),
+                        str(target.join('plugin-%s.jar' % index))) for index in range(4)]
+    jobs.append(DownloadJob('missing', '%s/missing.jar' % url, str(target.join('missing.jar'))))
+
+    results = download_all(jobs, max_workers=4, per_host=2)
+
+    assert [job.name for job in results] == ['plugin-0', 'plugin-1', 'plugin-2', 'plugin-3', 'missing']
+    for job in results[:4]:
+        contents = served.join(os.path.basename(job.file_name)).read_binary()
+        assert job.error is None
+        assert job.size == len(contents)
+        assert job.sha256 == hashlib.sha256(contents).hexdigest()
+        assert target.join(os.path.basename(job.file_name)).read_binary() == contents
+
+    assert isinstance(results[4].error, FileNotFoundError)
+    # Failed downloads never leave partial (or temporary) files behind.
+    assert sorted(os.listdir(str(target))) == ['plugin-%s.jar' % index for index in range(4)]
+
+
+def test_failed_download_keeps_existing_file(plugin_server, tmpdir):
+    served, url = plugin_server
+    existing = tmpdir.join('missing.jar')
+    existing.write_binary(b'previous jar')
+
+    with pytest.raises(FileNotFoundError):
+        download(str(existing), '%s/missing.jar' % url)
+
+    assert existing.read_binary() == b'previous jar'
+
+
+def test_partial_download_is_resumed(plugin_server, tmpdir):
+    served, url = plugin_server
+    contents = served.join('plugin-0.jar').read_binary()
+    destination = tmpdir.join('plugin-0.jar')
+
+    tmpdir.join('plugin-0.jar.part').write_binary(contents[:1000])
+    tmpdir.join('plugin-0.jar.part.json').write(json.dumps({'url': '%s/plugin-0.jar' % url}))
+
+    size, sha256 = download(str(destination), '%s/plugin-0.jar' % url)
+
+    assert RangeRequestHandler.range_requests == ['bytes=1000-']
+    assert size == len(contents)
+    assert sha256 == hashlib.sha256(contents).hexdigest()
+    assert destination.read_binary() == contents
+    assert sorted(os.listdir(str(tmpdir))) == ['plugin-0.jar', 'served']
+
+
+def test_misaligned_partial_download_starts_over(plugin_server, tmpdir):
+    served, url = plugin_server
+    contents = served.join('plugin-0.jar').read_binary()
+    served.join('misaligned-0.jar').write_binary(contents)
+    destination = tmpdir.join('misaligned-0.jar')
+
+    tmpdir.join('misaligned-0.jar.part').write_binary(contents[:1000])
+    tmpdir.join('misaligned-0.jar.part.json').write(json.dumps({'url': '%s/misaligned-0.jar' % url}))
+
+    size, sha256 = download(str(destination), '%s/misaligned-0.jar' % url)
+
+    assert RangeRequestHandler.range_requests == ['bytes=1000-', None]
+    assert destination.read_binary() == contents and size == len(contents)
+
+
+def test_corrupt_downloads_are_rejected(plugin_server, tmpdir):
+    served, url = plugin_server
+
+    with pytest.raises(ValueError):
+        download(str(tmpdir.join('corrupt.jar')), '%s/corrupt.jar' % url)
+
+    with pytest.raises(ValueError):
+        download(str(tmpdir.join('plugin-1.jar')), '%s/plugin-1.jar' % url, checksum='0' * 64)
+
+    assert sorted(os.listdir(str(tmpdir))) == ['served']
+
+
+def test_truncated_downloads_are_rejected(plugin_server, tmpdir):
+    served, url = plugin_server
+
+    with pytest.raises(ValueError):
+        download(str(tmpdir.join('config.yml')), '%s/truncated.yml' % url)
+
+    assert not tmpdir.join('config.yml').exists()
+
+
+def test_encoded_downloads_are_decoded(plugin_server, tmpdir):
+    served, url = plugin_server
+
+    size, sha256 = download(str(tmpdir.join('config.yml')), '%s/gzipped.yml' % url)
+
+    assert tmpdir.join('config.yml').read_binary() == b'motd: compressed\n' * 100
+    assert size == len(b'motd: compressed\n') * 100
+
+
+def test_stalled_and_unsatisfiable_downloads_fail(plugin_server, tmpdir):
+    served, url = plugin_server
+    served.join('stalled.yml').write('motd: stalled\n')
+
+    with pytest.raises(requests.Timeout):
+        download(str(tmpdir.join('stalled.yml')), '%s/stalled.yml' % url, timeout=0.2)
+
+    tmpdir.join('plugin.jar.part').write_binary(b'partial')
+    tmpdir.join('plugin.jar.part.json').write(json.dumps({'url': '%s/unsatisfiable.jar' % url}))
+    RangeRequestHandler.range_requests = []
+
+    # Restarted from scratch once, rather than retried for as long as the server keeps refusing.
+    with pytest.raises(FileNotFoundError):
+        download(str(tmpdir.join('plugin.jar')), '%s/unsatisfiable.jar' % url)
+    assert RangeRequestHandler.range_requests == ['bytes=7-', None]
+
+
+def test_conditional_download(plugin_server, tmpdir):
+    served, url = plugin_server
+    destination = str(tmpdir.join('plugin-2.jar'))
+    validators = {}
+
+    size, sha256 = download(destination, '%s/plugin-2.jar' % url, validators=validators)
+    assert validators['sha256'] == sha256
+    assert validators['last-modified'] is not None
+
+    with pytest.raises(NotModified):
+        download(destination, '%s/plugin-2.jar' % url, validators=dict(validators))
+
+
+def test_unchanged_plugins_are_skipped(plugin_server, tmpdir):
+    served, url = plugin_server
+    artifacts = ArtifactCache(str(tmpdir.join('cache')))
+    target = tmpdir.mkdir('plugins')
+
+    def jobs():
+        return [DownloadJob('plugin-%s' % index, '%s/plugin-%s.jar' % (url, index),
+                            str(target.join('plugin-%s.jar' % index)), cache_key='spigot:%s:latest' % index)
+                for index in range(4)]
+
+    download_all(jobs(), artifacts=artifacts)
+    assert len(RangeRequestHandler.requests) == 4
+
+    modified = os.path.getmtime(str(target.join('plugin-0.jar')))
+    results = download_all(jobs(), artifacts=artifacts)
+
+    # Every plugin is already in place; Nothing is requested, nor touched.
+    assert all(job.unchanged for job in results)
+    assert len(RangeRequestHandler.requests) == 4
+    assert os.path.getmtime(str(target.join('plugin-0.jar'))) == modified
+
+    # Without knowing which file a resource resolves to, the server is asked whether it's changed.
+    target.join('plugin-1.jar').remove()
+    renamed = [DownloadJob(job.name, job.url, job.file_name, cache_key=job.cache_key + '-renamed') for job in jobs()]
+    results = download_all(renamed, artifacts=artifacts)
+
+    assert len(RangeRequestHandler.requests) == 8
+    assert results[0].unchanged and results[1].cached
+    assert target.join('plugin-1.jar').read_binary() == served.join('plugin-1.jar').read_binary()
+
+
+def test_sizes_are_parsed_as_they_are_formatted():
+    assert parse_size(format_size(1536)) == 1536
+    assert parse_size('2.5 MB') == int(2.5 * 1024 ** 2)
+    assert parse_size('') is None and parse_size('12 parsecs') is None
@@ -0,0 +1,162 @@
+import os
+import shutil
+
+import yaml
+
+from mcresolver.generation import generate_template, generate_template_files, collect_comments, \
+    discover_config_files, is_batch_source, GenerateJob, generate_all, write_index
+
+__dirname = os.path.dirname(os.path.abspath(__file__))
+
+
+def read(name):
+    with open(os.path.join(__dirname, name), 'r') as data:
+        return data.read()
+
+
+def test_generate_template_matches_previous_output():
+    # essentials-template.yml & essentials-defaults.yml were generated by the previous (replace based) generator.
+    template, defaults = generate_template(os.path.join(__dirname, 'essentials.yml'))
+
+    assert template == read('essentials-template.yml')
+    assert defaults == read('essentials-defaults.yml')
+
+
+def test_generate_template(tmpdir):
+    config = tmpdir.join('config.yml')
+    config.write("# Radius to search players in\n"
+                 "near-radius: 200\n"
+                 "motd: 'Welcome!'\n"
+                 "\n"
+                 "spawn:\n"
+                 "  enabled: true\n"
+                 "  worlds:\n"
+                 "  - world\n"
+                 "  - nether\n")
+
+    template, defaults = generate_template(str(config))
+
+    assert template == ("# Radius to search players in\n"
+                        "near-radius: {{near_radius}}\n"
+                        "motd: '{{motd}}'\n"
+                        "\n"
+                        "spawn:\n"
+                        "  enabled: {{spawn_enabled}}\n"
+                        "  worlds:\n"
+                        "{% for spawn_worlds_item in spawn_worlds %}    - {{list_item}}\n"
+                        "{% endfor %}\n")
+    assert defaults == ("near_radius: 200\n"
+                        "motd: Welcome!\n"
+                        "spawn_enabled: true\n"
+                        "spawn_worlds:\n"
+                        "- world\n"
+                        "- nether\n")
+
+
+def test_collect_comments():
+    comments, eof_comment = collect_comments("# Header\n\na: 1\n# About b\nb: 2\n# The end\n")
+
+    assert comments['a'] == "# Header\n\n"
+    assert comments['b'] == "# About b\n"
+    assert eof_comment == "# The end\n"
+
+
+def test_generate_all(tmpdir):
+    plugins = tmpdir.mkdir('plugins')
+    shutil.copy(os.path.join(__dirname, 'essentials.yml'), str(plugins.mkdir('Essentials').join('config.yml')))
+    plugins.mkdir('Vault').join('config.yml').write("update-check: true\n")
+    plugins.join('Vault', 'messages.yml').write("prefix: '[Vault]'\n")
+    plugins.mkdir('Broken').join('config.yml').write("broken: [\n")
+    plugins.join('Vault', 'data').mkdir().join('players.yml').write("players: []\n")
+    output = tmpdir.mkdir('templates')
+
+    assert is_batch_source(str(plugins))
+    assert is_batch_source(str(plugins.join('*', 'config.yml')))
+    assert not is_batch_source(str(plugins.join('Vault', 'config.yml')))
+
+    config_files = discover_config_files(str(plugins))
+    assert [(plugin, os.path.basename(file)) for plugin, file in config_files] == [
+        ('Broken', 'config.yml'), ('Essentials', 'config.yml'), ('Vault', 'config.yml'), ('Vault', 'messages.yml')]
+    assert len(discover_config_files(str(plugins.join('*', 'config.yml')))) == 3
+
+    jobs = generate_all([GenerateJob(plugin, file, str(output)) for plugin, file in config_files], processes=2)
+
+    assert [job.error is None for job in jobs] == [False, True, True, True]
+    assert output.join('Essentials-template.yml').read() == read('essentials-template.yml')
+    assert output.join('Vault-template.yml').read() == "update-check: {{update_check}}\n"
+    assert output.join('Vault-messages-defaults.yml').read() == "prefix: '[Vault]'\n"
+
+    index = yaml.safe_load(open(write_index(str(output), jobs)))
+    assert index['Vault']['messages.yml']['template'] == 'Vault-messages-template.yml'
+    assert index['Essentials']['config.yml']['nodes'] == jobs[1].nodes
+    assert 'error' in index['Broken']['config.yml']
+
+
+ORIGINAL_CONFIG = """# Radius to search players in
+near-radius: 200
+motd: 'Welcome!'
+spawn:
+  enabled: true
+  delay: 5
+  worlds:
+  - world
+legacy:
+  enabled: false
+"""
+
+UPDATED_CONFIG = """# Radius to search players in
+near-radius: 200
+motd: 'Welcome!'
+spawn:
+  enabled: true
+  delay:
+  - 5
+  worlds:
+  - world
+  protect: false
+# Economy settings
+economy:
+  start-balance: 100
+"""
+
+
+def generate_files(tmpdir, config, incremental=True):
+    tmpdir.join('config.yml').write(config)
+    return generate_template_files(str(tmpdir.join('config.yml')), str(tmpdir.join('plugin-template.yml')),
+                                   str(tmpdir.join('plugin-defaults.yml')), incremental=incremental)
+
+
+def test_incremental_generation_matches_full_generation(tmpdir):
+    generate_files(tmpdir.mkdir('incremental'), ORIGINAL_CONFIG)
+    generator, delta = generate_files(tmpdir.join('incremental'), UPDATED_CONFIG)
+    generate_files(tmpdir.mkdir('full'), UPDATED_CONFIG, incremental=False)
+
+    assert delta.added == ['spawn.protect', 'economy.start-balance']
+    assert delta.removed == ['legacy.enabled']
+    assert delta.retyped == ['spawn.delay']
+    for name in ('plugin-template.yml', 'plugin-defaults.yml'):
+        assert tmpdir.join('incremental', name).read() == tmpdir.join('full', name).read()
+
+
+def test_incremental_generation_keeps_edits(tmpdir):
+    generator, delta = generate_files(tmpdir, ORIGINAL_CONFIG)
+    assert delta is None
+
+    template = tmpdir.join('plugin-template.yml')
+    defaults = tmpdir.join('plugin-defaults.yml')
+    template.write(template.read().replace("motd: '{{motd}}'", "motd: '{{ motd | upper }}'") + "# Edited by hand\n")
+    defaults.write(defaults.read().replace("near_radius: 200", "near_radius: 50"))
+
+    generator, delta = generate_files(tmpdir, UPDATED_CONFIG)
+    assert str(delta) == "+2 -1 ~1 nodes"
+    assert "motd: '{{ motd | upper }}'" in template.read()
+    assert template.read().endswith("# Economy settings\neconomy:\n  start-balance: {{economy_start_balance}}\n"
+                                    "# Edited by hand\n")
+    assert "legacy" not in template.read()
+    assert yaml.safe_load(defaults.read()) == {'near_radius': 50, 'motd': 'Welcome!', 'spawn_enabled': True,
+                                               'spawn_delay': [5], 'spawn_worlds': ['world'],
+                                               'spawn_protect': False, 'economy_start_balance': 100}
+
+    # Nothing changed since; Nothing is patched.
+    generator, delta = generate_files(tmpdir, UPDATED_CONFIG)
+    assert len(delta) == 0
@@ -0,0 +1,85 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from mcresolver.network import HttpCache
+
+
+class TemplateHandler(BaseHTTPRequestHandler):
+    body = b"motd: {{ motd }}\n"
+    cache_control = "max-age=300"
+    requests = []
+
+    def do_GET(self):
+        TemplateHandler.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Cache-Control', TemplateHandler.cache_control)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    TemplateHandler.requests = []
+    TemplateHandler.cache_control = "max-age=300"
+    httpd = HTTPServer(('127.0.0.1', 0), TemplateHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%s/config.yml" % httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fresh_responses_are_served_from_the_cache(tmpdir, server):
+    cache = HttpCache(str(tmpdir))
+    assert cache.get(server) == TemplateHandler.body
+    assert cache.get(server) == TemplateHandler.body
+    assert len(TemplateHandler.requests) == 1
+
+
+def test_no_cache_responses_are_revalidated(tmpdir, server):
+    TemplateHandler.cache_control = "no-cache"
+    cache = HttpCache(str(tmpdir))
+    cache.get(server)
+    assert cache.get(server) == TemplateHandler.body
+    assert len(TemplateHandler.requests) == 2
+    assert TemplateHandler.requests[1].get('If-None-Match') == '"v1"'
+
+
+def test_no_store_responses_are_not_cached(tmpdir, server):
+    TemplateHandler.cache_control = "no-store"
+    cache = HttpCache(str(tmpdir))
+    cache.get(server)
+    assert tmpdir.listdir() == []
+
+
+def test_cached_copy_is_served_when_offline(tmpdir):
+    TemplateHandler.cache_control = "max-age=0"
+    httpd = HTTPServer(('127.0.0.1', 0), TemplateHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/config.yml" % httpd.server_port
+
+    cache = HttpCache(str(tmpdir), timeout=1)
+    assert cache.get(url) == TemplateHandler.body
+
+    httpd.shutdown()
+    httpd.server_close()
+    assert cache.get(url) == TemplateHandler.body
+
+
+def test_uncached_requests_fail_when_offline(tmpdir):
+    with pytest.raises(requests.RequestException):
+        HttpCache(str(tmpdir), timeout=1).get("http://127.0.0.1:1/config.yml")
@@ -0,0 +1,55 @@
+import os
+
+from mcresolver.lockfile import read_lockfile, write_lockfile, locked_lookup, lockfile_path, LockedSpigotResource
+
+
+def test_lockfile_next_to_requirements(tmpdir):
+    requirements = os.path.join(str(tmpdir), 'plugins.yml')
+    assert lockfile_path(requirements) == os.path.join(str(tmpdir), 'mcresolver.lock')
+
+
+def test_lockfile_round_trip(tmpdir):
+    lock = os.path.join(str(tmpdir), 'mcresolver.lock')
+    spigot_resources = {
+        9089: {
+            'name': 'Essentials',
+            'requested-version': 'latest',
+            'resolved-version': '2.0.1-b267',
+            'download-url': 'https://api.spiget.org/v1/resources/9089/download',
+            'file-name': 'Essentials-2.0.1-b267.jar',
+            'size': 1024,
+            'sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',
+        }
+    }
+
+    write_lockfile(lock, {}, spigot_resources)
+    locked = read_lockfile(lock)
+
+    assert 'Bukkit' not in locked
+    assert locked['Spigot'][9089]['version'] == '2.0.1-b267'
+
+    record = locked_lookup(locked, 'Spigot', 9089, 'latest').result()
+    assert isinstance(record['resource'], LockedSpigotResource)
+    assert record['resource'].name == 'Essentials'
+    assert record['resource'].file_type == '.jar'
+    assert record['resolved-version'] == '2.0.1-b267'
+    # Configured by the version requested, like when it's resolved.
+    assert record['version'] == 'latest'
+    assert record['sha256'] == spigot_resources[9089]['sha256']
+
+    # Requesting another version than what was locked has to resolve the plugin again.
+    assert locked_lookup(locked, 'Spigot', 9089, '2.0.1-b300') is None
+    assert locked_lookup(locked, 'Bukkit', 'vault', 'latest') is None
+
+
+def test_missing_lockfile(tmpdir):
+    assert read_lockfile(os.path.join(str(tmpdir), 'mcresolver.lock')) == {}
+
+
+def test_corrupt_lockfile_resolves_again(tmpdir):
+    lock = tmpdir.join('mcresolver.lock')
+    lock.write("Spigot:\n  9089: {name: Essentials\n")
+    assert read_lockfile(str(lock)) == {}
+
+    lock.write("Spigot:\n  9089:\n    name: Essentials\n")
+    assert read_lockfile(str(lock)) == {}
@@ -0,0 +1,102 @@
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from mcresolver.cache import MetadataCache
+
+
+class ResourceHandler(BaseHTTPRequestHandler):
+    downloads = itertools.count()
+    version = '2.0.1'
+
+    def do_GET(self):
+        body = json.dumps({'name': 'Essentials', 'downloads': next(self.downloads),
+                           'version': ResourceHandler.version, 'versions': ['2.0.0', ResourceHandler.version]})
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def resource_url():
+    ResourceHandler.version = '2.0.1'
+    httpd = HTTPServer(('127.0.0.1', 0), ResourceHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%s/resources/9089" % httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pinned_versions_never_expire(tmpdir):
+    cache = MetadataCache(str(tmpdir), ttl=0)
+    cache.put('spigot', 9089, '2.0.1-b267', {
+        'version': '2.0.1-b267',
+        'resolved-version': '2.0.1-b267',
+        'download-url': 'https://api.spiget.org/v1/resources/9089/download',
+    })
+
+    record = cache.get('spigot', 9089, '2.0.1-b267')
+    assert record is not None
+    assert record['download-url'] == 'https://api.spiget.org/v1/resources/9089/download'
+
+
+def test_latest_versions_expire_after_ttl(tmpdir):
+    cache = MetadataCache(str(tmpdir), ttl=3600)
+    cache.put('bukkit', 'vault', 'latest', {'version': 'latest', 'resolved-version': '1.5.6'})
+    assert cache.get('bukkit', 'vault', 'latest')['resolved-version'] == '1.5.6'
+
+    expired_cache = MetadataCache(str(tmpdir), ttl=0)
+    assert expired_cache.get('bukkit', 'vault', 'latest') is None
+
+
+def test_refresh_ignores_cached_records(tmpdir):
+    MetadataCache(str(tmpdir)).put('bukkit', 'vault', '1.5.6', {'version': '1.5.6', 'resolved-version': '1.5.6'})
+    assert MetadataCache(str(tmpdir), refresh=True).get('bukkit', 'vault', '1.5.6') is None
+
+
+def test_latest_fallbacks_need_to_be_allowed(tmpdir):
+    cache = MetadataCache(str(tmpdir))
+    cache.put('bukkit', 'essentials', '9.9.9', {'version': 'latest', 'resolved-version': '2.0.1'})
+
+    assert cache.get('bukkit', 'essentials', '9.9.9', allow_latest=False) is None
+    assert cache.get('bukkit', 'essentials', '9.9.9', allow_latest=True)['resolved-version'] == '2.0.1'
+
+
+def test_revalidation_ignores_volatile_fields(tmpdir, resource_url):
+    cache = MetadataCache(str(tmpdir), ttl=0)
+    cache.put('spigot', 9089, 'latest', {'version': 'latest', 'resolved-version': '2.0.1'})
+
+    # Download counts change between every request, the versions don't.
+    assert cache.get('spigot', 9089, 'latest', revalidate_url=resource_url) is not None
+    assert cache.get('spigot', 9089, 'latest', revalidate_url=resource_url) is not None
+
+    ResourceHandler.version = '2.0.2'
+    assert cache.get('spigot', 9089, 'latest', revalidate_url=resource_url) is None
+
+
+def test_resources_are_rebuilt_rather_than_pickled(tmpdir):
+    from mcresolver import lookup_bukkit_resource
+
+    MetadataCache(str(tmpdir)).put('bukkit', 'vault', '1.5.6', {
+        'resource': object(),
+        'version': '1.5.6',
+        'resolved-version': '1.5.6',
+        'download-url': 'http://dev.bukkit.org/media/files/894/359/Vault.jar',
+        'file-name': 'Vault.jar',
+    })
+
+    cache = MetadataCache(str(tmpdir))
+    assert 'resource' not in cache.get('bukkit', 'vault', '1.5.6')
+
+    record = lookup_bukkit_resource('vault', '1.5.6', cache=cache)
+    assert record['resource'].get_versioned_file_name() == 'Vault.jar'
+    assert record['resource'].has_version('1.5.6')
+    assert 'resource' not in cache.get('bukkit', 'vault', '1.5.6')
@@ -0,0 +1,94 @@
+import json
+import pickle
+
+from mcresolver.metrics import Metrics, Histogram, plugin_scope, write_report, write_textfile
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.1, 2), (1, 3), ('+Inf', 4)]
+    assert histogram.count == 4 and histogram.sum == 2.65
+
+
+def test_cache_and_host_results():
+    metrics = Metrics()
+    metrics.increment('mcresolver_cache_requests_total', cache='http', result='hit')
+    metrics.increment('mcresolver_cache_requests_total', cache='http', result='revalidated')
+    metrics.increment('mcresolver_cache_requests_total', cache='http', result='miss', amount=2)
+    metrics.increment('mcresolver_http_requests_total', host='api.spiget.org', status=200)
+    metrics.increment('mcresolver_download_bytes_total', 4096, host='api.spiget.org')
+    metrics.observe('mcresolver_download_duration_seconds', 2.0, host='api.spiget.org')
+
+    assert metrics.cache_results()['http'] == {'hit': 1, 'revalidated': 1, 'miss': 2, 'hit-ratio': 0.5}
+    host = metrics.host_results()['api.spiget.org']
+    assert host['requests'] == 1 and host['statuses'] == {'200': 1}
+    assert host['downloaded-bytes'] == 4096 and host['throughput'] == 2048
+
+
+def test_plugin_values_follow_the_plugin_scope():
+    metrics = Metrics()
+    metrics.record_plugin(render_seconds=1.0)
+    with plugin_scope('Essentials'):
+        metrics.record_plugin(render_seconds=0.5)
+    metrics.record_plugin('Vault', download_bytes=10)
+
+    assert metrics.plugins == {'Essentials': {'render-seconds': 0.5}, 'Vault': {'download-bytes': 10}}
+
+
+def test_metrics_of_worker_processes_merge():
+    metrics = Metrics()
+    metrics.observe('mcresolver_render_duration_seconds', 0.2)
+
+    worker = Metrics()
+    worker.observe('mcresolver_render_duration_seconds', 0.3)
+    worker.increment('mcresolver_cache_requests_total', cache='render', result='hit')
+    worker.record_plugin('Essentials', render_seconds=0.3)
+    metrics.merge(pickle.loads(pickle.dumps(worker)))
+
+    histogram = metrics.histograms[('mcresolver_render_duration_seconds', ())]
+    assert histogram.count == 2 and abs(histogram.sum - 0.5) < 1e-9
+    assert metrics.cache_results()['render']['hit'] == 1
+    assert metrics.plugins['Essentials'] == {'render-seconds': 0.3}
+
+
+def test_report_and_textfile(tmpdir):
+    metrics = Metrics()
+    with metrics.phase('download'):
+        metrics.increment('mcresolver_http_requests_total', host='example.org', status=200)
+    metrics.observe('mcresolver_download_duration_seconds', 0.02, host='example.org')
+    metrics.record_plugin('Say "hi"', download_bytes=512, download_seconds=0.02)
+
+    write_report(str(tmpdir.join('report.json')), metrics)
+    report = json.loads(tmpdir.join('report.json').read())
+    assert 'download' in report['phases']
+    assert report['plugins']['Say "hi"']['download-bytes'] == 512
+    assert report['hosts']['example.org']['requests'] == 1
+
+    write_textfile(str(tmpdir.join('mcresolver.prom')), metrics)
+    lines = tmpdir.join('mcresolver.prom').read().splitlines()
+    assert "# TYPE mcresolver_http_requests_total counter" in lines
+    assert 'mcresolver_http_requests_total{host="example.org",status="200"} 1' in lines
+    assert 'mcresolver_download_duration_seconds_bucket{host="example.org",le="0.025"} 1' in lines
+    assert 'mcresolver_download_duration_seconds_bucket{host="example.org",le="0.01"} 0' in lines
+    assert 'mcresolver_download_duration_seconds_count{host="example.org"} 1' in lines
+    assert 'mcresolver_plugin_download_bytes{plugin="Say \\"hi\\""} 512' in lines
+    assert 'mcresolver_plugin_duration_seconds{plugin="Say \\"hi\\"",step="download"} 0.02' in lines
+
+
+def test_runs_add_up_while_gauges_describe_the_last():
+    metrics = Metrics()
+    for elapsed in (0.2, 0.3):
+        run = Metrics()
+        with run.phase('generate'):
+            run.observe('mcresolver_generate_duration_seconds', elapsed)
+        run.record_plugin('Essentials-%s' % elapsed, generate_seconds=elapsed)
+        metrics.add_run(run)
+
+    assert metrics.histograms[('mcresolver_generate_duration_seconds', ())].count == 2
+    assert list(metrics.plugins) == ['Essentials-0.3']
+    assert metrics.gauges[('mcresolver_phase_duration_seconds', (('phase', 'generate'),))] == run.phases['generate']
+    assert metrics.gauges[('mcresolver_last_run_timestamp_seconds', ())] >= run.started
+    assert Metrics().to_prometheus().strip() == ""
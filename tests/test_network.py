@@ -0,0 +1,31 @@
+import json
+import time
+
+from mcresolver.network import CloudflareClearance, get_session
+
+
+def test_session_is_shared():
+    assert get_session() is get_session()
+
+
+def test_clearance_applies_to_spigot_only(tmpdir):
+    clearance = CloudflareClearance(str(tmpdir.join('cloudflare-tokens.json')))
+    assert clearance.applies_to('https://www.spigotmc.org/resources/essentials.9089/download?version=1')
+    assert clearance.applies_to('https://spigotmc.org/resources/9089')
+    # Spiget downloads redirect to SpigotMC.
+    assert clearance.applies_to('https://api.spiget.org/v1/resources/9089/download')
+    assert not clearance.applies_to('https://dev.bukkit.org/projects/vault/files/latest')
+    assert not clearance.applies_to('https://notspigotmc.org/resources/9089')
+
+
+def test_persisted_clearance_is_reused(tmpdir):
+    tokens_file = tmpdir.join('cloudflare-tokens.json')
+    tokens_file.write(json.dumps({
+        'cookies': {'cf_clearance': 'cleared'},
+        'user-agent': 'mcresolver-tests',
+        'expires': time.time() + 600,
+    }))
+
+    cookies, user_agent = CloudflareClearance(str(tokens_file)).get_tokens()
+    assert cookies == {'cf_clearance': 'cleared'}
+    assert user_agent == 'mcresolver-tests'
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from mcresolver import MinecraftPluginResolver
+from mcresolver.pipeline import Task, PipelineExecutor, critical_path
+
+
+def test_heaviest_chains_start_first():
+    started = []
+    lock = threading.Lock()
+
+    def record(name):
+        with lock:
+            started.append(name)
+
+    small = Task('small', 'download', lambda: record('small'), host='example.org', weight=10)
+    large = Task('large', 'download', lambda: record('large'), host='example.org', weight=1000)
+    # Resolving the medium plugin is light, but leads to a heavier download than the small one.
+    resolve = Task('resolve medium', 'resolve', lambda: record('resolve medium'), host='example.org')
+    medium = Task('medium', 'download', lambda: record('medium'), [resolve], host='example.org', weight=100)
+
+    PipelineExecutor(max_workers=1).run([small, resolve, medium, large])
+
+    assert started == ['large', 'resolve medium', 'medium', 'small']
+    assert resolve.priority == 100
+
+
+def test_failed_dependencies_skip_their_dependents():
+    def fail():
+        raise ValueError("Unable to resolve")
+
+    resolve = Task('resolve', 'resolve', fail, host='example.org')
+    download = Task('download', 'download', lambda: 'jar', [resolve], host='example.org')
+    configure = Task('configure', 'configure', lambda: 'configured', [download])
+    other = Task('other', 'configure', lambda: 'configured')
+
+    completed = []
+    PipelineExecutor(on_complete=completed.append).run([resolve, download, configure, other])
+
+    assert isinstance(resolve.error, ValueError)
+    assert download.skipped and configure.skipped and configure.result is None
+    assert other.result == 'configured' and not other.failed
+    assert sorted(task.name for task in completed) == ['configure', 'download', 'other', 'resolve']
+
+
+def test_tasks_run_after_failed_tasks_they_only_wait_on():
+    def fail():
+        raise ValueError("Unable to download")
+
+    download = Task('download', 'download', fail, host='example.org')
+    fetch = Task('fetch', 'fetch', lambda: None, host='example.org')
+    configure = Task('configure', 'configure', lambda: download.finished, [fetch], after=[download])
+
+    PipelineExecutor().run([download, fetch, configure])
+
+    assert not configure.failed and configure.result is not None
+    assert configure.started >= download.finished
+
+
+def test_weights_known_once_ready_order_ready_tasks():
+    started = []
+    resolve = Task('resolve', 'resolve', lambda: started.append('resolve'))
+    small = Task('small', 'download', lambda: started.append('small'), [resolve], host='example.org',
+                 weight=lambda: 10)
+    large = Task('large', 'download', lambda: started.append('large'), [resolve], host='example.org',
+                 weight=lambda: 1000)
+
+    PipelineExecutor(max_workers=1).run([resolve, small, large])
+
+    assert started == ['resolve', 'large', 'small']
+    assert large.weight == 1000 and large.priority == 1000
+
+
+def test_stages_of_different_plugins_overlap():
+    slow = Task('download slow', 'download', lambda: time.sleep(0.2), host='example.org', weight=2)
+    fast = Task('download fast', 'download', lambda: time.sleep(0.01), host='example.org', weight=1)
+    configure = Task('configure fast', 'configure', lambda: time.sleep(0.01), [fast])
+
+    PipelineExecutor(max_workers=2, local_workers=1).run([slow, fast, configure])
+
+    assert configure.finished < slow.finished
+    assert critical_path([slow, fast, configure]) == [slow]
+
+
+def test_critical_path_follows_the_last_dependency():
+    resolve = Task('resolve', 'resolve', lambda: time.sleep(0.01))
+    download = Task('download', 'download', lambda: time.sleep(0.05), [resolve], host='example.org')
+    fetch = Task('fetch', 'fetch', lambda: None, [resolve], host='example.com')
+    configure = Task('configure', 'configure', lambda: None, [download, fetch])
+
+    tasks = PipelineExecutor().run([configure, fetch, download, resolve])
+
+    assert [task.name for task in critical_path(tasks)] == ['resolve', 'download', 'configure']
+
+
+def test_cycles_are_rejected():
+    first = Task('first', 'resolve', lambda: None)
+    second = Task('second', 'resolve', lambda: None, [first])
+    first.dependencies.append(second)
+
+    with pytest.raises(ValueError):
+        PipelineExecutor().run([first, second])
+
+
+def test_run_pipelines_empty_requirements(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    requirements = tmpdir.join('requirements.yml')
+    requirements.write("target-folder: %s\n" % tmpdir.join('server'))
+
+    result = MinecraftPluginResolver(requirements=str(requirements)).run()
+
+    assert result.resolution.plugins == []
+    assert result.downloads.jobs == [] and result.configuration.jobs == []
+    assert tmpdir.join('mcresolver.lock').check()
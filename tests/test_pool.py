@@ -0,0 +1,55 @@
+import threading
+import time
+
+from mcresolver.pool import HostLimitedPool
+
+
+def test_pool_limits_concurrency_per_host():
+    active = {'count': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def job(value):
+        with lock:
+            active['count'] += 1
+            active['peak'] = max(active['peak'], active['count'])
+        time.sleep(0.05)
+        with lock:
+            active['count'] -= 1
+        return value
+
+    with HostLimitedPool(max_workers=8, per_host=2) as pool:
+        futures = [pool.submit('api.spiget.org', job, i) for i in range(8)]
+        results = [future.result() for future in futures]
+
+    assert results == list(range(8))
+    assert active['peak'] <= 2
+
+
+def test_pool_failure_does_not_abort_other_jobs():
+    def job(value):
+        if value == 2:
+            raise ValueError("Lookup failed")
+        return value
+
+    with HostLimitedPool(max_workers=4, per_host=4) as pool:
+        futures = [pool.submit('api.bukget.org', job, i) for i in range(5)]
+
+    assert [f.result() for f in futures if f.exception() is None] == [0, 1, 3, 4]
+    assert isinstance(futures[2].exception(), ValueError)
+
+
+def test_saturated_host_does_not_hold_workers():
+    started = time.time()
+    starts = {}
+
+    def job(host, value):
+        starts.setdefault(host, time.time() - started)
+        time.sleep(0.2)
+        return value
+
+    with HostLimitedPool(max_workers=8, per_host=4) as pool:
+        futures = [pool.submit('api.bukget.org', job, 'api.bukget.org', i) for i in range(16)]
+        spiget = pool.submit('api.spiget.org', job, 'api.spiget.org', 16)
+
+    assert [future.result() for future in futures] == list(range(16)) and spiget.result() == 16
+    assert starts['api.spiget.org'] < 0.1
@@ -0,0 +1,105 @@
+import json
+import os
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+
+from mcresolver.scripts import get_script_index, read_script_metadata, SCRIPT_INDEX_FILE
+
+
+def write_script(folder, name, source):
+    script = folder.join(name)
+    script.write(textwrap.dedent(source))
+    return str(script)
+
+
+def test_read_script_metadata(tmpdir):
+    commons = write_script(tmpdir, 'commons_1.8.8-3.py', """
+        from mcresolver.scripts import *
+
+        _plugin_versions_ = ['1.8.8-3']
+        _plugin_id_ = "15290"
+
+        def configure(parent_folder, config_options={}, **kwargs):
+            raise RuntimeError("Scripts are never executed while indexing them")
+        """)
+    helper = write_script(tmpdir, 'helpers.py', """
+        def render():
+            pass
+        """)
+    dynamic = write_script(tmpdir, 'dynamic.py', """
+        from shared_metadata import *
+
+        def configure(parent_folder, config_options={}, **kwargs):
+            pass
+        """)
+
+    assert read_script_metadata(commons) == {'plugin-id': '15290', 'plugin-versions': ['1.8.8-3']}
+    assert read_script_metadata(helper) is False
+    assert read_script_metadata(dynamic) is None
+
+
+def test_configure_bound_without_def(tmpdir):
+    imported = write_script(tmpdir, 'essentials_all.py', """
+        from helpers import configure
+
+        _plugin_versions_ = ['all']
+        _plugin_id_ = "9089"
+        """)
+    assigned = write_script(tmpdir, 'vault_all.py', """
+        _plugin_versions_ = ['all']
+        _plugin_id_ = "34315"
+        configure = make_configure('vault')
+        """)
+    unreadable = write_script(tmpdir, 'worldedit_all.py', """
+        _plugin_versions_ = {['all']: None}
+        _plugin_id_ = "13932"
+
+        def configure(parent_folder, config_options={}, **kwargs):
+            pass
+        """)
+
+    assert read_script_metadata(imported) == {'plugin-id': '9089', 'plugin-versions': ['all']}
+    assert read_script_metadata(assigned) == {'plugin-id': '34315', 'plugin-versions': ['all']}
+    assert read_script_metadata(unreadable) is None
+
+
+def test_script_index_is_cached(tmpdir):
+    vault = write_script(tmpdir, 'vault_all.py', """
+        _plugin_versions_ = ['all']
+        _plugin_id_ = "vault"
+
+        def configure(parent_folder, config_options={}, **kwargs):
+            pass
+        """)
+
+    assert get_script_index(str(tmpdir)) == {vault: {'plugin-id': 'vault', 'plugin-versions': ['all']}}
+    assert os.path.exists(str(tmpdir.join(SCRIPT_INDEX_FILE)))
+
+    # Scripts are parsed again once they change.
+    write_script(tmpdir, 'vault_all.py', """
+        _plugin_versions_ = ['1.5.6']
+        _plugin_id_ = "Vault"
+
+        def configure(parent_folder, config_options={}, **kwargs):
+            pass
+        """)
+    os.utime(vault, (0, 0))
+
+    assert get_script_index(str(tmpdir)) == {vault: {'plugin-id': 'Vault', 'plugin-versions': ['1.5.6']}}
+
+
+def test_script_index_is_built_once_at_a_time(tmpdir):
+    for index in range(20):
+        write_script(tmpdir, 'plugin_%s.py' % index, """
+            _plugin_versions_ = ['all']
+            _plugin_id_ = "plugin"
+
+            def configure(parent_folder, config_options={}, **kwargs):
+                pass
+            """)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        indexes = list(pool.map(lambda _: get_script_index(str(tmpdir)), range(16)))
+
+    assert all(len(index) == 20 for index in indexes)
+    assert len(json.loads(tmpdir.join(SCRIPT_INDEX_FILE).read())) == 20
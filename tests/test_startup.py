@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+__root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies only the resolution (-r) mode needs.
+HEAVY_MODULES = ('bukget', 'spiget', 'cfscrape', 'jinja2', 'tqdm', 'requests')
+
+
+def imported_modules(code, arguments=(), home=None):
+    # Modules imported by running code in a fresh interpreter.
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [__root_folder] + [path for path in [os.environ.get('PYTHONPATH')] if path]))
+    if home is not None:
+        environment['HOME'] = home
+
+    output = subprocess.check_output([sys.executable, '-c', code + "\nimport sys\nprint(' '.join(sys.modules))"]
+                                     + list(arguments), env=environment, universal_newlines=True)
+    return set(output.splitlines()[-1].split())
+
+
+def test_import_leaves_heavy_dependencies_unloaded():
+    modules = imported_modules("import mcresolver\nmcresolver.get_parser().format_help()")
+
+    assert 'mcresolver' in modules
+    assert [module for module in HEAVY_MODULES if module in modules] == []
+
+
+def test_generate_leaves_heavy_dependencies_unloaded(tmpdir):
+    config = tmpdir.join('config.yml')
+    config.write("radius: 200\nworlds:\n- world\n")
+    home = tmpdir.mkdir('home')
+
+    code = ("import sys\n"
+            "from mcresolver.__main__ import main\n"
+            "try:\n"
+            "    main(['-g', sys.argv[1], '-pl', 'plugin', '-l', sys.argv[2]])\n"
+            "except SystemExit:\n"
+            "    pass")
+    modules = imported_modules(code, [str(config), str(tmpdir.join('templates'))], home=str(home))
+
+    assert tmpdir.join('templates', 'plugin-template.yml').check()
+    assert [module for module in HEAVY_MODULES if module in modules] == []
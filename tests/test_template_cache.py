@@ -0,0 +1,68 @@
+import hashlib
+import os
+import stat
+
+from mcresolver.files import write_file, write_stream, sync_written_files
+from mcresolver.scripts import get_template, render_config_from_string, render_config_to_file
+
+
+def test_templates_are_compiled_once():
+    template = "update-check: {{update_check}}\n{% for item in worlds %}  - {{item}}\n{% endfor %}"
+
+    assert get_template(template) is get_template(template)
+    assert get_template(template) is not get_template(template + "\n")
+
+
+def test_render_config_from_string():
+    template = "update-check: {{update_check}}\nworlds:\n{% for item in worlds %}  - {{item}}\n{% endfor %}"
+    rendered = render_config_from_string(template, {'update_check': 'false', 'worlds': ['world', 'nether']})
+
+    assert rendered == "update-check: false\nworlds:\n  - world\n  - nether\n"
+
+
+def test_render_config_to_file(tmpdir):
+    template = "messages:\n{% for item in messages %}  {{item}}: '{{item}} message'\n{% endfor %}"
+    variables = {'messages': ['message-%s' % index for index in range(10000)]}
+    config_file = str(tmpdir.join('messages.yml'))
+
+    sha256 = render_config_to_file(template, variables, config_file)
+    rendered = render_config_from_string(template, variables)
+    with open(config_file, 'r') as config_data:
+        assert config_data.read() == rendered
+    assert sha256 == hashlib.sha256(rendered.encode('utf-8')).hexdigest()
+
+    # Rendering the same configuration again leaves the file untouched.
+    os.utime(config_file, (0, 0))
+    assert render_config_to_file(template, variables, config_file) == sha256
+    assert os.path.getmtime(config_file) == 0
+    assert tmpdir.listdir() == [tmpdir.join('messages.yml')]
+
+
+def test_replaced_files_keep_their_permissions(tmpdir):
+    config = tmpdir.join('config.yml')
+    config.write('motd: hello\n')
+    os.chmod(str(config), 0o640)
+
+    assert write_file(str(config), 'motd: world\n')
+    write_stream(str(config), ['motd: ', 'everyone\n'])
+
+    assert config.read() == 'motd: everyone\n'
+    assert stat.S_IMODE(os.stat(str(config)).st_mode) == 0o640
+
+
+def test_files_are_flushed_before_replacing(tmpdir, monkeypatch):
+    config = tmpdir.join('config.yml')
+    sync_written_files()
+    events = []
+    fsync = os.fsync
+    replace = os.replace
+    monkeypatch.setattr(os, 'fsync', lambda handle: (events.append('fsync'), fsync(handle)))
+    monkeypatch.setattr(os, 'replace', lambda *paths: (events.append('replace'), replace(*paths)))
+
+    write_file(str(config), 'motd: hello\n')
+    write_stream(str(config), ['motd: ', 'world\n'])
+
+    assert events == ['fsync', 'replace', 'fsync', 'replace']
+    # Written twice, the file is counted once; Only its folder is left to flush.
+    assert sync_written_files() == 1
+    assert events[4:] == ['fsync']
@@ -0,0 +1,93 @@
+import json
+import pickle
+import threading
+
+import pytest
+
+from mcresolver import tracing
+from mcresolver.metrics import plugin_scope
+from mcresolver.pipeline import Task, PipelineExecutor
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.start_tracing()
+    yield tracer
+    tracing.stop_tracing()
+
+
+def test_spans_are_free_while_disabled():
+    tracing.stop_tracing()
+
+    with tracing.span("render", 'render') as span:
+        span.set(size=10)
+
+    assert span is tracing.NULL_SPAN
+    assert tracing.get_tracer() is None
+
+
+def test_spans_are_tagged_with_plugin_and_worker(tracer):
+    def render():
+        with plugin_scope('Essentials'), tracing.span("render Essentials", 'render') as span:
+            span.set(nodes=3)
+
+    worker = threading.Thread(target=render, name='render-worker')
+    worker.start()
+    worker.join()
+
+    with pytest.raises(ValueError):
+        with tracing.span("download Vault", 'download'):
+            raise ValueError("Unable to download")
+
+    events = tracer.to_dict()['traceEvents']
+    render, download = [event for event in events if event['ph'] == 'X']
+    assert render['args'] == {'plugin': 'Essentials', 'nodes': 3}
+    assert render['tid'] == worker.native_id and render['dur'] >= 0
+    assert download['args']['error'] == "ValueError: Unable to download"
+    assert 'plugin' not in download['args']
+    assert {'name': 'thread_name', 'ph': 'M', 'pid': render['pid'], 'tid': worker.native_id,
+            'args': {'name': 'render-worker'}} in events
+
+
+def test_pipeline_tasks_are_traced(tracer):
+    resolve = Task('resolve Vault', 'resolve', lambda: None, plugin='Vault')
+    download = Task('download Vault', 'download', lambda: None, [resolve], host='example.org', plugin='Vault')
+    PipelineExecutor().run([resolve, download])
+
+    spans = [event for event in tracer.to_dict()['traceEvents'] if event['ph'] == 'X']
+    assert [(span['name'], span['args']['plugin'], span['args']['stage']) for span in spans] == [
+        ('resolve Vault', 'Vault', 'resolve'), ('download Vault', 'Vault', 'download')]
+
+
+def test_worker_spans_are_merged(tracer):
+    with tracing.worker_trace() as worker:
+        with tracing.span("import commons_1883", 'script'):
+            pass
+    recorded = pickle.loads(pickle.dumps(worker.recorded()))
+    assert tracing.get_tracer() is tracer and tracer.events == []
+
+    tracing.add_worker_trace(recorded)
+    assert [event['name'] for event in tracer.events] == ["import commons_1883"]
+
+
+def test_spawned_workers_trace_when_told_to():
+    tracing.stop_tracing()
+
+    with tracing.worker_trace() as worker:
+        assert worker is None
+    with tracing.worker_trace(enabled=True) as worker:
+        with tracing.span("configure_plugin Essentials", 'configure'):
+            pass
+
+    assert [event['name'] for event in worker.recorded()[0]] == ["configure_plugin Essentials"]
+    assert tracing.get_tracer() is None
+
+
+def test_write_trace(tmpdir, tracer):
+    with tracing.span("lookup Essentials", 'metadata', host='api.bukget.org'):
+        pass
+
+    tracing.write_trace(str(tmpdir.join('trace.json')))
+    trace = json.loads(tmpdir.join('trace.json').read())
+    assert trace['displayTimeUnit'] == 'ms'
+    assert [event['cat'] for event in trace['traceEvents'] if event['ph'] == 'X'] == ['metadata']
@@ -0,0 +1,38 @@
+import os
+from collections import OrderedDict
+
+from mcresolver import yamlio
+
+__dirname = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_load_keeps_mapping_order():
+    document = yamlio.load("zeta: 1\nalpha:\n  second: true\n  first: [1, 2]\n")
+
+    assert isinstance(document, OrderedDict)
+    assert list(document.keys()) == ['zeta', 'alpha']
+    assert isinstance(document['alpha'], OrderedDict)
+    assert list(document['alpha'].keys()) == ['second', 'first']
+
+
+def test_load_accepts_plain_strings_starting_with_percent():
+    document = yamlio.load("chat-format: %1$s > %2$s\nradius: 10\n")
+
+    assert document == {'chat-format': '%1$s > %2$s', 'radius': 10}
+
+
+def test_dump_keeps_order_and_leaves_none_blank():
+    data = OrderedDict([('zeta', None), ('alpha', OrderedDict([('b', 1), ('a', [True, 'x'])]))])
+
+    assert yamlio.dump(data) == "zeta:\nalpha:\n  b: 1\n  a:\n  - true\n  - x\n"
+    assert yamlio.load(yamlio.dump(data)) == data
+
+
+def test_libyaml_and_python_paths_match():
+    # Whichever loader & dumper are in use, they read and write exactly what the pure python ones do.
+    for name in ('essentials.yml', os.path.join('..', 'plugin-test.yml')):
+        file = os.path.join(__dirname, name)
+        document = yamlio.load_file(file)
+
+        assert document == yamlio.load_file(file, loader=yamlio.PyLoader)
+        assert yamlio.dump(document) == yamlio.dump(document, Dumper=yamlio.PyDumper)